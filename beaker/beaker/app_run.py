@@ -1,6 +1,6 @@
-from common.beaker import Beaker
+from common.beaker import create_app
 
-app = Beaker()
+app = create_app()
 
 if __name__ == '__main__':
   app.run()
\ No newline at end of file
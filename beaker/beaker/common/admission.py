@@ -0,0 +1,216 @@
+import math
+import threading
+import time
+
+# ルートの優先度(過負荷時はlowから順に拒否し、highは拒否しない)
+PRIORITY_HIGH = 'high'
+PRIORITY_NORMAL = 'normal'
+PRIORITY_LOW = 'low'
+
+# 過負荷時に拒否を始める待ち時間の倍率(目標の待ち時間に対する倍率)
+_SHED_FACTORS = {PRIORITY_HIGH: None, PRIORITY_NORMAL: 2.0, PRIORITY_LOW: 1.0}
+
+class RequestShedError(Exception):
+  """ 同時実行数の上限や過負荷によりリクエストを拒否した場合のエラー
+  """
+  pass
+
+class RouteLimiter():
+  """ ルートごとの同時実行数の制限
+  """
+
+  def __init__(self, controller, route, max_concurrency=None, queue_timeout=1.0, priority=PRIORITY_NORMAL):
+    """ 同時実行数の制限の初期化
+
+    Args:
+        controller (AdmissionController): 過負荷の判定と待ち時間の記録を行う処理
+        route (str): ルートのパス
+        max_concurrency (int, optional): 同時実行数の上限(Noneの場合は制限しない). Defaults to None.
+        queue_timeout (float, optional): 上限に達している場合に空きを待つ最大秒数(0の場合は待たずに拒否する). Defaults to 1.0.
+        priority (str, optional): 優先度(high, normal, low). Defaults to PRIORITY_NORMAL.
+
+    Raises:
+        ValueError: 設定が不正な場合
+    """
+    if max_concurrency is not None and max_concurrency < 1:
+      raise ValueError(f"同時実行数の上限の設定が不正です。route: {route}, max_concurrency: {max_concurrency}")
+    if priority not in _SHED_FACTORS:
+      raise ValueError(f"存在しない優先度です。route: {route}, priority: {priority}")
+    self._controller = controller
+    self.route = route
+    self._max_concurrency = max_concurrency
+    self._queue_timeout = queue_timeout
+    self._priority = priority
+    self._condition = threading.Condition()
+    self._active = 0
+    self._waiting = 0
+    self._admitted = 0
+    self._queued = 0
+    self._shed = 0
+    self._shed_overload = 0
+
+  def acquire(self):
+    """ 実行枠の確保(上限に達している場合はqueue_timeout秒まで待つ)
+
+    Raises:
+        RequestShedError: 過負荷の場合、または時間内に空きがなかった場合
+    """
+    if self._controller.should_shed(self._priority):
+      with self._condition:
+        self._shed_overload += 1
+      raise RequestShedError(f"過負荷のためリクエストを拒否しました。route: {self.route}")
+
+    with self._condition:
+      if self._max_concurrency is None:
+        self._active += 1
+        self._admitted += 1
+        return
+      if self._active < self._max_concurrency and self._waiting == 0:
+        self._active += 1
+        self._admitted += 1
+        queued = False
+      elif self._queue_timeout <= 0:
+        self._shed += 1
+        raise RequestShedError(f"同時実行数の上限のためリクエストを拒否しました。route: {self.route}")
+      else:
+        queued = True
+    if not queued:
+      # NOTE: 待たずに実行できた場合も記録して、待ちが解消した場合に平均を下げる
+      self._controller.observe_wait(0.0)
+      return
+
+    with self._condition:
+      start = time.monotonic()
+      deadline = start + self._queue_timeout
+      admitted = False
+      self._waiting += 1
+      self._queued += 1
+      try:
+        while True:
+          if self._active < self._max_concurrency:
+            self._active += 1
+            self._admitted += 1
+            admitted = True
+            break
+          remaining = deadline - time.monotonic()
+          if remaining <= 0:
+            self._shed += 1
+            break
+          self._condition.wait(remaining)
+      finally:
+        self._waiting -= 1
+
+    # NOTE: 拒否した場合も待ち時間は過負荷の判定に使用する
+    self._controller.observe_wait(time.monotonic() - start)
+    if not admitted:
+      raise RequestShedError(f"同時実行数の上限のためリクエストを拒否しました。route: {self.route}")
+
+  def release(self):
+    """ 実行枠の返却
+    """
+    with self._condition:
+      self._active -= 1
+      self._condition.notify()
+
+  def get_stats(self):
+    """ 統計情報の取得
+
+    Returns:
+        dict: 実行中(active)、待機中(waiting)、許可(admitted)、待機後に許可または拒否(queued)、上限による拒否(shed)、過負荷による拒否(shed_overload)の数
+    """
+    with self._condition:
+      return {
+        'max_concurrency': self._max_concurrency,
+        'priority': self._priority,
+        'active': self._active,
+        'waiting': self._waiting,
+        'admitted': self._admitted,
+        'queued': self._queued,
+        'shed': self._shed,
+        'shed_overload': self._shed_overload,
+      }
+
+class AdmissionController():
+  """ 待ち時間にもとづく過負荷の判定とルートごとの同時実行数の制限の管理
+      待ち時間の指数移動平均が目標を超えた場合に優先度の低いルートから拒否する
+  """
+
+  def __init__(self, target_queue_latency=0.1, half_life=5.0, clock=time.monotonic):
+    """ 過負荷の判定の初期化
+
+    Args:
+        target_queue_latency (float, optional): 目標の待ち時間(秒、0の場合は過負荷による拒否を行わない). Defaults to 0.1.
+        half_life (float, optional): 待ち時間の平均が半分に減衰する秒数(待ちが発生しなくなった場合の回復の速さ). Defaults to 5.0.
+        clock (function, optional): 現在時刻(秒)を返却する処理. Defaults to time.monotonic.
+    """
+    self._target = target_queue_latency
+    self._decay = math.log(2) / half_life
+    self._clock = clock
+    self._lock = threading.Lock()
+    self._latency = 0.0
+    self._updated_at = clock()
+    self._limiters = []
+
+  def create_limiter(self, route, max_concurrency=None, queue_timeout=1.0, priority=PRIORITY_NORMAL):
+    """ ルートの同時実行数の制限の作成
+
+    Returns:
+        RouteLimiter: 同時実行数の制限
+    """
+    limiter = RouteLimiter(self, route, max_concurrency, queue_timeout, priority)
+    with self._lock:
+      self._limiters.append(limiter)
+    return limiter
+
+  def _decayed_latency(self, now):
+    """ 経過時間で減衰させた待ち時間の平均(ロック内で呼び出すこと)
+    """
+    return self._latency * math.exp(-self._decay * (now - self._updated_at))
+
+  def observe_wait(self, seconds):
+    """ 待ち時間の記録
+
+    Args:
+        seconds (float): 実行枠の確保までに待った秒数
+    """
+    now = self._clock()
+    with self._lock:
+      # NOTE: 待ちが続く場合に素早く反応するよう、新しい値の重みは直前の記録からの経過時間によらず一定とする
+      self._latency = self._decayed_latency(now) * 0.8 + seconds * 0.2
+      self._updated_at = now
+
+  def get_queue_latency(self):
+    """ 現在の待ち時間の平均の取得
+
+    Returns:
+        float: 待ち時間の平均(秒)
+    """
+    with self._lock:
+      return self._decayed_latency(self._clock())
+
+  def should_shed(self, priority):
+    """ 過負荷のため拒否するか判定する
+
+    Args:
+        priority (str): ルートの優先度
+
+    Returns:
+        bool: 拒否する場合はTrue
+    """
+    factor = _SHED_FACTORS[priority]
+    if not self._target or factor is None:
+      return False
+    return self.get_queue_latency() > self._target * factor
+
+  def get_stats(self):
+    """ 統計情報の取得
+
+    Returns:
+        dict: 待ち時間の平均(queue_latency)とルートごとの統計情報(routes)
+    """
+    with self._lock:
+      limiters = list(self._limiters)
+    return {
+      'queue_latency': self.get_queue_latency(),
+      'routes': {limiter.route: limiter.get_stats() for limiter in limiters},
+    }
@@ -0,0 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import functools
+
+class BlockingExecutor():
+  """ async defのコントローラからブロッキングする処理(DBや外部APIの呼び出しなど)を実行するためのスレッドプール
+      スレッド数に上限を設けて、待機中の処理がイベントループを止めないようにする
+  """
+
+  def __init__(self, max_workers=10):
+    """ スレッドプールの初期化
+
+    Args:
+        max_workers (int, optional): 同時に実行する処理数の上限. Defaults to 10.
+
+    Raises:
+        ValueError: 上限の設定が不正な場合
+    """
+    if max_workers < 1:
+      raise ValueError(f"スレッド数の上限の設定が不正です。max_workers: {max_workers}")
+    self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='beaker-blocking')
+
+  async def run(self, function, *args, **kwargs):
+    """ ブロッキングする処理をスレッドプールで実行し、完了を待機する
+
+    Args:
+        function (function): 実行する処理
+
+    Returns:
+        Any: 処理の戻り値
+    """
+    # NOTE: Flaskのrequestやsessionはcontextvarsで保持されているため、コンテキストを引き継いで実行する
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, function, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+  def shutdown(self, wait=True):
+    """ スレッドプールの終了処理
+
+    Args:
+        wait (bool, optional): 実行中の処理の完了を待つか. Defaults to True.
+    """
+    self._executor.shutdown(wait=wait)
+
+class AsyncTransaction():
+  """ async defのコントローラから使用するトランザクション
+      pgsupporterの処理はBlockingExecutorで実行するため、待機中もイベントループは他の処理を進められる
+  """
+
+  def __init__(self, transaction, executor):
+    """ トランザクションの初期化
+
+    Args:
+        transaction (BeakerTransaction): 実際に処理を行うトランザクション
+        executor (BlockingExecutor): 処理を実行するスレッドプール
+    """
+    self._transaction = transaction
+    self._executor = executor
+    # NOTE: 1つの接続を複数のスレッドから同時に使用しないように、同じトランザクション内の処理は順番に実行する
+    #       Python3.9以前はLockの生成時にイベントループと紐づくため、最初に使用した時点で生成する
+    self._lock = None
+
+  async def _run(self, function, *args, **kwargs):
+    if self._lock is None:
+      self._lock = asyncio.Lock()
+    async with self._lock:
+      return await self._executor.run(function, *args, **kwargs)
+
+  async def __aenter__(self):
+    await self._run(self._transaction.__enter__)
+    return self
+
+  async def __aexit__(self, exc_type, exc_value, traceback):
+    return await self._run(self._transaction.__exit__, exc_type, exc_value, traceback)
+
+  async def find_all(self, *args, **kwargs):
+    return await self._run(self._transaction.find_all, *args, **kwargs)
+
+  async def find_one(self, *args, **kwargs):
+    return await self._run(self._transaction.find_one, *args, **kwargs)
+
+  async def save(self, *args, **kwargs):
+    return await self._run(self._transaction.save, *args, **kwargs)
+
+  async def delete(self, *args, **kwargs):
+    return await self._run(self._transaction.delete, *args, **kwargs)
+
+  async def run(self, function, *args, **kwargs):
+    """ トランザクションを第一引数に渡してブロッキングする処理を実行する(クエリビルダの使用など)
+
+    Args:
+        function (function): トランザクションを第一引数に受け取る処理
+
+    Returns:
+        Any: 処理の戻り値
+    """
+    return await self._run(function, self._transaction, *args, **kwargs)
+
+  def get_transaction(self):
+    """ 実際に処理を行うトランザクションの取得
+
+    Returns:
+        BeakerTransaction: 実際に処理を行うトランザクション
+    """
+    return self._transaction
@@ -1,15 +1,43 @@
 # -*- coding: utf-8 -*-
 
-from flask import Flask, session as session_by_flask, request as request_by_flask, render_template as render_template_by_flask, make_response
+from flask import Flask, current_app, g, has_request_context, session as session_by_flask, request as request_by_flask, render_template as render_template_by_flask, make_response, Response, stream_with_context, jsonify, send_file, url_for
+from flask.globals import request_ctx
+from flask.sessions import SessionInterface
 from flask_wtf.csrf import CSRFProtect
+from jinja2 import FileSystemBytecodeCache, TemplateError
 from datetime import timedelta
 
-from pgsupporter import DbConnecter, QueryBuilder, Transaction
-from .csv import CsvCreator
+from pgsupporter import DbConnecter
+from .admission import AdmissionController, RequestShedError, PRIORITY_NORMAL
+from .async_support import AsyncTransaction, BlockingExecutor
+from .response_cache import ResponseCache, FragmentCacheExtension, SessionAccessRecorder, create_page_key
+from .compression import ResponseCompressor, StaticFingerprint, DEFAULT_MIME_TYPES, make_conditional
+from .csv import CsvCreator, DEFAULT_CHUNK_SIZE
+from .filters import is_pure_filter, memoize_filter, pure_filter
+from .error_report import ErrorReporter, fingerprint_exception, fingerprint_path
+from .jobs import JobManager, EXECUTOR_THREAD, STATE_DONE
+from .instrumentation import Instrumentation, RequestTimer, COMPONENT_SESSION, COMPONENT_TEMPLATE, DEFAULT_BUCKETS, measure, set_timer_getter
+from .db_pool import ConnectionPool, PoolSelector, PooledConnecter, RoutingConnecter
+from .profiling import RequestProfiler, MODE_SAMPLING
+from .query_builder import BeakerQueryBuilder
+from .query_cache import QueryCache
+from .query_log import QueryTracer, RequestQueryStats
+from .transaction import BeakerTransaction
+from .log_queue import BeakerLogQueue
+from .session_store import BeakerSessionInterface, MemorySessionStore, SQLiteSessionStore
 from .utility import load_yaml
+import atexit
+import functools
+import hmac
+import importlib.util
 import logging.config
+import os
+import secrets
 import sys
 import inspect
+import threading
+import time
+import traceback
 
 _py2 = sys.version_info[0] == 2
 class BeakerConfig():
@@ -31,13 +59,38 @@ class BeakerConfig():
     """
     return self._config
 
-_beaker_config = BeakerConfig()
+# NOTE: インポートしただけでConfigの読み込みやログ・DBの初期化が行われないように
+#       それぞれ最初に使用した時点で生成する
+_init_lock = threading.RLock()
+_config_file_name = "./config.yml"
+_beaker_config = None
+
+def configure(config_file_name="./config.yml"):
+  """使用するConfigファイルの設定(Configを読み込む前に呼び出すこと)
+
+  Args:
+      config_file_name (str, optional): Configファイルのパス. Defaults to "./config.yml".
+
+  Raises:
+      Exception: Configが既に読み込まれている場合
+  """
+  global _config_file_name
+  with _init_lock:
+    if _beaker_config is not None:
+      raise Exception("Configは既に読み込まれています。")
+    _config_file_name = config_file_name
+
 def get_config():
   """Configに設定した配列の取得
 
   Returns:
       configファイルの配列: Configファイルの配列
   """
+  global _beaker_config
+  if _beaker_config is None:
+    with _init_lock:
+      if _beaker_config is None:
+        _beaker_config = BeakerConfig(_config_file_name)
   return _beaker_config.get_config()
 
 class BeakerLogLevel():
@@ -55,11 +108,44 @@ class BeakerLogger():
     """Beakerのログ管理クラスのコンストラクタ
 
     Args:
-        config (BeakerConfig): Beaker用のConfig定義クラス
+        config (dict | function): Configの辞書(関数の場合は最初にログを出力する時点で呼び出して設定を行う)
+        logger_name (str, optional): loggerの名前. Defaults to "app_logger".
+    """
+    self._config = config
+    self._logger_name = logger_name
+    self._logger = None
+    self._log_queue = None
+    self._lock = threading.Lock()
+    self._shutdown_registered = False
+    if not callable(config):
+      self._configure()
+
+  def _configure(self):
+    """ログの設定処理
+
+    Returns:
+        logging.Logger: 設定したlogger
+    """
+    with self._lock:
+      if self._logger is not None:
+        return self._logger
+      config = self._config() if callable(self._config) else self._config
+      logger_name = self._logger_name
+      self._build(config, logger_name)
+      return self._logger
+
+  def _build(self, config, logger_name):
+    """loggerの生成処理
+
+    Args:
+        config (dict): Configの辞書
+        logger_name (str): loggerの名前
     """
     # デフォルトを以下のように定義する
     logger_map =  {
       'version': 1, 
+      # NOTE: gunicornなどの設定済みのloggerを無効にしない
+      'disable_existing_loggers': False, 
       'formatters': {
         'customFormatter': {
           'format': '[%(asctime)s]%(levelname)s - %(message)s', 
@@ -73,16 +159,7 @@ class BeakerLogger():
           'qualname': 'file',
           'propagate': False}},
           'handlers': {
-            'fileRotatingHandler': {
-              'formatter': 'customFormatter', 
-              'class': 'logging.handlers.TimedRotatingFileHandler', 
-              'level': config['log']['level'], 
-              'filename': config['log']['file_name'], 
-              'encoding': 'utf8', 
-              'when': 'D', 
-              'interval': 1, 
-              'backupCount': 14
-              }, 
+            'fileRotatingHandler': self._create_file_handler_config(config), 
             'consoleHandler': {
               'class': 'logging.StreamHandler', 
               'level': config['log']['level'], 
@@ -95,21 +172,153 @@ class BeakerLogger():
               }
             }
     logging.config.dictConfig(logger_map)
-    self._logger = logging.getLogger(logger_name)
+    app_logger = logging.getLogger(logger_name)
+
+    # 非同期モードの場合はファイルとコンソールへの出力をキューの後ろに移動して
+    # リクエストのスレッドではI/Oを行わないようにする
+    if config['log'].get('async', False):
+      self._start_queue(app_logger, config['log'])
+
+    # NOTE: 設定が完了したかの判定に使用するため最後に設定する
+    self._logger = app_logger
+
+  def _create_file_handler_config(self, config):
+    """ファイル出力のハンドラの設定の作成
+       log.rotationがdailyの場合は日付で切り替え、externalの場合はlogrotateなどで切り替えたファイルを開き直す
+
+    Args:
+        config (dict): Configの辞書
+
+    Raises:
+        ValueError: 存在しない切り替えの方法が指定された場合
+
+    Returns:
+        dict: dictConfigのハンドラの設定
+    """
+    # NOTE: gunicornの複数のワーカーがそれぞれ日付で切り替えると、後から切り替えたワーカーが
+    #       先に切り替えた前日のファイルを削除するため、本番環境では外部で切り替える
+    default_rotation = 'external' if config.get('server', {}).get('type') == 'production' else 'daily'
+    rotation = config['log'].get('rotation', default_rotation)
+    handler_config = {
+      'formatter': 'customFormatter', 
+      'level': config['log']['level'], 
+      'filename': config['log']['file_name'], 
+      'encoding': 'utf8', 
+      }
+    if rotation == 'daily':
+      handler_config.update({
+        'class': 'logging.handlers.TimedRotatingFileHandler', 
+        'when': 'D', 
+        'interval': 1, 
+        'backupCount': config['log'].get('backup_count', 14)
+        })
+    elif rotation == 'external':
+      handler_config['class'] = 'logging.handlers.WatchedFileHandler'
+    else:
+      raise ValueError(f"存在しないログの切り替えの方法です。rotation: {rotation}")
+    return handler_config
+
+  def _start_queue(self, app_logger, log_config):
+    """ログ出力用のキューの開始処理
+
+    Args:
+        app_logger (logging.Logger): 出力先のlogger
+        log_config (dict): Configのlogの設定
+    """
+    handlers = list(app_logger.handlers)
+    self._log_queue = BeakerLogQueue(
+      handlers,
+      queue_size=log_config.get('queue_size', 10000),
+      policy=log_config.get('queue_policy', 'drop'),
+      block_timeout=log_config.get('queue_block_timeout'))
+    for handler in handlers:
+      app_logger.removeHandler(handler)
+    app_logger.addHandler(self._log_queue.handler)
+    self._log_queue.start()
+
+    # NOTE: 終了時にキューに残ったログを出力する
+    if not self._shutdown_registered:
+      atexit.register(self.shutdown)
+      self._shutdown_registered = True
+
+  def shutdown(self):
+    """キューに残ったログを出力して非同期出力を停止する
+    """
+    if self._log_queue is not None:
+      self._log_queue.stop()
+
+  def reset_after_fork(self):
+    """fork後の子プロセスでの初期化処理
+       出力スレッドは子プロセスに引き継がれないため、非同期モードの場合は出力スレッドを作り直す
+    """
+    self._lock = threading.Lock()
+    # NOTE: 設定をやり直すとハンドラの作り直しやatexitの登録が重複するため、設定済みのハンドラはそのまま使用する
+    if self._log_queue is not None:
+      self._log_queue.reset_after_fork()
+
+  def get_queue_stats(self):
+    """非同期モードのキューの統計情報を取得する
 
-  def _get_file_name(self):
+    Returns:
+        dict: キューに積んだ件数(queued)、破棄した件数(dropped)、出力した件数(flushed)、未出力の件数(pending)
+              非同期モードでない場合はNone
+    """
+    if self._log_queue is None:
+      return None
+    return self._log_queue.get_stats()
+
+  def _get_caller(self, depth):
     """ログの出力先の情報を取得する
 
+    Args:
+        depth (int): 本メソッドから遡るフレーム数
+
     Returns:
         tuple: ファイル名と関数名の取得を行う
     """
+    # NOTE: inspect.stack()はスタック全体のソース情報まで読み込むため重い
+    #       必要なフレームだけをsys._getframeで参照する
+    code = sys._getframe(depth + 1).f_code
+    return (code.co_filename, code.co_name)
+
+  def _write(self, log_level, message, args):
+    """ログの書き込み処理
+
+    Args:
+        log_level (int): ログレベル
+        message (str): 出力メッセージ(argsがある場合は%形式のフォーマット文字列)
+        args (tuple): メッセージのフォーマット引数
+    """
+    app_logger = self._logger
+    if app_logger is None:
+      app_logger = self._configure()
+
+    # 出力対象外のログレベルの場合は呼び出し元の解決やフォーマットを行わない
+    if not app_logger.isEnabledFor(log_level):
+      return
+
     # NOTE: 本メソッドは各出力処理から呼ばれているのでstackから2つ
     #       遡ったもの関数がログの出力先であるとする
-    file_name = inspect.stack()[2].filename
-    function_name = inspect.stack()[2].function
-    return (file_name, function_name)
+    file_name, function_name = self._get_caller(2)
+    if args:
+      message = message % args
+    app_logger.log(log_level, '%s#%s: %s', file_name, function_name, message)
+
+  def is_enabled_for(self, log_level):
+    """指定したログレベルが出力対象か判定する
 
-  def log(self, msg, log_level):
+    Args:
+        log_level (BeakerLogLevel): Beaker用のログレベル
+
+    Returns:
+        bool: 出力対象の場合はTrue
+    """
+    app_logger = self._logger
+    if app_logger is None:
+      app_logger = self._configure()
+    return app_logger.isEnabledFor(log_level)
+
+  def log(self, msg, log_level, *args):
     """ログレベルに応じたログ出力
 
     Args:
@@ -119,54 +328,47 @@ class BeakerLogger():
     Raises:
         Exception: [description]
     """
-    if BeakerLogLevel.DEBUG == log_level:
-      self.debug(msg)
-    elif BeakerLogLevel.INFO == log_level:
-      self.info(msg)
-    elif BeakerLogLevel.WARNING == log_level:
-      self.warning(msg)
-    elif BeakerLogLevel.ERROR == log_level:
-      self.error(msg)
-    else:
+    if log_level not in (BeakerLogLevel.DEBUG, BeakerLogLevel.INFO, BeakerLogLevel.WARNING, BeakerLogLevel.ERROR):
       raise Exception(f"存在しないログレベルです。log_level: {log_level}")
+    self._write(log_level, msg, args)
 
-  def debug(self, message):
+  def debug(self, message, *args):
     """デバッグログの出力
 
     Args:
         message (str): 出力メッセージ
+        args: メッセージのフォーマット引数(出力対象の場合のみフォーマットされる)
     """
-    file_name, function_name = self._get_file_name()
-    self._logger.debug(f'{file_name}#{function_name}: {message}')
+    self._write(BeakerLogLevel.DEBUG, message, args)
 
-  def info(self, message):
+  def info(self, message, *args):
     """インフォログの出力
 
     Args:
         message (str): 出力メッセージ
+        args: メッセージのフォーマット引数(出力対象の場合のみフォーマットされる)
     """
-    file_name, function_name = self._get_file_name()
-    self._logger.info(f'{file_name}#{function_name}: {message}')
+    self._write(BeakerLogLevel.INFO, message, args)
 
-  def warning(self, message):
+  def warning(self, message, *args):
     """警告ログの出力
 
     Args:
         message (str): 出力メッセージ
+        args: メッセージのフォーマット引数(出力対象の場合のみフォーマットされる)
     """
-    file_name, function_name = self._get_file_name()
-    self._logger.warning(f'{file_name}#{function_name}: {message}')
+    self._write(BeakerLogLevel.WARNING, message, args)
 
-  def error(self, message):
+  def error(self, message, *args):
     """エラーログの出力
 
     Args:
         message (str): 出力メッセージ
+        args: メッセージのフォーマット引数(出力対象の場合のみフォーマットされる)
     """
-    file_name, function_name = self._get_file_name()
-    self._logger.error(f'{file_name}#{function_name}: {message}')
+    self._write(BeakerLogLevel.ERROR, message, args)
 
-logger = BeakerLogger(get_config())
+logger = BeakerLogger(get_config)
 
 def get_session(key):
   """セッションの値取得処理
@@ -177,7 +379,7 @@ def get_session(key):
   Returns:
       str: セッションの値 
   """
-  logger.debug(f"キー: {key}")
+  logger.debug("キー: %s", key)
 
   if key not in session_by_flask:
     logger.error(f"セッション: {session_by_flask}")
@@ -193,9 +395,36 @@ def set_session(key, value):
       key (str): セッションのキー
       value (str): セッションの値
   """
-  logger.debug(f"キー: {key}")
-  logger.debug(f"値: {value}")
+  logger.debug("キー: %s", key)
+  logger.debug("値: %s", value)
   session_by_flask[key] = value
+  # NOTE: 値を設定した場合はどのみちセッションを保存するため延命も合わせて行う
+  _touch_session()
+
+# セッションを最後に延命した時刻(エポック秒)を保持するセッションのキー
+_SESSION_REFRESHED_AT_KEY = '_br'
+
+# セッションの延命を行わないエンドポイント
+_SESSION_SKIP_ENDPOINTS = frozenset(['static', 'beaker_metrics'])
+
+def _touch_session():
+  """セッションを延命する(保存時に有効期限が更新される)
+  """
+  if not session_by_flask.permanent:
+    session_by_flask.permanent = True
+  session_by_flask[_SESSION_REFRESHED_AT_KEY] = int(time.time())
+
+# カスタムフィルタ内のデバッグログを出力するか
+_filter_tracing = True
+
+def is_filter_tracing():
+  """カスタムフィルタ内でデバッグログを出力するか判定する
+     fast_filtersが有効な場合はtrace_filtersが有効な場合のみ出力する
+
+  Returns:
+      bool: 出力する場合はTrue
+  """
+  return _filter_tracing
 
 def render_template(template_name_or_list, **context):
   """Beaker用テンプレート表示処理
@@ -206,20 +435,243 @@ def render_template(template_name_or_list, **context):
   Returns:
       Any: Flaskのテンプレート
   """
-  logger.debug(f"テンプレート名: {template_name_or_list}")
-  logger.debug(f"コンテキスト: {context}")
-  return render_template_by_flask(template_name_or_list, **context)
+  logger.debug("テンプレート名: %s", template_name_or_list)
+  logger.debug("コンテキスト: %s", context)
+  with measure(COMPONENT_TEMPLATE):
+    return render_template_by_flask(template_name_or_list, **context)
+
+def stream_template(template_name_or_list, buffer_size=100, **context):
+  """テンプレートを描画しながら返却するレスポンスを返却する
+     select_iterの取得結果などを渡すと、行を読み込みながら送信するため大量の行の表示でも使用するメモリは一定となる
+
+  Args:
+      template_name_or_list (str): テンプレート名
+      buffer_size (int, optional): まとめて送信する描画結果の数(1の場合はまとめない). Defaults to 100.
+
+  Returns:
+      Response: ストリーミングのレスポンス
+  """
+  logger.debug("テンプレート名: %s", template_name_or_list)
+  app = current_app._get_current_object()
+  app.update_template_context(context)
+  template = app.jinja_env.get_or_select_template(template_name_or_list)
+  stream = template.stream(**context)
+  if buffer_size > 1:
+    stream.enable_buffering(buffer_size)
+  return Response(stream_with_context(stream))
+
+_response_cache = None
+def _get_response_cache():
+  """ページとテンプレートの一部のキャッシュを取得する(最初に使用した時点で生成する)
+
+  Returns:
+      ResponseCache: ページとテンプレートの一部のキャッシュ
+  """
+  global _response_cache
+  if _response_cache is None:
+    with _init_lock:
+      if _response_cache is None:
+        cache_vars = get_config().get('cache', {})
+        _response_cache = ResponseCache(
+          max_entries=cache_vars.get('max_entries', 1000),
+          max_bytes=cache_vars.get('max_bytes', 50 * 1024 * 1024),
+          wait_timeout=cache_vars.get('wait_timeout', 10.0))
+  return _response_cache
+
+def cache_page(ttl=60, session_keys=(), query=True, tag=None):
+  """ページの描画結果をキャッシュするデコレータ
+     GETで200のレスポンスのみキャッシュする(ストリーミングやCookieを設定するレスポンスはキャッシュしない)
+     描画中にCSRFトークンを作成した場合や、session_keys以外のセッションの値を参照・変更した場合もキャッシュしない
+
+  Args:
+      ttl (float, optional): 有効期間(秒). Defaults to 60.
+      session_keys (tuple, optional): キャッシュのキーに含めるセッションのキー. Defaults to ().
+      query (bool, optional): クエリパラメータをキャッシュのキーに含めるか. Defaults to True.
+      tag (str, optional): 破棄する単位とするタグ(指定しない場合はルートのパス). Defaults to None.
+
+  Returns:
+      function: デコレータ
+  """
+  def decorator(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+      view = current_app.ensure_sync(function)
+      if request_by_flask.method != 'GET':
+        return view(*args, **kwargs)
+
+      key = create_page_key(request_by_flask.path, request_by_flask.args, session_by_flask, session_keys, query)
+      uncached = []
+      def create():
+        # NOTE: Flaskはセッションを参照するたびにaccessedを設定するため描画中の参照は記録用のラッパーで判定する
+        context = request_ctx._get_current_object()
+        original_session = context.session
+        recorder = SessionAccessRecorder(original_session)
+        context._session = recorder
+        try:
+          response = make_response(view(*args, **kwargs))
+        finally:
+          context._session = original_session
+        # NOTE: CSRFトークンやsession_keys以外のセッションの値を含むページは他のユーザーに返却しないようにキャッシュしない
+        if response.status_code != 200 or response.is_streamed or 'Set-Cookie' in response.headers \
+            or current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token') in g or not recorder.is_cacheable(session_keys):
+          uncached.append(response)
+          return None
+        return (response.get_data(), response.status_code, list(response.headers.items()))
+
+      entry = _get_response_cache().get_or_create(key, tag or request_by_flask.url_rule.rule, ttl, create)
+      if uncached:
+        return uncached[0]
+      body, status, headers = entry
+      return Response(body, status, headers)
+    return wrapper
+  return decorator
+
+_admission_controller = None
+def _get_admission_controller():
+  """ルートの同時実行数の制限と過負荷の判定を行う処理を取得する(最初に使用した時点で生成する)
+
+  Returns:
+      AdmissionController: ルートの同時実行数の制限と過負荷の判定を行う処理
+  """
+  global _admission_controller
+  if _admission_controller is None:
+    with _init_lock:
+      if _admission_controller is None:
+        admission_vars = get_config().get('admission', {})
+        _admission_controller = AdmissionController(
+          target_queue_latency=admission_vars.get('target_queue_latency', 0.1),
+          half_life=admission_vars.get('half_life', 5.0))
+  return _admission_controller
+
+def _create_shed_response():
+  """リクエストを拒否した場合のレスポンスの作成
+  """
+  response = make_response('Service Unavailable', 503)
+  response.headers['Retry-After'] = str(get_config().get('admission', {}).get('retry_after', 1))
+  return response
+
+def _limit_route(path, function, max_concurrency, queue_timeout, priority):
+  """ルートの処理を同時実行数の制限と過負荷時の拒否で包む(いずれも指定しない場合は包まない)
+
+  Args:
+      path (str): パス
+      function (function): 実行する処理
+      max_concurrency (int): 同時実行数の上限
+      queue_timeout (float): 同時実行数の上限に達している場合に待つ最大秒数
+      priority (str): 過負荷時の優先度
+
+  Returns:
+      function: 制限を行う処理
+  """
+  if max_concurrency is None and priority is None:
+    return function
+  limiter = _get_admission_controller().create_limiter(path, max_concurrency, queue_timeout, priority or PRIORITY_NORMAL)
+
+  @functools.wraps(function)
+  def wrapper(*args, **kwargs):
+    try:
+      limiter.acquire()
+    except RequestShedError as e:
+      logger.debug('%s', e)
+      return _create_shed_response()
+    try:
+      response = make_response(current_app.ensure_sync(function)(*args, **kwargs))
+    except BaseException:
+      limiter.release()
+      raise
+    # NOTE: ストリーミングの場合は送信が終わるまで実行中として扱う
+    if response.is_streamed:
+      response.call_on_close(limiter.release)
+    else:
+      limiter.release()
+    return response
+  return wrapper
+
+def get_admission_stats():
+  """ルートの同時実行数の制限の統計情報を取得する
+
+  Returns:
+      dict: 待ち時間の平均(queue_latency)と、ルートごとの許可(admitted)、待機(queued)、拒否(shed, shed_overload)の数(routes)
+  """
+  return _get_admission_controller().get_stats()
+
+def _admission_gauges():
+  """メトリクスに出力するルートの同時実行数の制限の状態を取得する
+  """
+  stats = get_admission_stats()
+  routes = stats['routes'].values()
+  return {
+    'beaker_admission_queue_latency_seconds': stats['queue_latency'],
+    'beaker_admission_admitted_total': sum(route['admitted'] for route in routes),
+    'beaker_admission_queued_total': sum(route['queued'] for route in routes),
+    'beaker_admission_shed_total': sum(route['shed'] + route['shed_overload'] for route in routes),
+  }
+
+def invalidate_cache(tag):
+  """ページとテンプレートの一部のキャッシュをタグ単位で破棄する
+
+  Args:
+      tag (str): タグ(ページのキャッシュでタグを指定しない場合はルートのパス)
+  """
+  logger.debug('tag: %s', tag)
+  _get_response_cache().invalidate(tag)
+
+def clear_cache():
+  """ページとテンプレートの一部のキャッシュをすべて破棄する
+  """
+  _get_response_cache().clear()
+
+def get_cache_stats():
+  """ページとテンプレートの一部のキャッシュの統計情報を取得する
+
+  Returns:
+      dict: ヒット数(hits)、ミス数(misses)、上限による破棄数(evictions)などの統計情報
+  """
+  return _get_response_cache().get_stats()
 
 class BeakerRouter():
   def __init__(self):
     self._route = []
 
-  def get(self, path, function, auth=False):
+  def get(self, path, function, auth=False, cache=None, max_concurrency=None, queue_timeout=1.0, priority=None):
+    """GETのルートの登録
+
+    Args:
+        path (str): パス
+        function (function): 実行する処理
+        auth (bool, optional): 認証が必要か. Defaults to False.
+        cache (int | dict, optional): ページのキャッシュの有効期間(秒)またはcache_pageの引数の辞書. Defaults to None.
+        max_concurrency (int, optional): 同時実行数の上限(超えた場合はqueue_timeout秒待ち、空きがなければ503を返却する). Defaults to None.
+        queue_timeout (float, optional): 同時実行数の上限に達している場合に待つ最大秒数. Defaults to 1.0.
+        priority (str, optional): 過負荷時の優先度(high: 拒否しない, normal, low: 最初に拒否する). Defaults to None.
+    """
+    function = _limit_route(path, function, max_concurrency, queue_timeout, priority)
+    # NOTE: キャッシュから返却する場合は同時実行数を消費しないように制限の外側でキャッシュする
+    if cache is not None:
+      function = cache_page(**(cache if isinstance(cache, dict) else {'ttl': cache}))(function)
     self._route.append({'path': path, 'function': function, 'methods': ['GET',]})
 
-  def post(self, path, function):
+  def post(self, path, function, max_concurrency=None, queue_timeout=1.0, priority=None):
+    """POSTのルートの登録
+
+    Args:
+        path (str): パス
+        function (function): 実行する処理
+        max_concurrency (int, optional): 同時実行数の上限(超えた場合はqueue_timeout秒待ち、空きがなければ503を返却する). Defaults to None.
+        queue_timeout (float, optional): 同時実行数の上限に達している場合に待つ最大秒数. Defaults to 1.0.
+        priority (str, optional): 過負荷時の優先度(high: 拒否しない, normal, low: 最初に拒否する). Defaults to None.
+    """
+    function = _limit_route(path, function, max_concurrency, queue_timeout, priority)
     self._route.append({'path': path, 'function': function, 'methods': ['POST',]})
 
+  def get_routes(self):
+    """登録済みのルートの取得
+
+    Returns:
+        list: パス(path)とメソッド(methods)の辞書のリスト
+    """
+    return [{'path': route['path'], 'methods': list(route['methods'])} for route in self._route]
+
   def regist_flask(self, app):
     """Flaskへの登録処理
 
@@ -228,15 +680,56 @@ class BeakerRouter():
 
     """
     for route in self._route:
+      # NOTE: async defの処理はFlaskがasgirefで実行するため、未インストールの場合はリクエスト時ではなく起動時にエラーとする
+      if inspect.iscoroutinefunction(route['function']) and importlib.util.find_spec('asgiref') is None:
+        raise Exception(f"async defの処理を登録するにはasgirefのインストールが必要です。(pip install \"flask[async]\") path: {route['path']}")
       app.add_url_rule(route['path'], view_func=route['function'], methods=route['methods'])
 
+_error_reporter = None
+def _get_error_reporter():
+  """同じエラーのログ出力を抑制する処理を取得する(最初に使用した時点で生成する)
+
+  Returns:
+      ErrorReporter: エラーの出力を抑制する処理(抑制しない場合はNone)
+  """
+  global _error_reporter
+  if _error_reporter is None:
+    with _init_lock:
+      if _error_reporter is None:
+        error_log_vars = get_config().get('error_log', {})
+        if not error_log_vars.get('enabled', True):
+          return None
+        _error_reporter = ErrorReporter(
+          logger,
+          rate_per_minute=error_log_vars.get('rate_per_minute', 1),
+          burst=error_log_vars.get('burst', 1),
+          summary_interval=error_log_vars.get('summary_interval', 60),
+          max_fingerprints=error_log_vars.get('max_fingerprints', 1000))
+        atexit.register(_error_reporter.close)
+  return _error_reporter
+
+def _report_error(fingerprint, log_detail):
+  """エラーの報告(同じエラーが続く場合は詳細の出力を抑制し件数のみ記録する)
+
+  Args:
+      fingerprint (str): エラーの識別子
+      log_detail (function): 詳細を出力する処理
+  """
+  reporter = _get_error_reporter()
+  if reporter is None:
+    log_detail()
+  else:
+    reporter.report(fingerprint, log_detail)
+
 def _internal_server_error(e):
   """内部サーバエラーが発生した場合の処理
   """
-  logger.error('内部サーバエラーが発生しました。')
-  logger.error(e)
-  logger.error(f"セッション情報: {session_by_flask}")
-  logger.error(f"リクエスト情報: {request_by_flask}")
+  error = getattr(e, 'original_exception', None) or e
+  fingerprint = fingerprint_exception(error)
+  def log_detail():
+    detail = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+    logger.error('内部サーバエラーが発生しました。 識別子: %s\n%sセッション情報: %s\nリクエスト情報: %s', fingerprint, detail, session_by_flask, request_by_flask)
+  _report_error(fingerprint, log_detail)
   return render_template('errors/500.html'), 500
 
 def _page_not_found(e):
@@ -245,11 +738,135 @@ def _page_not_found(e):
   Returns:
       Any: 404エラーが発生した場合のテンプレートを変更する
   """
-  logger.error('404エラーが発生しました。')
-  logger.error(f"リクエスト情報: {request_by_flask}")
-  logger.error(e)
+  # NOTE: 存在しないURLへのクローラのアクセスなどでログが増えすぎないようにパスごとに抑制する
+  fingerprint = fingerprint_path(404, request_by_flask.path)
+  def log_detail():
+    logger.error('404エラーが発生しました。 識別子: %s, リクエスト情報: %s, %s', fingerprint, request_by_flask, e)
+  _report_error(fingerprint, log_detail)
   return render_template('errors/404.html'), 404
 
+# 現在のリクエストの計測用クラスを保持するgのキー
+_REQUEST_TIMER_KEY = '_beaker_request_timer'
+
+def _get_request_timer():
+  """現在のリクエストの計測用クラスを取得する
+
+  Returns:
+      RequestTimer: 計測用クラス(リクエスト外の場合はNone)
+  """
+  if not has_request_context():
+    return None
+  return g.get(_REQUEST_TIMER_KEY)
+
+def _start_request_timer():
+  """リクエストの処理時間の計測を開始する
+  """
+  g.setdefault(_REQUEST_TIMER_KEY, RequestTimer())
+
+def _add_server_timing(response):
+  """処理時間の内訳をServer-Timingヘッダーに設定する
+  """
+  timer = g.get(_REQUEST_TIMER_KEY)
+  if timer is not None:
+    server_timing = timer.server_timing()
+    query_stats = g.get(_REQUEST_QUERY_STATS_KEY)
+    if query_stats is not None:
+      server_timing += f', queries;desc="{query_stats.count}"'
+    response.headers['Server-Timing'] = server_timing
+  return response
+
+# 現在のリクエストのプロファイルを保持するgのキー
+_REQUEST_PROFILE_KEY = '_beaker_profile'
+
+# 現在のリクエストのSQLの実行状況を保持するgのキー
+_REQUEST_QUERY_STATS_KEY = '_beaker_query_stats'
+
+def _get_request_query_stats():
+  """現在のリクエストのSQLの実行状況を取得する(最初のSQLの実行時に作成する)
+
+  Returns:
+      RequestQueryStats: SQLの実行状況(リクエスト外の場合はNone)
+  """
+  if not has_request_context():
+    return None
+  query_stats = g.get(_REQUEST_QUERY_STATS_KEY)
+  if query_stats is None:
+    query_stats = g.setdefault(_REQUEST_QUERY_STATS_KEY, RequestQueryStats())
+  return query_stats
+
+def _log_request_queries(e):
+  """リクエストごとのSQLの実行状況をログ出力する
+  """
+  query_stats = g.get(_REQUEST_QUERY_STATS_KEY)
+  if query_stats is None:
+    return
+  summary = query_stats.summary()
+  logger.debug('SQLの実行状況 実行数: %s, 合計時間: %.3f秒, 遅いSQLの数: %s, 最も多く実行したSQL(%s回): %s',
+    summary['count'], summary['seconds'], summary['slow_count'], summary['top_count'], summary['top_statement'])
+
+def _db_pool_gauges():
+  """メトリクスに出力するDBの接続プールの状態を取得する
+  """
+  stats = _get_beaker_db().get_pool_stats()
+  return {
+    'beaker_db_pool_in_use': stats['in_use'],
+    'beaker_db_pool_idle': stats['idle'],
+    'beaker_db_pool_waiting': stats['waiting'],
+    'beaker_db_pool_wait_seconds_max': stats['wait_time_max'],
+  }
+
+# セッションの値を保存するストア(fork後に初期化するため保持する)
+_session_store = None
+
+def _create_session_store(session_vars):
+  """セッションの値を保存するストアの作成
+
+  Args:
+      session_vars (dict): Configのsessionの設定
+
+  Raises:
+      Exception: 存在しないストアが指定された場合
+
+  Returns:
+      MemorySessionStore | SQLiteSessionStore: セッションのストア(Cookieに保存する場合はNone)
+  """
+  global _session_store
+  store = session_vars.get('store', 'cookie')
+  logger.debug('セッションのストア: %s', store)
+  if store == 'cookie':
+    return None
+  if store == 'memory':
+    _session_store = MemorySessionStore(max_entries=session_vars.get('max_entries', 10000))
+  elif store == 'sqlite':
+    _session_store = SQLiteSessionStore(session_vars.get('path', './sessions/session.sqlite3'))
+  else:
+    raise Exception(f"存在しないセッションのストアです。store: {store}")
+  return _session_store
+
+class MeasuredSessionInterface(SessionInterface):
+  """セッションの読み込みと保存の時間を計測するためのセッション処理
+     実際の処理は元のセッション処理に委譲する
+  """
+  def __init__(self, session_interface):
+    self._session_interface = session_interface
+
+  def __getattr__(self, name):
+    return getattr(self._session_interface, name)
+
+  def make_null_session(self, app):
+    return self._session_interface.make_null_session(app)
+
+  def is_null_session(self, obj):
+    return self._session_interface.is_null_session(obj)
+
+  def open_session(self, app, request):
+    with measure(COMPONENT_SESSION):
+      return self._session_interface.open_session(app, request)
+
+  def save_session(self, app, session, response):
+    with measure(COMPONENT_SESSION):
+      return self._session_interface.save_session(app, session, response)
+
 class Beaker():
   """Beaker
      Flaskを拡張してWEBを作成しやすく拡張する
@@ -258,12 +875,17 @@ class Beaker():
 
     # コンフィグの読み込み
     app_vars = get_config()['app']
-    logger.debug(f"コンフィグ情報: {app_vars}")
+    logger.debug("コンフィグ情報: %s", app_vars)
 
     # flaskのappを生成
     # TODO: 今のモジュール配置位置でうまく動かすために下記のようにtemplate_folderを変更しているが 
     #       あるべきではないので配置場所も含めて検討する
     self.__flask = Flask(__name__, template_folder='../templates', static_folder='../statics')
+
+    # テンプレートのキャッシュ設定
+    # NOTE: jinja_envは最初に参照した時点で生成されるためCSRFトークン設定より前に行う
+    template_vars = get_config().get('template', {})
+    self._configure_template(template_vars)
   
     # CSRFトークン設定
     self.csrf = CSRFProtect(self.__flask)
@@ -272,7 +894,32 @@ class Beaker():
     # セッション関連処理
     self.__flask.permanent_session_lifetime = timedelta(minutes=app_vars['sessionTimeoutMinutes'])
     self.__flask.secret_key = app_vars['secretKey']
+    # NOTE: 延命の要否は_extension_sessionで判定するためFlaskによる毎リクエストのCookieの再設定は行わない
+    self.__flask.config['SESSION_REFRESH_EACH_REQUEST'] = False
+    # 有効期間のうちこの割合が経過した場合にのみ延命する(0の場合は毎リクエスト延命する)
+    self._session_refresh_seconds = self.__flask.permanent_session_lifetime.total_seconds() * app_vars.get('sessionRefreshRatio', 0)
+
+    # セッションの値をサーバ側に保存する場合はCookieにはセッションIDのみを保存する
+    session_store = _create_session_store(get_config().get('session', {}))
+    if session_store is not None:
+      self.__flask.session_interface = BeakerSessionInterface(session_store)
     
+    # 処理時間の計測(他のbefore_requestの処理時間も含めるため最初に登録する)
+    self._instrumentation = None
+    instrumentation_vars = get_config().get('instrumentation', {})
+    if instrumentation_vars.get('enabled', False):
+      self._register_instrumentation(instrumentation_vars)
+
+    # リクエストのプロファイル(他のbefore_requestの処理も含めるため計測の次に登録する)
+    self._profiler = None
+    profiling_vars = get_config().get('profiling', {})
+    if profiling_vars.get('enabled', False):
+      self._register_profiling(profiling_vars)
+
+    # リクエストごとのSQLの実行状況のログ出力
+    if get_config()['database'].get('query_log', {}).get('enabled', False):
+      self.__flask.teardown_request(_log_request_queries)
+
     # NOTE: 30分おきにログインするのはつらいのでリクエストがあった場合にセッションを延命する
     # 常にログインまでの時間としたい場合はこの処理をコメントアウトする
     self.before_request(self._extension_session)
@@ -283,18 +930,93 @@ class Beaker():
     # route定義をインポート
     # NOTE: 循環参照を防ぐためここでインポートする
     from web import router
+    # バックグラウンドジョブの状態確認と結果のダウンロード
+    jobs_vars = get_config().get('jobs', {})
+    if jobs_vars.get('enabled', False):
+      _register_job_routes(router, jobs_vars.get('route_prefix', '/_beaker/jobs'))
     router.regist_flask(self.__flask)
 
+    # レスポンスの圧縮と条件付きGET
+    self._register_response_processing(get_config().get('compression', {}), get_config().get('http_cache', {}))
+
     # templateの定義を取得
-    import template_filters
-    filters = inspect.getmembers(template_filters, inspect.ismethod if _py2 else inspect.isfunction)
-    for filter in filters:
-      _, function = filter
-      self.__flask.add_template_filter(function)
+    self._register_template_filters(template_vars)
+    # NOTE: テンプレート内の{% cache %}はページのキャッシュと同じストアを使用する
+    self.__flask.jinja_env.fragment_cache_getter = _get_response_cache
     
     # エラー関連処理
     self._register_error()
 
+    # 起動時にすべてのテンプレートをコンパイルしておく
+    if template_vars.get('precompile', False):
+      self.precompile_templates()
+
+  def _configure_template(self, template_vars):
+    """テンプレートのキャッシュ設定
+
+    Args:
+        template_vars (dict): Configのtemplateの設定
+    """
+    jinja_options = dict(self.__flask.jinja_options)
+
+    # コンパイル結果をファイルに保存してプロセスの起動直後もテンプレートの解析とコンパイルを省略する
+    bytecode_cache_dir = template_vars.get('bytecode_cache_dir')
+    if bytecode_cache_dir:
+      os.makedirs(bytecode_cache_dir, exist_ok=True)
+      jinja_options['bytecode_cache'] = FileSystemBytecodeCache(bytecode_cache_dir)
+
+    # メモリ上に保持するテンプレート数の上限
+    if 'cache_size' in template_vars:
+      jinja_options['cache_size'] = template_vars['cache_size']
+
+    # テンプレート内の{% cache %}で一部の描画結果をキャッシュする
+    jinja_options['extensions'] = [*jinja_options.get('extensions', ()), FragmentCacheExtension]
+    self.__flask.jinja_options = jinja_options
+
+    # NOTE: falseの場合はテンプレートの更新確認(ファイルのstat)を行わない(Noneの場合はデバッグモードのみ確認する)
+    self.__flask.config['TEMPLATES_AUTO_RELOAD'] = template_vars.get('auto_reload')
+
+  def _register_template_filters(self, template_vars):
+    """カスタムフィルタの登録処理
+       fast_filtersが有効な場合はフィルタ内のデバッグログを出力せず(trace_filtersが有効な場合を除く)、
+       pure_filterで印をつけたフィルタの結果をメモ化する
+
+    Args:
+        template_vars (dict): Configのtemplateの設定
+    """
+    global _filter_tracing
+    fast_filters = template_vars.get('fast_filters', False)
+    _filter_tracing = not fast_filters or template_vars.get('trace_filters', False)
+
+    import template_filters
+    filters = inspect.getmembers(template_filters, inspect.ismethod if _py2 else inspect.isfunction)
+    for filter in filters:
+      name, function = filter
+      # NOTE: template_filtersにインポートした関数はフィルタとして登録しない
+      if function.__module__ != template_filters.__name__:
+        continue
+      if fast_filters and is_pure_filter(function):
+        function = memoize_filter(function)
+      self.__flask.add_template_filter(function, name)
+
+  def precompile_templates(self):
+    """テンプレートフォルダ配下のすべてのテンプレートをコンパイルする
+       バイトコードキャッシュが有効な場合はコンパイル結果がファイルにも保存される
+
+    Returns:
+        int: コンパイルしたテンプレート数
+    """
+    jinja_env = self.__flask.jinja_env
+    count = 0
+    for template_name in jinja_env.list_templates():
+      try:
+        jinja_env.get_template(template_name)
+        count += 1
+      except TemplateError as e:
+        logger.error('テンプレートのコンパイルに失敗しました。 テンプレート名: %s エラー: %s', template_name, e)
+    logger.info('テンプレートをコンパイルしました。 件数: %s', count)
+    return count
+
   def test_client(self):
     """テストクライアントの返却
 
@@ -324,17 +1046,173 @@ class Beaker():
 
   def _extension_session(self):
     """セッションを延命する
+       静的ファイルや空のセッションの場合、前回の延命から一定時間が経過していない場合は延命しない
     """
-    session_by_flask.permanent = True
-    self.__flask.permanent_session_lifetime = timedelta(minutes=get_config()['app']['sessionTimeoutMinutes'])
-    session_by_flask.modified = True
+    if request_by_flask.endpoint in _SESSION_SKIP_ENDPOINTS or not session_by_flask:
+      return
+
+    refreshed_at = session_by_flask.get(_SESSION_REFRESHED_AT_KEY)
+    if refreshed_at is not None and session_by_flask.permanent \
+        and time.time() - refreshed_at < self._session_refresh_seconds:
+      return
+
+    _touch_session()
 
   def _request_logger(self):
     """リクエストの内容をログ出力
     """
-    logger.debug(f"セッション情報: {session_by_flask}")
-    logger.debug(f"リクエスト情報: {request_by_flask}")
+    logger.debug("セッション情報: %s", session_by_flask)
+    logger.debug("リクエスト情報: %s", request_by_flask)
   
+  def _register_instrumentation(self, instrumentation_vars):
+    """処理時間の計測の登録処理
+
+    Args:
+        instrumentation_vars (dict): Configのinstrumentationの設定
+    """
+    self._instrumentation = Instrumentation(instrumentation_vars.get('buckets', DEFAULT_BUCKETS))
+    self._instrumentation.add_gauge_source(_db_pool_gauges)
+    self._instrumentation.add_gauge_source(_admission_gauges)
+    set_timer_getter(_get_request_timer)
+
+    # NOTE: セッションの読み込みと保存の時間も計測できるようにセッションの処理を包む
+    self.__flask.session_interface = MeasuredSessionInterface(self.__flask.session_interface)
+
+    self.before_request(_start_request_timer)
+    if instrumentation_vars.get('server_timing', True):
+      self.after_request(_add_server_timing)
+    self.__flask.teardown_request(self._record_request_timer)
+
+    metrics_path = instrumentation_vars.get('metrics_path', '/_beaker/metrics')
+    self.__flask.add_url_rule(metrics_path, 'beaker_metrics', self._metrics, methods=['GET'])
+
+  def _register_profiling(self, profiling_vars):
+    """リクエストのプロファイルの登録処理
+
+    Args:
+        profiling_vars (dict): Configのprofilingの設定
+    """
+    self._profiler = RequestProfiler(
+      profiling_vars.get('output_dir', './profiles'),
+      mode=profiling_vars.get('mode', MODE_SAMPLING),
+      sample_rate=profiling_vars.get('sample_rate', 0.0),
+      header_name=profiling_vars.get('header_name', 'X-Beaker-Profile'),
+      token=profiling_vars.get('token'),
+      max_files=profiling_vars.get('max_files', 200),
+      interval=profiling_vars.get('interval', 0.005))
+    self.before_request(self._start_profile)
+    self.after_request(self._defer_streamed_profile)
+    self.__flask.teardown_request(self._finish_profile)
+
+    # NOTE: 処理時間の長い関数の一覧はコードの構成や処理時間を公開するため、トークンを設定した場合のみ登録する
+    if not profiling_vars.get('token'):
+      logger.info('profiling.tokenが設定されていないため処理時間の長い関数の一覧は無効です。')
+      return
+    profiles_path = profiling_vars.get('path', '/_beaker/profiles')
+    self.__flask.add_url_rule(profiles_path, 'beaker_profiles', self._profiles, methods=['GET'])
+
+  def _start_profile(self):
+    """対象のリクエストの場合はプロファイルを開始する(対象外の場合は判定のみ行う)
+    """
+    session = self._profiler.start(request_by_flask.headers)
+    if session is not None:
+      g.setdefault(_REQUEST_PROFILE_KEY, session)
+
+  def _defer_streamed_profile(self, response):
+    """ストリーミングのレスポンスの場合は送信が終わるまでプロファイルを続ける
+    """
+    if response.is_streamed and _REQUEST_PROFILE_KEY in g:
+      session = g.pop(_REQUEST_PROFILE_KEY)
+      route = self._get_profile_route()
+      response.call_on_close(lambda: self._write_profile(session, route))
+    return response
+
+  def _finish_profile(self, e):
+    """プロファイルを終了して結果を出力する
+    """
+    session = g.pop(_REQUEST_PROFILE_KEY, None)
+    if session is not None:
+      self._write_profile(session, self._get_profile_route())
+
+  def _get_profile_route(self):
+    return request_by_flask.url_rule.rule if request_by_flask.url_rule is not None else 'unmatched'
+
+  def _write_profile(self, session, route):
+    """プロファイルの結果の出力
+    """
+    path = self._profiler.finish(session, route)
+    logger.debug('プロファイルを出力しました。 %s', path)
+
+  def _profiles(self):
+    """ルートごとの処理時間の長い関数をJSONで返却する(ヘッダーにトークンの指定が必要)
+    """
+    if not self._profiler.is_authorized(request_by_flask.headers):
+      return jsonify({'error': 'forbidden'}), 403
+    return jsonify(self._profiler.get_hot_functions(request_by_flask.args.get('limit', 20, type=int)))
+
+  def _register_response_processing(self, compression_vars, http_cache_vars):
+    """レスポンスの圧縮とキャッシュの設定の登録処理
+
+    Args:
+        compression_vars (dict): Configのcompressionの設定
+        http_cache_vars (dict): Configのhttp_cacheの設定
+    """
+    compressor = None
+    if compression_vars.get('enabled', False):
+      compressor = ResponseCompressor(
+        min_size=compression_vars.get('min_size', 1024),
+        level=compression_vars.get('level', 6),
+        mime_types=compression_vars.get('mime_types', DEFAULT_MIME_TYPES),
+        use_brotli=compression_vars.get('brotli', True))
+    etag = http_cache_vars.get('etag', False)
+    static_fingerprint = None
+    if http_cache_vars.get('static_fingerprint', False):
+      static_fingerprint = StaticFingerprint(
+        self.__flask.static_folder,
+        max_age=http_cache_vars.get('static_max_age', 31536000),
+        check_modified=self.__flask.debug)
+      self.__flask.url_defaults(static_fingerprint.url_defaults)
+
+    if compressor is None and not etag and static_fingerprint is None:
+      return
+
+    def process_response(response):
+      if static_fingerprint is not None:
+        response = static_fingerprint.process(request_by_flask, response)
+      # NOTE: ETagは圧縮前の内容から作成し、304の場合は圧縮しない
+      if etag:
+        response = make_conditional(request_by_flask, response)
+      if compressor is not None:
+        response = compressor.process(request_by_flask, response)
+      return response
+    self.after_request(process_response)
+
+  def _record_request_timer(self, e):
+    """リクエストの処理時間の記録
+    """
+    timer = g.pop(_REQUEST_TIMER_KEY, None)
+    if timer is None:
+      return
+    route = request_by_flask.url_rule.rule if request_by_flask.url_rule is not None else 'unmatched'
+    # NOTE: SQLの記録が無効な場合はSQLの実行数は集計しない
+    query_stats = g.get(_REQUEST_QUERY_STATS_KEY)
+    self._instrumentation.record(route, timer, query_count=query_stats.count if query_stats is not None else None)
+
+  def _metrics(self):
+    """処理時間の集計結果をPrometheusのテキスト形式で返却する
+    """
+    response = make_response(self._instrumentation.render_prometheus())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+  def get_instrumentation(self):
+    """処理時間の集計の取得
+
+    Returns:
+        Instrumentation: 処理時間の集計(計測が無効の場合はNone)
+    """
+    return self._instrumentation
+
   def _register_error(self):
     """エラーハンドラの登録処理
     """
@@ -344,27 +1222,200 @@ class Beaker():
     self.__flask.register_error_handler(500, _internal_server_error)
 
   def run(self):
-    self.__flask.run(port=get_config()['app']['port'])
+    """サーバの起動処理(config.ymlのserver.typeに応じて起動するサーバを切り替える)
+
+    Raises:
+        ValueError: 存在しないサーバの種類が指定された場合
+    """
+    port = get_config()['app']['port']
+    server_vars = get_config().get('server', {})
+    server_type = server_vars.get('type', 'development')
+    if server_type == 'development':
+      self.__flask.run(port=port)
+    elif server_type == 'asgi':
+      self._run_asgi(port, server_vars)
+    elif server_type == 'production':
+      self._run_production(port, server_vars)
+    else:
+      raise ValueError(f"存在しないサーバの種類です。type: {server_type}")
+
+  def asgi_app(self, threads=10):
+    """ASGIのサーバで動かすためのアプリケーションの取得
+
+    Args:
+        threads (int, optional): リクエストを処理するスレッド数の上限. Defaults to 10.
+
+    Returns:
+        WSGIMiddleware: ASGIのアプリケーション
+    """
+    try:
+      from a2wsgi import WSGIMiddleware
+    except ImportError:
+      raise Exception("ASGIのサーバで起動するにはa2wsgiのインストールが必要です。(pip install a2wsgi uvicorn)")
+    # NOTE: FlaskはWSGIのアプリケーションのため、各リクエストは上限付きのスレッドで処理される
+    #       同時に処理できるリクエスト数はthreadsを超えない(I/Oの待機を重ねられるのはasync defの処理のみ)
+    return WSGIMiddleware(self.__flask, workers=threads)
+
+  def _run_asgi(self, port, server_vars):
+    """uvicornでの起動処理
+
+    Args:
+        port (int): ポート番号
+        server_vars (dict): サーバの設定
+    """
+    import uvicorn
+    uvicorn.run(
+      self.asgi_app(server_vars.get('threads', 10)),
+      host=server_vars.get('host', '127.0.0.1'),
+      port=port,
+      interface='asgi3')
+
+  def _run_production(self, port, server_vars):
+    """gunicornで複数プロセスのサーバとして起動する処理
+
+    Args:
+        port (int): ポート番号
+        server_vars (dict): サーバの設定
+    """
+    try:
+      from .server import BeakerServer, create_server_options
+    except ImportError:
+      raise Exception("productionで起動するにはgunicornのインストールが必要です。(pip install gunicorn ※Windowsでは使用できません)")
+    options = create_server_options(port, server_vars)
+    logger.info('サーバを起動します。 ワーカー数: %s, スレッド数: %s', options['workers'], options['threads'])
+    on_worker_start = _warm_up_db if server_vars.get('warm_up_db', False) else None
+    BeakerServer(self.__flask, options, on_worker_start).run()
+
+def create_app(config_file_name=None):
+  """Beakerの生成処理(アプリケーションファクトリ)
+
+  Args:
+      config_file_name (str, optional): Configファイルのパス(指定しない場合は./config.yml). Defaults to None.
+
+  Returns:
+      Beaker: Beaker
+  """
+  if config_file_name is not None:
+    configure(config_file_name)
+  return Beaker()
 
 class BeakerDB():
-  def __init__(self, config, logger):
+  # 最後に書き込みを行った時刻を保持するセッションのキー
+  LAST_WRITE_SESSION_KEY = '_beaker_last_write'
+
+  def __init__(self, config, logger, connect=None):
     """Beaker用DBの使用クラス
 
     Args:
         config (BeakerConfig): Beakerのコンフィグ用クラス
         logger (BeakerLogger): Beakerのログ用クラス
+        connect (function, optional): 接続情報の辞書を受け取り新しい接続を作成する処理(テスト時のスタブなど). Defaults to None.
     """
     self._logger = logger
 
     db_info = config['database']
-    self._logger.debug(f"dbの接続情報: {db_info}")
+    self._logger.debug("dbの接続情報: %s", db_info)
+
+    # 遅いSQLとN+1の検出(有効な場合は接続プールから貸し出した接続のカーソルで計測する)
+    query_log_info = db_info.get('query_log', {})
+    self._query_tracer = None
+    if query_log_info.get('enabled', False):
+      self._query_tracer = QueryTracer(
+        self._logger,
+        slow_threshold=query_log_info.get('slow_threshold', 0.5),
+        n_plus_one_threshold=query_log_info.get('n_plus_one_threshold', 10),
+        stats_getter=_get_request_query_stats)
+
+    # NOTE: スレッドごとのリクエストで接続を共有したり毎回接続したりしないように接続プールから貸し出す
+    self._pool_info = db_info.get('pool', {})
+    self._pool = self._create_pool(db_info, connect)
+    self._connector = PooledConnecter(self._pool)
+
+    # 読み込み専用の処理はレプリカが設定されている場合はレプリカへ振り分ける
+    # レプリカの接続情報で省略した項目はプライマリの設定を使用する
+    primary_info = {key: db_info[key] for key in ('dbname', 'host', 'user', 'password')}
+    replica_pools = [self._create_pool({**primary_info, **replica}, connect) for replica in db_info.get('replicas', [])]
+    self._replica_selector = None
+    if replica_pools:
+      self._replica_selector = PoolSelector(replica_pools, db_info.get('replica_selection', PoolSelector.ROUND_ROBIN))
+
+    # 書き込み後の指定秒数は同じセッションの読み込みもプライマリで行う(0の場合は行わない)
+    self._read_your_writes_seconds = db_info.get('read_your_writes_seconds', 0)
+
+    # クエリビルダの取得結果のキャッシュ(有効な場合もselectでcache_ttlを指定したもののみキャッシュする)
+    cache_info = db_info.get('query_cache', {})
+    self._query_cache = None
+    if cache_info.get('enabled', False):
+      self._query_cache = QueryCache(
+        max_entries=cache_info.get('max_entries', 1000),
+        max_bytes=cache_info.get('max_bytes', 10 * 1024 * 1024))
+
+  def _create_pool(self, db_info, connect):
+    """接続プールの作成
+
+    Args:
+        db_info (dict): 接続情報
+        connect (function): 接続情報の辞書を受け取り新しい接続を作成する処理(Noneの場合はpgsupporterで接続する)
+
+    Returns:
+        ConnectionPool: 接続プール
+    """
+    if connect is None:
+      db_connecter = DbConnecter(
+        db_info['dbname'], \
+        db_info['host'],\
+        db_info['user'],\
+        db_info['password'])
+      create_connection = db_connecter.get_connection
+    else:
+      create_connection = functools.partial(connect, db_info)
+
+    return ConnectionPool(
+      create_connection,
+      self._logger,
+      min_size=self._pool_info.get('min_size', 1),
+      max_size=self._pool_info.get('max_size', 10),
+      timeout=self._pool_info.get('timeout', 30.0),
+      max_lifetime=self._pool_info.get('max_lifetime', 3600.0),
+      health_check=self._pool_info.get('health_check', True),
+      query_tracer=self._query_tracer)
+
+  def _select_pool(self, read_only):
+    """読み込み専用か否かに応じて接続プールを選択する
+
+    Args:
+        read_only (bool): 読み込み専用の処理か
+
+    Returns:
+        ConnectionPool: 使用する接続プール
+    """
+    if not read_only:
+      return self._pool
+    if self._replica_selector is None or self._is_pinned_to_primary():
+      return self._pool
+    return self._replica_selector.select()
+
+  def _mark_write(self, tables=frozenset()):
+    """書き込みを行った時刻をセッションに記録する
+       ロールバックされた書き込みで読み込み先を固定しないようにコミット後に呼び出す
+
+    Args:
+        tables (frozenset, optional): 書き込みを行ったテーブル名(コミット後の処理として使用するため受け取るのみ). Defaults to frozenset().
+    """
+    if self._replica_selector is not None and self._read_your_writes_seconds > 0 and has_request_context():
+      session_by_flask[self.LAST_WRITE_SESSION_KEY] = time.time()
+
+  def _is_pinned_to_primary(self):
+    """同じセッションで直前に書き込みを行ったため読み込みもプライマリで行うか判定する
+
+    Returns:
+        bool: プライマリで読み込む場合はTrue
+    """
+    if self._read_your_writes_seconds <= 0 or not has_request_context():
+      return False
+    last_write = session_by_flask.get(self.LAST_WRITE_SESSION_KEY)
+    return last_write is not None and time.time() - last_write < self._read_your_writes_seconds
 
-    self._connector = DbConnecter(
-      db_info['dbname'], \
-      db_info['host'],\
-      db_info['user'],\
-      db_info['password'])
-  
   def start_transaction(self, read_only = True):
     """トランザクション開始処理
 
@@ -372,15 +1423,117 @@ class BeakerDB():
         read_only (bool, optional): 読み込み専用か？ 読み込み専用の場合はTrueとなりコミットを行わない. Defaults to True.
 
     Returns:
-        Transaction: トランザクションを返却する
+        BeakerTransaction: トランザクションを返却する
+    """
+    # NOTE: トランザクションごとにコネクタを生成して開始時に接続を借り、終了時にプールへ返却する
+    tx = BeakerTransaction(PooledConnecter(self._select_pool(read_only)), read_only)
+    if not read_only:
+      tx.add_commit_hook(self._mark_write)
+      if self._query_cache is not None:
+        tx.add_commit_hook(self._invalidate_query_cache)
+    return tx
+
+  def _invalidate_query_cache(self, tables):
+    """コミットしたトランザクションで書き込みを行ったテーブルの取得結果のキャッシュを破棄する
+
+    Args:
+        tables (frozenset): 書き込みを行ったテーブル名
+    """
+    for table in tables:
+      self._query_cache.invalidate_table(table)
+
+  def create_query_builder(self, tx=None):
+    """クエリビルダの生成処理
+
+    Args:
+        tx (Transaction, optional): 使用するトランザクション(指定しない場合は処理ごとに接続を取得する). Defaults to None.
+
+    Returns:
+        BeakerQueryBuilder: クエリビルダ
     """
-    return Transaction(self._connector, read_only)
+    if tx is None:
+      # NOTE: 取得処理はレプリカ、登録・更新・削除はプライマリで行う
+      return BeakerQueryBuilder(db_conecter=RoutingConnecter(self._select_pool), query_cache=self._query_cache, on_commit=self._mark_write)
+    return BeakerQueryBuilder(tx=tx, query_cache=self._query_cache)
 
   def get_db_connector(self):
     return self._connector
 
+  def get_pool_stats(self):
+    """接続プールの統計情報を取得する
+
+    Returns:
+        dict: 使用中の接続数(in_use)、待機中の接続数(idle)、待ち時間(wait_time_total, wait_time_max)などの統計情報
+    """
+    return self._pool.get_stats()
+
+  def get_replica_pool_stats(self):
+    """レプリカの接続プールの統計情報を取得する
+
+    Returns:
+        list: レプリカごとの接続プールの統計情報(レプリカがない場合は空のリスト)
+    """
+    if self._replica_selector is None:
+      return []
+    return [pool.get_stats() for pool in self._replica_selector.get_pools()]
+
+  def get_query_cache_stats(self):
+    """取得結果のキャッシュの統計情報を取得する
+
+    Returns:
+        dict: ヒット数(hits)、ミス数(misses)、上限による破棄数(evictions)などの統計情報(キャッシュが無効の場合はNone)
+    """
+    if self._query_cache is None:
+      return None
+    return self._query_cache.get_stats()
+
+  def warm_up(self):
+    """接続プールに最小接続数まで接続を作成しておく
+    """
+    self._pool.warm_up()
+    if self._replica_selector is not None:
+      for pool in self._replica_selector.get_pools():
+        pool.warm_up()
+
+  def close(self):
+    """接続プールの接続をすべて閉じる
+    """
+    self._pool.close()
+    if self._replica_selector is not None:
+      for pool in self._replica_selector.get_pools():
+        pool.close()
+
+
+_beaker_db = None
+# DBの接続処理(Noneの場合はpgsupporterで接続する)
+_db_connect = None
+def _get_beaker_db():
+  """Beaker用DBの使用クラスを取得する(最初に使用した時点で生成する)
+
+  Returns:
+      BeakerDB: Beaker用DBの使用クラス
+  """
+  global _beaker_db
+  if _beaker_db is None:
+    with _init_lock:
+      if _beaker_db is None:
+        _beaker_db = BeakerDB(get_config(), logger, connect=_db_connect)
+  return _beaker_db
+
+def set_db_connect(connect):
+  """DBの接続処理を差し替える(DBに接続せずに行うベンチマークやテスト用)
+     作成済みの接続プールは閉じて、次に使用した時点で作り直す
+
+  Args:
+      connect (function): 接続情報の辞書を受け取り新しい接続を作成する処理(Noneの場合はpgsupporterで接続する)
+  """
+  global _beaker_db, _db_connect
+  with _init_lock:
+    _db_connect = connect
+    if _beaker_db is not None:
+      _beaker_db.close()
+      _beaker_db = None
 
-_beaker_db = BeakerDB(get_config(), logger)
 def start_transaction(read_only = True):
   """トランザクション開始処理
 
@@ -390,13 +1543,219 @@ def start_transaction(read_only = True):
   Returns:
       Transaction: トランザクションを返却する
   """
-  logger.debug(f'read_only: {read_only}')
-  return _beaker_db.start_transaction(read_only=read_only)
+  logger.debug('read_only: %s', read_only)
+  return _get_beaker_db().start_transaction(read_only=read_only)
+
+_blocking_executor = None
+def _get_blocking_executor():
+  """async defの処理からブロッキングする処理を実行するスレッドプールを取得する(最初に使用した時点で生成する)
+
+  Returns:
+      BlockingExecutor: ブロッキングする処理を実行するスレッドプール
+  """
+  global _blocking_executor
+  if _blocking_executor is None:
+    with _init_lock:
+      if _blocking_executor is None:
+        async_vars = get_config().get('async', {})
+        _blocking_executor = BlockingExecutor(max_workers=async_vars.get('max_workers', 10))
+  return _blocking_executor
+
+def start_async_transaction(read_only = True):
+  """async defの処理で使用するトランザクション開始処理
+
+  Args:
+      read_only (bool, optional): 読み込み専用か？ 読み込み専用の場合はTrueとなりコミットを行わない. Defaults to True.
+
+  Returns:
+      AsyncTransaction: async withで使用するトランザクションを返却する
+  """
+  logger.debug('read_only: %s', read_only)
+  return AsyncTransaction(_get_beaker_db().start_transaction(read_only=read_only), _get_blocking_executor())
+
+async def run_blocking(function, *args, **kwargs):
+  """async defの処理からブロッキングする処理(外部APIの呼び出しなど)をスレッドプールで実行する
+
+  Args:
+      function (function): 実行する処理
+
+  Returns:
+      Any: 処理の戻り値
+  """
+  return await _get_blocking_executor().run(function, *args, **kwargs)
+
+_job_manager = None
+def _get_job_manager():
+  """バックグラウンドジョブの管理を取得する(最初に使用した時点で生成する)
+
+  Raises:
+      Exception: ジョブが無効の場合
+
+  Returns:
+      JobManager: バックグラウンドジョブの管理
+  """
+  global _job_manager
+  if _job_manager is None:
+    with _init_lock:
+      if _job_manager is None:
+        jobs_vars = get_config().get('jobs', {})
+        if not jobs_vars.get('enabled', False):
+          raise Exception("バックグラウンドジョブを使用するにはconfig.ymlのjobs.enabledをtrueにしてください。")
+        _job_manager = JobManager(
+          jobs_vars.get('spool_dir', './job_spool'),
+          logger,
+          executor=jobs_vars.get('executor', EXECUTOR_THREAD),
+          max_workers=jobs_vars.get('max_workers', 2),
+          max_queued=jobs_vars.get('max_queued', 100),
+          retention_seconds=jobs_vars.get('retention_seconds', 3600),
+          stale_seconds=jobs_vars.get('stale_seconds', 86400))
+  return _job_manager
+
+def submit_job(function, *args, file_name='result', mimetype='application/octet-stream', **kwargs):
+  """時間のかかる処理をバックグラウンドジョブとして登録する
+     functionは第1引数にJobContextを受け取り、job.write_csvなどで結果を書き込むかbytesまたはstrで返却する
+     状態の確認とダウンロードのルートは登録したセッションからのみ使用できる
+
+  Args:
+      function (function): 実行する処理
+      file_name (str, optional): 結果をダウンロードする際のファイル名. Defaults to 'result'.
+      mimetype (str, optional): 結果のMIMEタイプ. Defaults to 'application/octet-stream'.
+
+  Raises:
+      JobQueueFullError: 実行待ちと実行中のジョブ数が上限に達している場合
+
+  Returns:
+      str: ジョブID
+  """
+  return _get_job_manager().submit(function, *args, file_name=file_name, mimetype=mimetype, owner=_get_job_owner(create=True), **kwargs)
+
+def get_job_status(job_id):
+  """バックグラウンドジョブの状態を取得する
+
+  Args:
+      job_id (str): ジョブID
+
+  Returns:
+      dict: 状態(state)、進捗(progress, total)、ファイル名(file_name)などの辞書(存在しない場合はNone)
+  """
+  return _get_job_manager().get_status(job_id)
+
+# ジョブを登録したセッションを識別する値を保持するセッションのキー
+JOB_OWNER_SESSION_KEY = '_beaker_job_owner'
+
+def _get_job_owner(create=False):
+  """ジョブの登録者を識別する値をセッションから取得する
+
+  Args:
+      create (bool, optional): セッションに存在しない場合に作成するか. Defaults to False.
+
+  Returns:
+      str: 登録者を識別する値(リクエストの処理中でない場合や存在しない場合はNone)
+  """
+  if not has_request_context():
+    return None
+  owner = session_by_flask.get(JOB_OWNER_SESSION_KEY)
+  if owner is None and create:
+    owner = session_by_flask[JOB_OWNER_SESSION_KEY] = secrets.token_hex(16)
+  return owner
+
+def _is_job_owner(status):
+  """ジョブを登録したセッションからのリクエストか判定する
+     NOTE: リクエスト外で登録したジョブはルートからは参照できない
+  """
+  owner = _get_job_owner()
+  return owner is not None and status.get('owner') is not None and hmac.compare_digest(status['owner'], owner)
+
+def _job_status(job_id):
+  """バックグラウンドジョブの状態をJSONで返却する
+  """
+  status = get_job_status(job_id)
+  # NOTE: 他のセッションのジョブは存在を知られないように存在しない場合と同じく404とする
+  if status is None or not _is_job_owner(status):
+    return jsonify({'error': 'not found'}), 404
+  result = {key: status.get(key) for key in ('id', 'state', 'progress', 'total', 'file_name', 'error')}
+  result['percent'] = round(status['progress'] * 100 / status['total'], 1) if status.get('total') else None
+  if status['state'] == STATE_DONE and status.get('has_result'):
+    result['download_url'] = url_for('_job_download', job_id=job_id)
+  return jsonify(result)
+
+def _job_download(job_id):
+  """バックグラウンドジョブの結果のダウンロード
+     NOTE: send_fileはWSGIサーバのfile_wrapper(gunicornの場合はsendfile)でファイルをメモリに読み込まずに送信する
+  """
+  # NOTE: 状態とファイルを一度に取得し、確認後に保持期間を過ぎて削除された場合も404とする
+  result = _get_job_manager().open_result(job_id)
+  if result is None:
+    return jsonify({'error': 'not found'}), 404
+  status, file = result
+  if not _is_job_owner(status):
+    file.close()
+    return jsonify({'error': 'not found'}), 404
+  return send_file(file, mimetype=status['mimetype'], as_attachment=True, download_name=status['file_name'])
+
+def _register_job_routes(router, route_prefix):
+  """バックグラウンドジョブの状態確認とダウンロードのルートを登録する(登録済みの場合は何もしない)
+
+  Args:
+      router (BeakerRouter): 登録先のルータ
+      route_prefix (str): ルートのパスの先頭
+  """
+  status_path = f'{route_prefix}/<job_id>'
+  if any(route['path'] == status_path for route in router.get_routes()):
+    return
+  router.get(status_path, _job_status)
+  router.get(f'{status_path}/download', _job_download)
+
+def _warm_up_db():
+  """各ワーカーの起動時にDBの接続を作成しておく(失敗した場合は最初に使用した時点で接続する)
+  """
+  try:
+    _get_beaker_db().warm_up()
+  except Exception as e:
+    logger.warning('DBの接続の事前作成に失敗しました。 %s', e)
+
+# fork前に生成したDBの使用クラス(親プロセスの接続を閉じないように参照のみ保持する)
+_inherited_beaker_dbs = []
+
+def _reset_after_fork():
+  """fork後の子プロセスで親プロセスから引き継いだDBの接続やスレッドを使用しないように初期化する
+  """
+  global _init_lock, _beaker_db, _blocking_executor, _response_cache, _job_manager, _error_reporter
+  _init_lock = threading.RLock()
+  if _beaker_db is not None:
+    # NOTE: 子プロセスで接続を閉じると同じソケットを使用している親プロセスの接続も切断されるため閉じずに破棄する
+    _inherited_beaker_dbs.append(_beaker_db)
+    _beaker_db = None
+  _blocking_executor = None
+  _response_cache = None
+  # NOTE: ジョブの状態はスプールに保存しているため、子プロセスでは新しいプールで管理する
+  _job_manager = None
+  _error_reporter = None
+  if _session_store is not None:
+    _session_store.reset_after_fork()
+  logger.reset_after_fork()
+
+if hasattr(os, 'register_at_fork'):
+  os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_db_pool_stats():
+  """DBの接続プールの統計情報を取得する
+
+  Returns:
+      dict: 使用中の接続数(in_use)、待機中の接続数(idle)、待ち時間(wait_time_total, wait_time_max)などの統計情報
+  """
+  return _get_beaker_db().get_pool_stats()
+
+def get_query_cache_stats():
+  """クエリビルダの取得結果のキャッシュの統計情報を取得する
+
+  Returns:
+      dict: ヒット数(hits)、ミス数(misses)、上限による破棄数(evictions)などの統計情報(キャッシュが無効の場合はNone)
+  """
+  return _get_beaker_db().get_query_cache_stats()
 
 def create_query_builder(tx=None):
-  if tx is None:
-    return QueryBuilder(db_conecter=_beaker_db.get_db_connector())
-  return QueryBuilder(tx=tx)
+  return _get_beaker_db().create_query_builder(tx)
 
 request = request_by_flask
 
@@ -409,7 +1768,7 @@ def create_csv(headers):
   Returns:
       CsvCreator: CsvCreatorの返却
   """
-  logger.debug(f'headers: {headers}')
+  logger.debug('headers: %s', headers)
   return CsvCreator(logger, headers)
 
 def make_csv_response(csv_data, file_name, chara_set='shift_jis'):
@@ -421,11 +1780,44 @@ def make_csv_response(csv_data, file_name, chara_set='shift_jis'):
   Returns:
       response: csvのレスポンスを返却する
   """
-  logger.debug(f'csv_data: {csv_data}')
-  logger.debug(f'file_name: {file_name}')
-  logger.debug(f'chara_set: {chara_set}')
+  # NOTE: CSVの内容全体を出力すると大きなファイルでログが肥大化するためサイズのみ出力する
+  logger.debug('csv_data: %s bytes', len(csv_data))
+  logger.debug('file_name: %s', file_name)
+  logger.debug('chara_set: %s', chara_set)
   response = make_response()
   response.data = csv_data
+  _set_csv_headers(response, file_name, chara_set)
+  return response
+
+def make_csv_stream_response(headers, data_rows, file_name, chara_set='shift_jis', chunk_size=DEFAULT_CHUNK_SIZE):
+  """CSVをストリーミングで返却するレスポンスを返却する
+     行はレスポンスの送信中に読み込まれるため、行数に関わらず使用するメモリは一定となる
+
+  Args:
+      headers (dict): keyとヘッダ名の辞書
+      data_rows (iterable): headerのkeyにマッピングするvalueの辞書を返すイテラブル(DBのカーソルなど)
+      file_name (str): CSVファイル名(拡張子は不要)
+      chara_set (str, optional): 文字コード. Defaults to 'shift_jis'.
+      chunk_size (int, optional): 1回で送信する文字数の目安. Defaults to DEFAULT_CHUNK_SIZE.
+
+  Returns:
+      response: csvのストリーミングレスポンスを返却する
+  """
+  logger.debug('headers: %s', headers)
+  logger.debug('file_name: %s', file_name)
+  logger.debug('chara_set: %s', chara_set)
+  csv_creator = CsvCreator(logger, headers)
+  response = Response(stream_with_context(csv_creator.iter_encoded(data_rows, chara_set, chunk_size)))
+  _set_csv_headers(response, file_name, chara_set)
+  return response
+
+def _set_csv_headers(response, file_name, chara_set):
+  """CSVのレスポンスヘッダーを設定する
+
+  Args:
+      response (response): 設定対象のレスポンス
+      file_name (str): CSVファイル名(拡張子は不要)
+      chara_set (str): 文字コード
+  """
   response.headers['Content-Type'] = f'text/csv; charset={chara_set}'
   response.headers['Content-Disposition'] = f'attachment; filename={file_name}.csv'
-  return response
@@ -0,0 +1,202 @@
+from decimal import Decimal
+import datetime
+import io
+import itertools
+import json
+import re
+import time
+import uuid
+
+from .instrumentation import COMPONENT_DB, measure
+
+# 一括登録の方法(values: 複数行のVALUES, copy: COPY FROM STDIN)
+METHOD_VALUES = 'values'
+METHOD_COPY = 'copy'
+
+DEFAULT_BATCH_SIZE = 1000
+
+# テーブル名と項目名に使用できる文字(SQLに埋め込むため、それ以外の文字は受け付けない)
+_IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$')
+
+def validate_identifier(name):
+  """ テーブル名と項目名の確認
+
+  Args:
+      name (str): テーブル名または項目名
+
+  Returns:
+      str: 確認したテーブル名または項目名
+
+  Raises:
+      ValueError: 使用できない文字が含まれている場合
+  """
+  if not isinstance(name, str) or not _IDENTIFIER_PATTERN.match(name):
+    raise ValueError(f"テーブル名または項目名に使用できない文字が含まれています。name: {name}")
+  return name
+
+def iter_batches(rows, batch_size):
+  """ 行を指定件数ずつに分割する(ジェネレータの場合も1回分の行のみ保持する)
+
+  Args:
+      rows (iterable): 行のイテラブル
+      batch_size (int): 1回分の件数
+
+  Yields:
+      list: 1回分の行
+  """
+  iterator = iter(rows)
+  while True:
+    batch = list(itertools.islice(iterator, batch_size))
+    if not batch:
+      return
+    yield batch
+
+def create_insert_sql(table, columns, row_count, conflict_columns=None, update_columns=None):
+  """ 複数行のINSERT文の作成
+
+  Args:
+      table (str): テーブル名
+      columns (list): 項目名
+      row_count (int): 行数
+      conflict_columns (list, optional): 重複を判定する項目名(指定した場合はON CONFLICTを付与する). Defaults to None.
+      update_columns (list, optional): 重複した場合に更新する項目名(空の場合は何もしない). Defaults to None.
+
+  Returns:
+      str: INSERT文
+  """
+  placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+  sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ', '.join([placeholders] * row_count)
+  if conflict_columns:
+    sql += f" ON CONFLICT ({', '.join(conflict_columns)})"
+    if update_columns:
+      sql += ' DO UPDATE SET ' + ', '.join(f'{column} = EXCLUDED.{column}' for column in update_columns)
+    else:
+      sql += ' DO NOTHING'
+  return sql + ';'
+
+def _to_copy_field(value):
+  """ COPYのCSV形式の値への変換(Noneは引用符なしの空文字でNULLとして扱われる)
+
+  Raises:
+      ValueError: COPYで登録できない型の値の場合
+  """
+  if value is None:
+    return ''
+  if isinstance(value, bool):
+    return 't' if value else 'f'
+  if isinstance(value, (int, float, Decimal)):
+    return str(value)
+  if isinstance(value, (bytes, bytearray, memoryview)):
+    # NOTE: bytea型の16進数形式で送信する
+    text = '\\x' + bytes(value).hex()
+  elif isinstance(value, (dict, list)):
+    # NOTE: json/jsonb型の値として送信する
+    text = json.dumps(value, ensure_ascii=False)
+  elif isinstance(value, (str, datetime.date, datetime.time, datetime.timedelta, uuid.UUID)):
+    text = str(value)
+  else:
+    raise ValueError(f"COPYで登録できない型の値です。type: {type(value).__name__}")
+  return '"' + text.replace('"', '""') + '"'
+
+def create_copy_data(columns, rows):
+  """ COPY FROM STDINで送信するCSV形式のデータの作成
+
+  Args:
+      columns (list): 項目名
+      rows (list): 行
+
+  Returns:
+      io.StringIO: CSV形式のデータ
+  """
+  buffer = io.StringIO()
+  for row in rows:
+    buffer.write(','.join(_to_copy_field(row[column]) for column in columns))
+    buffer.write('\n')
+  buffer.seek(0)
+  return buffer
+
+class BulkWriter():
+  """ 複数行の一括登録
+      指定件数ずつ1回のSQLで登録し、1回ごとの処理時間を記録する
+  """
+
+  def __init__(self, table, columns=None, batch_size=DEFAULT_BATCH_SIZE, method=METHOD_VALUES, conflict_columns=None, update_columns=None, on_batch=None):
+    """ 一括登録の初期化
+
+    Args:
+        table (str): テーブル名
+        columns (list, optional): 項目名(指定しない場合は最初の行のキー). Defaults to None.
+        batch_size (int, optional): 1回で登録する件数. Defaults to DEFAULT_BATCH_SIZE.
+        method (str, optional): 登録の方法(values: 複数行のVALUES, copy: COPY FROM STDIN). Defaults to METHOD_VALUES.
+        conflict_columns (list, optional): 重複を判定する項目名(valuesの場合のみ). Defaults to None.
+        update_columns (list, optional): 重複した場合に更新する項目名. Defaults to None.
+        on_batch (function, optional): 1回分の登録後に(回数, 件数, 秒数)を受け取る処理. Defaults to None.
+
+    Raises:
+        ValueError: 設定が不正な場合
+    """
+    if batch_size < 1:
+      raise ValueError(f"1回で登録する件数の設定が不正です。batch_size: {batch_size}")
+    if method not in (METHOD_VALUES, METHOD_COPY):
+      raise ValueError(f"存在しない登録の方法です。method: {method}")
+    if method == METHOD_COPY and conflict_columns:
+      raise ValueError("COPYでは重複した場合の処理は指定できません。")
+    self._table = validate_identifier(table)
+    self._columns = [validate_identifier(column) for column in columns] if columns else None
+    self._batch_size = batch_size
+    self._method = method
+    self._conflict_columns = [validate_identifier(column) for column in conflict_columns or []]
+    self._update_columns = [validate_identifier(column) for column in update_columns] if update_columns is not None else None
+    self._on_batch = on_batch
+
+  def write(self, cursor, rows):
+    """ 一括登録の実行
+
+    Args:
+        cursor (cursor): 使用するカーソル
+        rows (iterable): 登録する行(項目名と値の辞書)のイテラブル
+
+    Returns:
+        dict: 登録件数(rows)、回数(batches)、合計秒数(seconds)、1回の最大秒数(max_batch_seconds)
+    """
+    stats = {'rows': 0, 'batches': 0, 'seconds': 0.0, 'max_batch_seconds': 0.0}
+    for batch in iter_batches(rows, self._batch_size):
+      columns = self._get_columns(batch)
+      start = time.perf_counter()
+      with measure(COMPONENT_DB):
+        if self._method == METHOD_COPY:
+          cursor.copy_expert(f"COPY {self._table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", create_copy_data(columns, batch))
+        else:
+          cursor.execute(self._create_sql(columns, len(batch)), [row[column] for row in batch for column in columns])
+      seconds = time.perf_counter() - start
+
+      stats['rows'] += len(batch)
+      stats['batches'] += 1
+      stats['seconds'] += seconds
+      stats['max_batch_seconds'] = max(stats['max_batch_seconds'], seconds)
+      if self._on_batch is not None:
+        self._on_batch(stats['batches'], len(batch), seconds)
+    return stats
+
+  def _get_columns(self, batch):
+    """ 登録する項目名の取得(指定しない場合は最初の行のキー)
+
+    Raises:
+        ValueError: 行によって項目が異なる場合
+
+    Returns:
+        list: 項目名
+    """
+    if self._columns is None:
+      self._columns = [validate_identifier(column) for column in batch[0].keys()]
+    # 重複した場合に更新する項目を指定しない場合は重複を判定する項目以外をすべて更新する
+    if self._update_columns is None:
+      self._update_columns = [column for column in self._columns if column not in self._conflict_columns]
+    column_set = set(self._columns)
+    for row in batch:
+      if row.keys() != column_set:
+        raise ValueError(f"行によって項目が異なります。 columns: {self._columns}, row: {list(row.keys())}")
+    return self._columns
+
+  def _create_sql(self, columns, row_count):
+    return create_insert_sql(self._table, columns, row_count, self._conflict_columns, self._update_columns)
@@ -0,0 +1,236 @@
+import hashlib
+import os
+import threading
+import zlib
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+# 圧縮対象とするContent-Type
+DEFAULT_MIME_TYPES = (
+  'text/html',
+  'text/css',
+  'text/plain',
+  'text/csv',
+  'text/javascript',
+  'application/javascript',
+  'application/json',
+  'application/xml',
+  'image/svg+xml',
+)
+
+# 圧縮しないステータスコード
+_SKIP_STATUS_CODES = frozenset([204, 206, 304])
+
+class ResponseCompressor():
+  """ レスポンスの圧縮(gzip。brotliがインストールされている場合はbrotliを優先する)
+  """
+
+  def __init__(self, min_size=1024, level=6, mime_types=DEFAULT_MIME_TYPES, use_brotli=True):
+    """ 圧縮処理の初期化
+
+    Args:
+        min_size (int, optional): 圧縮するレスポンスの最小バイト数(ストリーミングの場合は常に圧縮する). Defaults to 1024.
+        level (int, optional): gzipの圧縮レベル(1-9). Defaults to 6.
+        mime_types (tuple, optional): 圧縮対象とするContent-Type. Defaults to DEFAULT_MIME_TYPES.
+        use_brotli (bool, optional): brotliがインストールされている場合に使用するか. Defaults to True.
+    """
+    self._min_size = min_size
+    self._level = level
+    self._mime_types = frozenset(mime_types)
+    self._use_brotli = use_brotli and brotli is not None
+
+  def process(self, request, response):
+    """ クライアントが対応している場合にレスポンスを圧縮する
+
+    Args:
+        request (Request): リクエスト
+        response (Response): レスポンス
+
+    Returns:
+        Response: 圧縮したレスポンス
+    """
+    if not self._is_compressible(response):
+      return response
+    # NOTE: 圧縮するかはAccept-Encodingで変わるため、圧縮しない場合もキャッシュが区別できるようにする
+    response.vary.add('Accept-Encoding')
+
+    encoding = self._select_encoding(request)
+    if encoding is None:
+      return response
+
+    if response.is_streamed:
+      response.response = self._compress_stream(response.response, encoding)
+      response.headers.pop('Content-Length', None)
+    else:
+      data = response.get_data()
+      if len(data) < self._min_size:
+        return response
+      response.set_data(self._compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+  def _is_compressible(self, response):
+    if response.status_code < 200 or response.status_code in _SKIP_STATUS_CODES:
+      return False
+    # NOTE: send_fileのレスポンス(静的ファイルなど)はファイルを直接送信するため圧縮しない
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+      return False
+    if response.cache_control.no_transform:
+      return False
+    return response.mimetype in self._mime_types
+
+  def _select_encoding(self, request):
+    """ Accept-Encodingから使用する圧縮形式を選択する
+
+    Returns:
+        str: 圧縮形式(圧縮しない場合はNone)
+    """
+    accept_encodings = request.accept_encodings
+    if self._use_brotli and accept_encodings['br']:
+      return 'br'
+    if accept_encodings['gzip']:
+      return 'gzip'
+    return None
+
+  def _create_compressor(self, encoding):
+    """ 圧縮処理の生成
+
+    Returns:
+        tuple: データを圧縮する処理、残りのデータを出力して終了する処理
+    """
+    if encoding == 'br':
+      compressor = brotli.Compressor(quality=min(self._level, 11))
+      return compressor.process, compressor.finish
+    # NOTE: wbitsに16を加えるとgzip形式のヘッダーとフッターを付与する
+    compressor = zlib.compressobj(self._level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    return compressor.compress, compressor.flush
+
+  def _compress(self, data, encoding):
+    compress, finish = self._create_compressor(encoding)
+    return compress(data) + finish()
+
+  def _compress_stream(self, stream, encoding):
+    """ ストリーミングのレスポンスを送信しながら圧縮する
+
+    Args:
+        stream (iterable): 元のレスポンスのイテラブル
+        encoding (str): 圧縮形式
+
+    Yields:
+        bytes: 圧縮したデータ
+    """
+    compress, finish = self._create_compressor(encoding)
+    try:
+      for chunk in stream:
+        if isinstance(chunk, str):
+          chunk = chunk.encode('utf-8')
+        compressed = compress(chunk)
+        if compressed:
+          yield compressed
+      yield finish()
+    finally:
+      close = getattr(stream, 'close', None)
+      if close is not None:
+        close()
+
+def make_conditional(request, response):
+  """ 弱いETagを付与し、変更がない場合は304のレスポンスにする
+      圧縮の有無で内容のバイト列が変わるため、圧縮前の内容から弱いETagを作成する
+
+  Args:
+      request (Request): リクエスト
+      response (Response): レスポンス
+
+  Returns:
+      Response: ETagを付与したレスポンス
+  """
+  if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+    return response
+  if response.is_streamed or response.direct_passthrough:
+    return response
+  response.add_etag(weak=True)
+  return response.make_conditional(request)
+
+class StaticFingerprint():
+  """ 静的ファイルのURLに内容のハッシュを付与して長期間キャッシュさせる
+      url_for('static', filename=...)で生成したURLに?v={ハッシュ}を付与する
+  """
+
+  def __init__(self, static_folder, max_age=31536000, check_modified=False):
+    """ 初期化処理
+
+    Args:
+        static_folder (str): 静的ファイルのディレクトリ
+        max_age (int, optional): ハッシュ付きのURLのキャッシュ秒数. Defaults to 31536000.
+        check_modified (bool, optional): URLの生成時にファイルの更新を確認するか(デバッグ用). Defaults to False.
+    """
+    self._static_folder = static_folder
+    self._max_age = max_age
+    self._check_modified = check_modified
+    self._lock = threading.Lock()
+    # filename: (更新日時, ハッシュ)
+    self._fingerprints = {}
+
+  def url_defaults(self, endpoint, values):
+    """ 静的ファイルのURLの生成時にハッシュを付与する(Flaskのurl_defaultsに登録する)
+
+    Args:
+        endpoint (str): エンドポイント
+        values (dict): URLの生成に使用する値
+    """
+    if endpoint != 'static' or 'v' in values or 'filename' not in values:
+      return
+    fingerprint = self.get_fingerprint(values['filename'])
+    if fingerprint is not None:
+      values['v'] = fingerprint
+
+  def get_fingerprint(self, filename):
+    """ 静的ファイルの内容のハッシュを取得する
+
+    Args:
+        filename (str): 静的ファイルのディレクトリからの相対パス
+
+    Returns:
+        str: ハッシュ(ファイルが存在しない場合はNone)
+    """
+    entry = self._fingerprints.get(filename)
+    if entry is not None and not self._check_modified:
+      return entry[1]
+
+    path = os.path.realpath(os.path.join(self._static_folder, filename))
+    if not path.startswith(os.path.realpath(self._static_folder) + os.sep):
+      return None
+    try:
+      mtime = os.stat(path).st_mtime
+    except OSError:
+      return None
+    if entry is not None and entry[0] == mtime:
+      return entry[1]
+
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, 'rb') as f:
+      for chunk in iter(lambda: f.read(65536), b''):
+        digest.update(chunk)
+    fingerprint = digest.hexdigest()
+    with self._lock:
+      self._fingerprints[filename] = (mtime, fingerprint)
+    return fingerprint
+
+  def process(self, request, response):
+    """ ハッシュ付きのURLの静的ファイルを長期間キャッシュさせる
+
+    Args:
+        request (Request): リクエスト
+        response (Response): レスポンス
+
+    Returns:
+        Response: キャッシュの設定をしたレスポンス
+    """
+    if request.endpoint == 'static' and request.args.get('v') and response.status_code in (200, 304):
+      response.cache_control.public = True
+      response.cache_control.max_age = self._max_age
+      response.cache_control.immutable = True
+    return response
@@ -1,35 +1,55 @@
 from io import StringIO
+from itertools import islice
+from operator import itemgetter
+import codecs
 import csv
+from .instrumentation import COMPONENT_CSV, measure
+
+# ストリーミング時に1回で送信する文字数の目安
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# まとめて書き込む際に1回のwriterowsに渡す行数
+DEFAULT_BATCH_SIZE = 1000
 
 class CsvCreator():
   """ CSVの作成処理を行うためのクラス
   """
 
-  def __init__(self, headers):
+  def __init__(self, logger, headers):
     """ CSV作成処理の初期化
 
     Args:
         logger (logging): loggingのlogger
         headers (dict): keyと表示ヘッダーの値の辞書
     """
+    self.__logger = logger
     self.__headers = headers
+    self.__project = self.__create_projector()
+
+  def __create_writer(self, data):
+    """ CSVのwriter作成
+    """
+    return csv.writer(data, quotechar='"', quoting=csv.QUOTE_ALL, lineterminator="\n")
 
   def __create_data(self):
     """ CSVのデータ作成
     """
     self.__data = StringIO()
-    self.__writer = csv.writer(self.__data, quotechar='"', quoting=csv.QUOTE_ALL, lineterminator="\n")
+    self.__writer = self.__create_writer(self.__data)
 
   def __write_header(self):
     """ ヘッダー書き込み処理
     """
     self.__writer.writerow(self.__headers.values())
 
-  def write_row(self, data_row):
-    """ CSVの行書き込み処理
+  def __to_csv_row(self, data_row):
+    """ headerのkeyの順に値を並べた行に変換する
 
     Args:
-        data_row (dect): headerのkeyにマッピングするvalue
+        data_row (dict): headerのkeyにマッピングするvalue
+
+    Returns:
+        list: CSVの1行分の値
     """
     csv_row = []
     for key in self.__headers.keys():
@@ -38,7 +58,118 @@ class CsvCreator():
       else:
         # 存在しないkeyの場合は空文字に変換する
         csv_row.append("")
-    self.__writer.writerow(csv_row)
+    return csv_row
+
+  def __create_projector(self):
+    """ 行をheaderのkeyの順に並べる処理を事前に作成する
+        keyの順序の解決を行ごとに行わないようにitemgetterにまとめておく
+
+    Returns:
+        function: 行を受け取りCSVの1行分の値を返す処理
+    """
+    keys = tuple(self.__headers.keys())
+    if len(keys) == 0:
+      return lambda data_row: ()
+
+    getter = itemgetter(*keys)
+    # NOTE: keyが1つの場合itemgetterはタプルではなく値を返すためタプルにする
+    if len(keys) == 1:
+      single_getter = getter
+      getter = lambda data_row: (single_getter(data_row),)
+
+    to_csv_row = self.__to_csv_row
+
+    def project(data_row):
+      # タプルやリストはDBの取得結果などでheaderの順に並んでいるものとしてそのまま使用する
+      # NOTE: NamedTupleCursorの行などのサブクラスもそのまま使用する(DictCursorの行などkeysを持つものはkeyで取得する)
+      data_type = type(data_row)
+      if data_type is tuple or data_type is list \
+          or (isinstance(data_row, (tuple, list)) and not hasattr(data_row, 'keys')):
+        return data_row
+      try:
+        return getter(data_row)
+      except KeyError:
+        # 存在しないkeyがある行は1項目ずつ確認して空文字で埋める
+        return to_csv_row(data_row)
+
+    return project
+
+  def write_rows(self, data_rows, batch_size=DEFAULT_BATCH_SIZE):
+    """ CSVの複数行の書き込み処理
+        行ごとの変換を事前に作成した処理で行いwriterowsでまとめて書き込む
+
+    Args:
+        data_rows (iterable): headerのkeyにマッピングするvalueの辞書、またはheaderの順に並んだタプルのイテラブル
+        batch_size (int, optional): 1回のwriterowsに渡す行数. Defaults to DEFAULT_BATCH_SIZE.
+
+    Returns:
+        int: 書き込んだ行数
+    """
+    row_count = 0
+    for batch in self.__iter_batches(data_rows, batch_size):
+      self.__writer.writerows(batch)
+      row_count += len(batch)
+    return row_count
+
+  def __iter_batches(self, data_rows, batch_size):
+    """ 行を一定数ごとにheaderの順に変換したリストで返却する
+
+    Args:
+        data_rows (iterable): 変換対象の行
+        batch_size (int): 1回で返却する行数
+
+    Yields:
+        list: CSVの行のリスト
+    """
+    iterator = map(self.__project, data_rows)
+    while True:
+      batch = list(islice(iterator, batch_size))
+      if not batch:
+        return
+      yield batch
+
+  def write_row(self, data_row):
+    """ CSVの行書き込み処理
+
+    Args:
+        data_row (dect): headerのkeyにマッピングするvalue
+    """
+    self.__writer.writerow(self.__to_csv_row(data_row))
+
+  def iter_encoded(self, data_rows, encode='utf_8_sig', chunk_size=DEFAULT_CHUNK_SIZE, batch_size=DEFAULT_BATCH_SIZE):
+    """ ヘッダーと行を書き込みながら一定サイズごとにエンコードして返却する
+        全体をメモリ上に保持しないため行数に関わらず使用するメモリは一定となる
+
+    Args:
+        data_rows (iterable): headerのkeyにマッピングするvalueの辞書、またはheaderの順に並んだタプルのイテラブル(DBのカーソルなど)
+        encode (str, optional): 文字コード. Defaults to 'utf_8_sig'.
+        chunk_size (int, optional): 1回で返却する文字数の目安. Defaults to DEFAULT_CHUNK_SIZE.
+        batch_size (int, optional): 1回のwriterowsに渡す行数. Defaults to DEFAULT_BATCH_SIZE.
+
+    Yields:
+        bytes: エンコード済みのCSVデータ
+    """
+    # NOTE: インクリメンタルエンコーダを使用してBOMは先頭の1回だけ出力する
+    encoder = codecs.getincrementalencoder(encode)()
+    buffer = StringIO()
+    writer = self.__create_writer(buffer)
+    writer.writerow(self.__headers.values())
+
+    row_count = 0
+    for batch in self.__iter_batches(data_rows, batch_size):
+      with measure(COMPONENT_CSV):
+        writer.writerows(batch)
+      row_count += len(batch)
+      if buffer.tell() >= chunk_size:
+        with measure(COMPONENT_CSV):
+          chunk = encoder.encode(buffer.getvalue())
+          buffer.seek(0)
+          buffer.truncate()
+        yield chunk
+
+    yield encoder.encode(buffer.getvalue(), final=True)
+    buffer.close()
+    self.__logger.debug('CSVのストリーミング出力が完了しました。 行数: %s', row_count)
 
   def getvalue(self, encode='utf_8_sig'):
     """ CSVデータの取得処理
@@ -49,12 +180,16 @@ class CsvCreator():
     return self.__data.getvalue().encode(encode)
 
   def __enter__(self):
+    # NOTE: withの範囲をCSVの作成時間として計測する
+    self.__measure = measure(COMPONENT_CSV)
+    self.__measure.__enter__()
     self.__create_data()
     self.__write_header()
     return self
 
   def __exit__(self, exc_type, exc_value, traceback):
     self.__data.close()
+    self.__measure.__exit__(exc_type, exc_value, traceback)
     if exc_type is not None:
       raise Exception(f"CSV作成処理でエラーが発生しました。")
 
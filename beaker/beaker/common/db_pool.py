@@ -0,0 +1,412 @@
+from collections import deque
+import itertools
+import threading
+import time
+
+from .query_log import TracedCursor
+
+class PoolTimeoutError(Exception):
+  """ 接続プールから時間内に接続を取得できなかった場合のエラー
+  """
+  pass
+
+class PooledConnection():
+  """ 接続プールから貸し出した接続
+      closeした場合は接続を閉じずにプールへ返却する
+  """
+
+  def __init__(self, pool, connection):
+    """ 貸し出した接続の初期化
+
+    Args:
+        pool (ConnectionPool): 貸し出し元の接続プール
+        connection (connection): 実際のDBの接続
+    """
+    self._pool = pool
+    self._connection = connection
+
+  def close(self):
+    """ 接続をプールへ返却する(2回目以降の呼び出しは何もしない)
+    """
+    if self._connection is not None:
+      connection = self._connection
+      self._connection = None
+      self._pool.checkin(connection)
+
+  def get_raw_connection(self):
+    """ 実際のDBの接続を取得する
+
+    Returns:
+        connection: 実際のDBの接続
+    """
+    return self._connection
+
+  def cursor(self, *args, **kwargs):
+    """ カーソルの作成(SQLの計測が有効な場合は実行時間を計測するカーソルを返却する)
+
+    Returns:
+        cursor: カーソル
+    """
+    if self._connection is None:
+      raise Exception("プールへ返却済みの接続を使用しようとしました。")
+    cursor = self._connection.cursor(*args, **kwargs)
+    if self._pool.query_tracer is None:
+      return cursor
+    return TracedCursor(cursor, self._pool.query_tracer)
+
+  def __getattr__(self, name):
+    if self._connection is None:
+      raise Exception("プールへ返却済みの接続を使用しようとしました。")
+    return getattr(self._connection, name)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+class ConnectionPool():
+  """ スレッドセーフなDBの接続プール
+  """
+
+  def __init__(self, connect, logger, min_size=1, max_size=10, timeout=30.0, max_lifetime=3600.0, health_check=True, query_tracer=None):
+    """ 接続プールの初期化
+        接続は必要になった時点で作成するため、初期化時にDBへは接続しない
+
+    Args:
+        connect (function): 新しい接続を作成する処理
+        logger (BeakerLogger): Beakerのログ用クラス
+        min_size (int, optional): warm_upで事前に作成しておく接続数. Defaults to 1.
+        max_size (int, optional): 同時に作成できる接続数の上限. Defaults to 10.
+        timeout (float, optional): 接続の取得を待機する最大秒数. Defaults to 30.0.
+        max_lifetime (float, optional): 接続を使い続ける最大秒数(Noneの場合は無制限). Defaults to 3600.0.
+        health_check (bool, optional): 貸し出し前に接続の確認を行うか. Defaults to True.
+        query_tracer (QueryTracer, optional): 貸し出した接続で実行したSQLを記録する処理(Noneの場合は記録しない). Defaults to None.
+
+    Raises:
+        ValueError: 接続数の設定が不正な場合
+    """
+    if max_size < 1 or min_size < 0 or min_size > max_size:
+      raise ValueError(f"接続プールの接続数の設定が不正です。min_size: {min_size}, max_size: {max_size}")
+
+    self._connect = connect
+    self._logger = logger
+    self._min_size = min_size
+    self._max_size = max_size
+    self._timeout = timeout
+    self._max_lifetime = max_lifetime
+    self._health_check = health_check
+    self.query_tracer = query_tracer
+
+    self._condition = threading.Condition()
+    # NOTE: 直近に返却された接続から貸し出すためdequeの末尾から出し入れする
+    self._idle = deque()
+    self._created_at = {}
+    self._in_use = 0
+    self._waiting = 0
+    self._closed = False
+
+    self._wait_count = 0
+    self._wait_time_total = 0.0
+    self._wait_time_max = 0.0
+    self._created_count = 0
+    self._discarded_count = 0
+
+  def warm_up(self):
+    """ 最小接続数まで接続を作成しておく
+    """
+    while True:
+      with self._condition:
+        if self._closed or self._size() >= self._min_size:
+          return
+        self._in_use += 1
+      connection = self._create_reserved()
+      with self._condition:
+        self._in_use -= 1
+        self._idle.append(connection)
+        self._condition.notify()
+
+  def checkout(self):
+    """ 接続の貸し出し
+
+    Raises:
+        PoolTimeoutError: 時間内に接続を取得できなかった場合
+
+    Returns:
+        PooledConnection: 貸し出した接続(closeでプールへ返却される)
+    """
+    while True:
+      connection = self._reserve()
+      # NOTE: 接続の確認や作成はDBとの通信が発生するためロックの外で行う
+      if connection is None:
+        return PooledConnection(self, self._create_reserved())
+      if self._is_healthy(connection):
+        return PooledConnection(self, connection)
+      with self._condition:
+        self._in_use -= 1
+        self._discard(connection)
+        self._condition.notify()
+
+  def _reserve(self):
+    """ 待機中の接続を取り出すか、新しい接続を作成する枠を確保する
+        使用中の接続数は取り出した時点で加算する
+
+    Raises:
+        PoolTimeoutError: 時間内に接続を取得できなかった場合
+
+    Returns:
+        connection: 待機中の接続(新しい接続を作成する場合はNone)
+    """
+    start = time.monotonic()
+    deadline = None if self._timeout is None else start + self._timeout
+    waited = False
+    with self._condition:
+      while True:
+        if self._closed:
+          raise Exception("終了済みの接続プールから接続を取得しようとしました。")
+
+        connection = self._take_idle()
+        if connection is not None or self._size() < self._max_size:
+          break
+
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+          raise PoolTimeoutError(f"接続プールから接続を取得できませんでした。 timeout: {self._timeout}")
+        waited = True
+        self._waiting += 1
+        try:
+          self._condition.wait(remaining)
+        finally:
+          self._waiting -= 1
+
+      self._in_use += 1
+      if waited:
+        wait_time = time.monotonic() - start
+        self._wait_count += 1
+        self._wait_time_total += wait_time
+        self._wait_time_max = max(self._wait_time_max, wait_time)
+      return connection
+
+  def _create_reserved(self):
+    """ 確保済みの枠で新しい接続を作成する
+
+    Returns:
+        connection: 作成した接続
+    """
+    try:
+      connection = self._connect()
+    except Exception:
+      with self._condition:
+        self._in_use -= 1
+        self._condition.notify()
+      raise
+
+    with self._condition:
+      self._created_at[id(connection)] = time.monotonic()
+      self._created_count += 1
+    self._logger.debug('DBの接続を作成しました。 作成数: %s', self._created_count)
+    return connection
+
+  def checkin(self, connection):
+    """ 接続の返却
+
+    Args:
+        connection (connection): 返却する実際のDBの接続
+    """
+    # NOTE: コミットされていない処理が次の利用者に残らないようにロールバックしてから返却する
+    reusable = not self._is_closed(connection) and not self._is_expired(connection)
+    if reusable:
+      try:
+        connection.rollback()
+      except Exception:
+        self._logger.warning('接続の返却時のロールバックに失敗したため接続を破棄します。')
+        reusable = False
+
+    with self._condition:
+      self._in_use -= 1
+      if reusable and not self._closed:
+        self._idle.append(connection)
+      else:
+        self._discard(connection)
+      self._condition.notify()
+
+  def close(self):
+    """ 接続プールの終了処理(待機中の接続をすべて閉じる)
+    """
+    with self._condition:
+      self._closed = True
+      while self._idle:
+        self._discard(self._idle.pop())
+      self._condition.notify_all()
+
+  def get_stats(self):
+    """ 接続プールの統計情報を取得する
+
+    Returns:
+        dict: 使用中の接続数、待機中の接続数、接続待ちの数、待ち時間などの統計情報
+    """
+    with self._condition:
+      return {
+        'in_use': self._in_use,
+        'idle': len(self._idle),
+        'size': self._size(),
+        'max_size': self._max_size,
+        'waiting': self._waiting,
+        'wait_count': self._wait_count,
+        'wait_time_total': self._wait_time_total,
+        'wait_time_max': self._wait_time_max,
+        'created': self._created_count,
+        'discarded': self._discarded_count,
+      }
+
+  def get_load(self):
+    """ 接続プールの負荷(使用中の接続数と接続待ちの数の合計)を取得する
+        選択の目安に使用するためロックは取得しない
+
+    Returns:
+        int: 使用中の接続数と接続待ちの数の合計
+    """
+    return self._in_use + self._waiting
+
+  def _size(self):
+    return self._in_use + len(self._idle)
+
+  def _discard(self, connection):
+    """ 接続の破棄(ロック内で呼び出すこと)
+    """
+    self._created_at.pop(id(connection), None)
+    self._discarded_count += 1
+    try:
+      connection.close()
+    except Exception:
+      pass
+
+  def _take_idle(self):
+    """ 使用可能な待機中の接続を取り出す(ロック内で呼び出すこと)
+
+    Returns:
+        connection: 使用可能な接続(ない場合はNone)
+    """
+    while self._idle:
+      connection = self._idle.pop()
+      if self._is_closed(connection) or self._is_expired(connection):
+        self._discard(connection)
+        continue
+      return connection
+    return None
+
+  def _is_closed(self, connection):
+    # NOTE: psycopg2の接続は閉じている場合にclosedが0以外になる
+    return bool(getattr(connection, 'closed', False))
+
+  def _is_expired(self, connection):
+    if self._max_lifetime is None:
+      return False
+    created_at = self._created_at.get(id(connection))
+    return created_at is not None and time.monotonic() - created_at > self._max_lifetime
+
+  def _is_healthy(self, connection):
+    """ 接続が使用可能か確認する
+    """
+    if not self._health_check:
+      return True
+    try:
+      cursor = connection.cursor()
+      try:
+        cursor.execute('SELECT 1')
+      finally:
+        cursor.close()
+      connection.rollback()
+      return True
+    except Exception:
+      self._logger.warning('DBの接続の確認に失敗したため接続を破棄します。')
+      return False
+
+class PooledConnecter():
+  """ 接続プールから接続を取得するコネクタ
+      pgsupporterのTransactionやQueryBuilderにDbConnecterの代わりに渡して使用する
+  """
+
+  def __init__(self, pool):
+    """ コネクタの初期化
+
+    Args:
+        pool (ConnectionPool): 接続を取得する接続プール
+    """
+    self._pool = pool
+    self.connection = None
+
+  def get_connection(self):
+    """ 接続プールから接続を取得する
+
+    Returns:
+        PooledConnection: 貸し出した接続(closeでプールへ返却される)
+    """
+    # NOTE: トランザクションごとに生成した場合は直近に貸し出した接続を参照できるように保持する
+    self.connection = self._pool.checkout()
+    return self.connection
+
+class RoutingConnecter():
+  """ 読み込みか書き込みかに応じて接続を取得する接続プールを切り替えるコネクタ
+      トランザクションを指定しないQueryBuilderに渡して使用する
+  """
+
+  def __init__(self, select_pool):
+    """ コネクタの初期化
+
+    Args:
+        select_pool (function): 読み込み専用か否かを受け取り接続プールを返却する処理
+    """
+    self._select_pool = select_pool
+    self.read_only = True
+    self.connection = None
+
+  def get_connection(self):
+    """ 読み込み専用か否かに応じた接続プールから接続を取得する
+
+    Returns:
+        PooledConnection: 貸し出した接続(closeでプールへ返却される)
+    """
+    self.connection = self._select_pool(self.read_only).checkout()
+    return self.connection
+
+class PoolSelector():
+  """ 複数の接続プール(レプリカ)から使用する接続プールを選択する
+  """
+  ROUND_ROBIN = 'round_robin'
+  LEAST_BUSY = 'least_busy'
+
+  def __init__(self, pools, strategy=ROUND_ROBIN):
+    """ 選択処理の初期化
+
+    Args:
+        pools (list): 選択対象の接続プール
+        strategy (str, optional): 選択方法(round_robin: 順番, least_busy: 負荷が最も低いもの). Defaults to ROUND_ROBIN.
+
+    Raises:
+        ValueError: 存在しない選択方法が指定された場合
+    """
+    if strategy not in (self.ROUND_ROBIN, self.LEAST_BUSY):
+      raise ValueError(f"存在しないレプリカの選択方法です。strategy: {strategy}")
+    self._pools = list(pools)
+    self._strategy = strategy
+    # NOTE: itertools.countのnextはGILにより複数スレッドから呼び出しても重複しない
+    self._counter = itertools.count()
+
+  def select(self):
+    """ 接続プールの選択
+
+    Returns:
+        ConnectionPool: 選択した接続プール
+    """
+    if self._strategy == self.LEAST_BUSY:
+      return min(self._pools, key=lambda pool: pool.get_load())
+    return self._pools[next(self._counter) % len(self._pools)]
+
+  def get_pools(self):
+    """ 選択対象の接続プールの取得
+
+    Returns:
+        list: 選択対象の接続プール
+    """
+    return list(self._pools)
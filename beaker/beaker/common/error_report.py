@@ -0,0 +1,213 @@
+from collections import OrderedDict
+import os
+import re
+import threading
+import time
+
+# 404のパスで同じものとみなすために置き換える部分(数値やUUIDなどのID)
+_PATH_ID_PATTERN = re.compile(r'(?<=/)(?:\d+|[0-9a-fA-F]{8}-[0-9a-fA-F-]{27}|[0-9a-fA-F]{16,})(?=/|$)')
+
+# サマリに出力するエラーの種類数の上限
+_SUMMARY_LIMIT = 10
+
+def fingerprint_exception(error):
+  """ 例外の種類と発生箇所からエラーの識別子を作成する
+      メッセージはIDなどを含み毎回異なることがあるため使用しない
+
+  Args:
+      error (BaseException): 例外
+
+  Returns:
+      str: エラーの識別子
+  """
+  traceback = error.__traceback__
+  if traceback is None:
+    return f'{type(error).__name__}'
+  while traceback.tb_next is not None:
+    traceback = traceback.tb_next
+  code = traceback.tb_frame.f_code
+  return f'{type(error).__name__} {os.path.basename(code.co_filename)}#{code.co_name}:{traceback.tb_lineno}'
+
+def fingerprint_path(status, path):
+  """ ステータスとパスからエラーの識別子を作成する(パス内のIDは置き換える)
+
+  Args:
+      status (int): ステータスコード
+      path (str): リクエストのパス
+
+  Returns:
+      str: エラーの識別子
+  """
+  return f'{status} {_PATH_ID_PATTERN.sub("<id>", path)}'
+
+class _Bucket():
+  """ エラーの識別子ごとのトークンバケットと抑制した件数
+  """
+  __slots__ = ('tokens', 'updated_at', 'suppressed')
+
+  def __init__(self, tokens, now):
+    self.tokens = tokens
+    self.updated_at = now
+    self.suppressed = 0
+
+class ErrorReporter():
+  """ 同じエラーのログ出力を抑制し、抑制した件数を定期的にまとめて出力する
+      エラーの識別子ごとにトークンバケットで出力の可否を判定し、最初の発生は必ず出力する
+  """
+
+  def __init__(self, logger, rate_per_minute=1.0, burst=1, summary_interval=60.0, max_fingerprints=1000, clock=time.monotonic, background=True):
+    """ エラーの出力の初期化
+
+    Args:
+        logger (BeakerLogger): Beakerのログ用クラス
+        rate_per_minute (float, optional): 同じエラーを詳細に出力する1分あたりの回数. Defaults to 1.0.
+        burst (int, optional): 同じエラーを続けて詳細に出力できる回数. Defaults to 1.
+        summary_interval (float, optional): 抑制した件数のサマリを出力する間隔(秒). Defaults to 60.0.
+        max_fingerprints (int, optional): 保持するエラーの識別子の上限(超えた場合は最も古いものから破棄する). Defaults to 1000.
+        clock (function, optional): 現在時刻(秒)を返却する処理. Defaults to time.monotonic.
+        background (bool, optional): 次のエラーが発生しない場合もタイマーでサマリを出力するか. Defaults to True.
+
+    Raises:
+        ValueError: 設定が不正な場合
+    """
+    if burst < 1 or rate_per_minute < 0 or max_fingerprints < 1:
+      raise ValueError(f"エラーの出力の設定が不正です。rate_per_minute: {rate_per_minute}, burst: {burst}, max_fingerprints: {max_fingerprints}")
+    self._logger = logger
+    self._rate = rate_per_minute / 60.0
+    self._burst = burst
+    self._summary_interval = summary_interval
+    self._max_fingerprints = max_fingerprints
+    self._clock = clock
+    self._lock = threading.Lock()
+    self._buckets = OrderedDict()
+    # 識別子の上限により破棄したエラーで抑制していた件数
+    self._evicted_suppressed = 0
+    self._summary_at = clock()
+    self._background = background
+    # サマリを出力するタイマー(抑制した件数がある間のみ動作する)
+    self._timer = None
+    self._closed = False
+
+  def report(self, fingerprint, log_detail):
+    """ エラーの報告
+        出力できる場合はlog_detailで詳細を出力し、できない場合は件数のみ記録する
+
+    Args:
+        fingerprint (str): エラーの識別子
+        log_detail (function): 詳細を出力する処理
+
+    Returns:
+        bool: 詳細を出力した場合はTrue
+    """
+    now = self._clock()
+    with self._lock:
+      bucket = self._buckets.get(fingerprint)
+      if bucket is None:
+        bucket = self._buckets[fingerprint] = _Bucket(self._burst, now)
+        if len(self._buckets) > self._max_fingerprints:
+          _, evicted = self._buckets.popitem(last=False)
+          self._evicted_suppressed += evicted.suppressed
+      else:
+        self._buckets.move_to_end(fingerprint)
+        bucket.tokens = min(self._burst, bucket.tokens + (now - bucket.updated_at) * self._rate)
+        bucket.updated_at = now
+
+      allowed = bucket.tokens >= 1
+      if allowed:
+        bucket.tokens -= 1
+      else:
+        bucket.suppressed += 1
+        self._start_timer(now)
+      summary = self._take_summary(now)
+
+    # NOTE: ログの出力はロックの外で行う
+    if allowed:
+      log_detail()
+    if summary:
+      self._log_summary(summary)
+    return allowed
+
+  def flush(self):
+    """ 抑制した件数のサマリを間隔に関わらず出力する
+    """
+    with self._lock:
+      summary = self._take_summary(self._clock(), force=True)
+    if summary:
+      self._log_summary(summary)
+
+  def close(self):
+    """ タイマーを停止して抑制した件数のサマリを出力する(終了時に呼び出す)
+    """
+    with self._lock:
+      self._closed = True
+      timer, self._timer = self._timer, None
+    if timer is not None:
+      timer.cancel()
+    self.flush()
+
+  def _start_timer(self, now):
+    """ 次のサマリの出力時刻にサマリを出力するタイマーを開始する(ロック内で呼び出すこと)
+        NOTE: エラーが続いた後に発生しなくなった場合も抑制した件数を出力するために使用する
+    """
+    if not self._background or self._closed or self._timer is not None:
+      return
+    delay = max(self._summary_at + self._summary_interval - now, 0.0)
+    self._timer = threading.Timer(delay, self._on_timer)
+    self._timer.daemon = True
+    self._timer.start()
+
+  def _on_timer(self):
+    with self._lock:
+      self._timer = None
+      now = self._clock()
+      summary = self._take_summary(now)
+      # NOTE: タイマーの待機中に次のエラーでサマリを出力した場合は、その後に抑制した件数を次の出力時刻に出力する
+      if not summary and self._count_suppressed():
+        self._start_timer(now)
+    if summary:
+      self._log_summary(summary)
+
+  def _count_suppressed(self):
+    """ 抑制した件数の合計(ロック内で呼び出すこと)
+    """
+    return sum(bucket.suppressed for bucket in self._buckets.values()) + self._evicted_suppressed
+
+  def get_stats(self):
+    """ 統計情報の取得
+
+    Returns:
+        dict: 保持しているエラーの識別子の数(fingerprints)と、次のサマリで出力する抑制した件数(suppressed)
+    """
+    with self._lock:
+      return {
+        'fingerprints': len(self._buckets),
+        'suppressed': self._count_suppressed(),
+      }
+
+  def _take_summary(self, now, force=False):
+    """ 抑制した件数を取り出す(ロック内で呼び出すこと)
+        間隔が経過していない場合は何もしない
+
+    Returns:
+        list: エラーの識別子と件数のタプルのリスト(出力するものがない場合は空)
+    """
+    if not force and now - self._summary_at < self._summary_interval:
+      return []
+    self._summary_at = now
+    summary = []
+    for fingerprint, bucket in self._buckets.items():
+      if bucket.suppressed:
+        summary.append((fingerprint, bucket.suppressed))
+        bucket.suppressed = 0
+    if self._evicted_suppressed:
+      summary.append(('(other)', self._evicted_suppressed))
+      self._evicted_suppressed = 0
+    return summary
+
+  def _log_summary(self, summary):
+    summary.sort(key=lambda item: item[1], reverse=True)
+    total = sum(count for _, count in summary)
+    details = ', '.join(f'{fingerprint}: {count}件' for fingerprint, count in summary[:_SUMMARY_LIMIT])
+    if len(summary) > _SUMMARY_LIMIT:
+      details += f', 他{len(summary) - _SUMMARY_LIMIT}種類'
+    self._logger.error('同じエラーのため出力を抑制しました。 合計: %s件, %s', total, details)
@@ -0,0 +1,58 @@
+import functools
+
+def pure_filter(function=None, maxsize=1024):
+  """ 引数が同じであれば常に同じ結果を返すカスタムフィルタであることを示すデコレータ
+      fast_filtersが有効な場合は結果がメモ化される
+
+  Args:
+      function (function, optional): 対象のフィルタ. Defaults to None.
+      maxsize (int, optional): メモ化する結果の件数の上限. Defaults to 1024.
+
+  Returns:
+      function: 印をつけたフィルタ
+  """
+  def decorate(target):
+    target.beaker_pure_filter = True
+    target.beaker_filter_cache_size = maxsize
+    return target
+
+  # NOTE: @pure_filterと@pure_filter(maxsize=...)のどちらでも使用できるようにする
+  if function is not None:
+    return decorate(function)
+  return decorate
+
+def is_pure_filter(function):
+  """ pure_filterで印をつけたフィルタか判定する
+
+  Args:
+      function (function): 対象のフィルタ
+
+  Returns:
+      bool: pure_filterで印をつけたフィルタの場合はTrue
+  """
+  return getattr(function, 'beaker_pure_filter', False)
+
+def memoize_filter(function):
+  """ フィルタの結果を件数の上限付きでメモ化する
+      引数にリストなどのハッシュ化できない値が含まれる場合はメモ化せずに実行する
+
+  Args:
+      function (function): 対象のフィルタ
+
+  Returns:
+      function: メモ化したフィルタ
+  """
+  cached = functools.lru_cache(maxsize=getattr(function, 'beaker_filter_cache_size', 1024), typed=True)(function)
+
+  @functools.wraps(function)
+  def wrapper(*args, **kwargs):
+    try:
+      hash(args)
+      if kwargs:
+        hash(tuple(kwargs.items()))
+    except TypeError:
+      return function(*args, **kwargs)
+    return cached(*args, **kwargs)
+
+  wrapper.cache_info = cached.cache_info
+  return wrapper
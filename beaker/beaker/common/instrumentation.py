@@ -0,0 +1,231 @@
+from contextlib import contextmanager
+import bisect
+import threading
+import time
+
+# リクエストの処理時間の内訳として計測する処理の種類
+COMPONENT_TEMPLATE = 'template'
+COMPONENT_DB = 'db'
+COMPONENT_CSV = 'csv'
+COMPONENT_SESSION = 'session'
+COMPONENTS = (COMPONENT_TEMPLATE, COMPONENT_DB, COMPONENT_CSV, COMPONENT_SESSION)
+
+# ヒストグラムのバケットの上限(秒)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 1リクエストのSQLの実行数のヒストグラムのバケットの上限
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# 現在のリクエストの計測用クラスを返却する処理(計測が無効の場合はNone)
+_timer_getter = None
+
+class _NullMeasure():
+  """ 計測が無効の場合に使用する何もしないコンテキストマネージャ
+  """
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    return False
+
+_NULL_MEASURE = _NullMeasure()
+
+def set_timer_getter(getter):
+  """ 現在のリクエストの計測用クラスを返却する処理を設定する
+
+  Args:
+      getter (function): 現在のリクエストのRequestTimerを返却する処理(Noneの場合は計測を無効にする)
+  """
+  global _timer_getter
+  _timer_getter = getter
+
+def measure(component):
+  """ 処理時間を計測するコンテキストマネージャを返却する
+      計測が無効の場合やリクエスト外の場合は何もしない
+
+  Args:
+      component (str): 計測する処理の種類
+
+  Returns:
+      contextmanager: 計測用のコンテキストマネージャ
+  """
+  if _timer_getter is None:
+    return _NULL_MEASURE
+  timer = _timer_getter()
+  if timer is None:
+    return _NULL_MEASURE
+  return timer.measure(component)
+
+class RequestTimer():
+  """ 1リクエスト分の処理時間の計測
+  """
+
+  def __init__(self):
+    self.start = time.perf_counter()
+    self.durations = dict.fromkeys(COMPONENTS, 0.0)
+    # NOTE: クエリビルダからトランザクションの処理を呼ぶなど入れ子になった場合に二重に計上しないように深さを保持する
+    self._depths = dict.fromkeys(COMPONENTS, 0)
+
+  @contextmanager
+  def measure(self, component):
+    """ 処理時間の計測
+
+    Args:
+        component (str): 計測する処理の種類
+    """
+    self._depths[component] += 1
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self._depths[component] -= 1
+      if self._depths[component] == 0:
+        self.durations[component] += time.perf_counter() - start
+
+  def elapsed(self):
+    """ リクエスト開始からの経過時間の取得
+
+    Returns:
+        float: 経過秒数
+    """
+    return time.perf_counter() - self.start
+
+  def server_timing(self):
+    """ Server-Timingヘッダーの値の作成
+
+    Returns:
+        str: Server-Timingヘッダーの値(ミリ秒)
+    """
+    timings = [f'{component};dur={duration * 1000:.1f}' for component, duration in self.durations.items() if duration > 0]
+    timings.append(f'total;dur={self.elapsed() * 1000:.1f}')
+    return ', '.join(timings)
+
+class Histogram():
+  """ Prometheus形式のヒストグラム
+  """
+
+  def __init__(self, buckets):
+    self._buckets = buckets
+    self.counts = [0] * len(buckets)
+    self.count = 0
+    self.sum = 0.0
+
+  def observe(self, value):
+    """ 値の記録(ロック内で呼び出すこと)
+
+    Args:
+        value (float): 記録する値
+    """
+    index = bisect.bisect_left(self._buckets, value)
+    if index < len(self.counts):
+      self.counts[index] += 1
+    self.count += 1
+    self.sum += value
+
+  def cumulative_counts(self):
+    """ バケットごとの累積件数の取得
+
+    Returns:
+        list: バケットの上限と累積件数のタプルのリスト
+    """
+    result = []
+    total = 0
+    for bucket, count in zip(self._buckets, self.counts):
+      total += count
+      result.append((bucket, total))
+    return result
+
+class Instrumentation():
+  """ ルートごとの処理時間の集計
+  """
+
+  def __init__(self, buckets=DEFAULT_BUCKETS):
+    """ 集計の初期化
+
+    Args:
+        buckets (tuple, optional): ヒストグラムのバケットの上限(秒). Defaults to DEFAULT_BUCKETS.
+    """
+    self._buckets = tuple(sorted(buckets))
+    self._lock = threading.Lock()
+    self._requests = {}
+    self._components = {}
+    self._query_counts = {}
+    # メトリクスに追加で出力するゲージ(名前と値の辞書を返却する処理)
+    self._gauge_sources = []
+
+  def record(self, route, timer, query_count=None):
+    """ リクエストの処理時間の記録
+
+    Args:
+        route (str): ルート(URLのルール)
+        timer (RequestTimer): リクエストの計測結果
+        query_count (int, optional): リクエストで実行したSQLの数(記録しない場合はNone). Defaults to None.
+    """
+    total = timer.elapsed()
+    with self._lock:
+      self._get_histogram(self._requests, route).observe(total)
+      for component, duration in timer.durations.items():
+        if duration > 0:
+          self._get_histogram(self._components, (route, component)).observe(duration)
+      if query_count is not None:
+        histogram = self._query_counts.get(route)
+        if histogram is None:
+          histogram = self._query_counts[route] = Histogram(QUERY_COUNT_BUCKETS)
+        histogram.observe(query_count)
+
+  def add_gauge_source(self, source):
+    """ メトリクスに出力するゲージの追加
+
+    Args:
+        source (function): ゲージの名前と値の辞書を返却する処理
+    """
+    self._gauge_sources.append(source)
+
+  def render_prometheus(self):
+    """ Prometheusのテキスト形式で集計結果を出力する
+
+    Returns:
+        str: Prometheusのテキスト形式の集計結果
+    """
+    lines = []
+    with self._lock:
+      lines.append('# HELP beaker_request_duration_seconds Request latency by route.')
+      lines.append('# TYPE beaker_request_duration_seconds histogram')
+      for route, histogram in sorted(self._requests.items()):
+        self._render_histogram(lines, 'beaker_request_duration_seconds', f'route="{_escape(route)}"', histogram)
+
+      lines.append('# HELP beaker_component_duration_seconds Time spent per request in template, db, csv and session.')
+      lines.append('# TYPE beaker_component_duration_seconds histogram')
+      for (route, component), histogram in sorted(self._components.items()):
+        labels = f'route="{_escape(route)}",component="{component}"'
+        self._render_histogram(lines, 'beaker_component_duration_seconds', labels, histogram)
+
+      if self._query_counts:
+        lines.append('# HELP beaker_request_queries SQL statements executed per request by route.')
+        lines.append('# TYPE beaker_request_queries histogram')
+        for route, histogram in sorted(self._query_counts.items()):
+          self._render_histogram(lines, 'beaker_request_queries', f'route="{_escape(route)}"', histogram)
+
+    for source in self._gauge_sources:
+      for name, value in source().items():
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+  def _get_histogram(self, histograms, key):
+    histogram = histograms.get(key)
+    if histogram is None:
+      histogram = histograms[key] = Histogram(self._buckets)
+    return histogram
+
+  def _render_histogram(self, lines, name, labels, histogram):
+    for bucket, count in histogram.cumulative_counts():
+      lines.append(f'{name}_bucket{{{labels},le="{bucket}"}} {count}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+def _escape(value):
+  """ Prometheusのラベルの値のエスケープ
+  """
+  return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
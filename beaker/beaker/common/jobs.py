@@ -0,0 +1,348 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+from .csv import CsvCreator
+
+# ジョブの状態
+STATE_QUEUED = 'queued'
+STATE_RUNNING = 'running'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+FINISHED_STATES = (STATE_DONE, STATE_FAILED)
+
+# ジョブを実行する方法
+EXECUTOR_THREAD = 'thread'
+EXECUTOR_PROCESS = 'process'
+
+# 進捗を書き込む最短の間隔(秒)
+_PROGRESS_INTERVAL = 0.5
+
+# ジョブIDの形式(スプールのファイル名に使用するため、それ以外は受け付けない)
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+class JobQueueFullError(Exception):
+  """ 実行待ちのジョブが上限に達している場合のエラー
+  """
+  pass
+
+def _write_json(path, value):
+  """ JSONファイルの書き込み(読み込み中のプロセスが途中の内容を読まないように置き換える)
+  """
+  tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+  with open(tmp_path, 'w', encoding='utf-8') as file:
+    json.dump(value, file, ensure_ascii=False)
+  os.replace(tmp_path, path)
+
+class JobContext():
+  """ 実行中のジョブから結果の書き込みと進捗の報告を行うためのクラス
+      プロセスプールで実行する場合も使用できるように状態はスプールのファイルに保存する
+  """
+
+  def __init__(self, spool_dir, job_id, status):
+    self._spool_dir = spool_dir
+    self.job_id = job_id
+    self._status = status
+    self._progress_written_at = 0.0
+    self._output = None
+
+  def _get_path(self, suffix):
+    return os.path.join(self._spool_dir, f'{self.job_id}.{suffix}')
+
+  def update_status(self, **values):
+    """ 状態の更新
+    """
+    self._status.update(values)
+    _write_json(self._get_path('json'), self._status)
+
+  def set_progress(self, done, total=None):
+    """ 進捗の報告(頻繁に呼び出した場合も一定間隔でのみ書き込む)
+
+    Args:
+        done (int): 処理済みの件数
+        total (int, optional): 全体の件数(不明な場合はNone). Defaults to None.
+    """
+    now = time.monotonic()
+    if now - self._progress_written_at < _PROGRESS_INTERVAL and done != total:
+      return
+    self._progress_written_at = now
+    self.update_status(progress=done, total=total)
+
+  def open(self):
+    """ 結果を書き込むファイルを開く(ジョブの終了時に閉じる)
+
+    Returns:
+        file: バイナリ書き込み用のファイル
+    """
+    if self._output is None:
+      self._output = open(self._get_path('result.tmp'), 'wb')
+    return self._output
+
+  def write_csv(self, headers, rows, chara_set='shift_jis', total=None, progress_interval=1000):
+    """ CSVを結果のファイルに書き込む(全体をメモリ上に保持しない)
+
+    Args:
+        headers (dict): keyと表示ヘッダーの値の辞書
+        rows (iterable): 行のイテラブル(DBのカーソルなど)
+        chara_set (str, optional): 文字コード. Defaults to 'shift_jis'.
+        total (int, optional): 全体の行数(進捗の表示用). Defaults to None.
+        progress_interval (int, optional): 進捗を報告する行数の間隔. Defaults to 1000.
+
+    Returns:
+        int: 書き込んだ行数
+    """
+    count = 0
+    def counted_rows():
+      nonlocal count
+      for row in rows:
+        count += 1
+        if count % progress_interval == 0:
+          self.set_progress(count, total)
+        yield row
+
+    output = self.open()
+    for chunk in CsvCreator(logging.getLogger(__name__), headers).iter_encoded(counted_rows(), chara_set):
+      output.write(chunk)
+    self.set_progress(count, count)
+    return count
+
+  def _finish(self, result):
+    """ 結果のファイルを確定する
+
+    Args:
+        result (Any): ジョブの戻り値(bytesまたはstrの場合は結果として書き込む)
+    """
+    if isinstance(result, str):
+      result = result.encode('utf-8')
+    if isinstance(result, bytes) and self._output is None:
+      self.open().write(result)
+    if self._output is not None:
+      self._output.close()
+      os.replace(self._get_path('result.tmp'), self._get_path('result'))
+
+  def _discard(self):
+    if self._output is not None:
+      self._output.close()
+      os.remove(self._get_path('result.tmp'))
+
+def _run_job(spool_dir, job_id, status, function, args, kwargs):
+  """ ジョブの実行(プロセスプールで実行できるようにモジュールの関数とする)
+  """
+  job = JobContext(spool_dir, job_id, status)
+  job.update_status(state=STATE_RUNNING, started_at=time.time())
+  try:
+    result = function(job, *args, **kwargs)
+    job._finish(result)
+  except Exception as e:
+    job._discard()
+    job.update_status(state=STATE_FAILED, finished_at=time.time(), error=f'{type(e).__name__}: {e}')
+    raise
+  job.update_status(state=STATE_DONE, finished_at=time.time(), has_result=os.path.exists(job._get_path('result')))
+
+class JobManager():
+  """ 時間のかかる処理(CSVの出力など)をリクエストとは別に実行するジョブの管理
+      状態と結果はスプールのディレクトリに保存するため、別のワーカープロセスからも参照できる
+  """
+
+  def __init__(self, spool_dir, logger, executor=EXECUTOR_THREAD, max_workers=2, max_queued=100, retention_seconds=3600, stale_seconds=86400):
+    """ ジョブの管理の初期化
+
+    Args:
+        spool_dir (str): 状態と結果を保存するディレクトリ
+        logger (BeakerLogger): Beakerのログ用クラス
+        executor (str, optional): 実行する方法(thread: スレッドプール, process: プロセスプール). Defaults to EXECUTOR_THREAD.
+        max_workers (int, optional): 同時に実行するジョブ数. Defaults to 2.
+        max_queued (int, optional): 実行待ちと実行中のジョブ数の上限. Defaults to 100.
+        retention_seconds (int, optional): 終了したジョブの結果を保持する秒数. Defaults to 3600.
+        stale_seconds (int, optional): 終了しないジョブ(プロセスの停止など)の状態を保持する秒数. Defaults to 86400.
+
+    Raises:
+        ValueError: 設定が不正な場合
+    """
+    if executor not in (EXECUTOR_THREAD, EXECUTOR_PROCESS):
+      raise ValueError(f"存在しないジョブの実行方法です。executor: {executor}")
+    if max_workers < 1 or max_queued < 1:
+      raise ValueError(f"ジョブの同時実行数の設定が不正です。max_workers: {max_workers}, max_queued: {max_queued}")
+    os.makedirs(spool_dir, exist_ok=True)
+    self._spool_dir = spool_dir
+    self._logger = logger
+    self._executor_type = executor
+    self._max_workers = max_workers
+    self._max_queued = max_queued
+    self._retention_seconds = retention_seconds
+    self._stale_seconds = stale_seconds
+    self._lock = threading.Lock()
+    self._executor = None
+    self._active = 0
+
+  def _get_executor(self):
+    """ ジョブを実行するプールの取得(最初のジョブの登録時に作成する)
+    """
+    if self._executor is None:
+      if self._executor_type == EXECUTOR_PROCESS:
+        self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+      else:
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='beaker-job')
+    return self._executor
+
+  def submit(self, function, *args, file_name='result', mimetype='application/octet-stream', owner=None, **kwargs):
+    """ ジョブの登録
+        functionは第1引数にJobContextを受け取り、結果をJobContextに書き込むかbytesまたはstrで返却する
+        プロセスプールの場合、functionと引数はpickleできる必要がある(モジュールの関数など)
+
+    Args:
+        function (function): 実行する処理
+        file_name (str, optional): 結果をダウンロードする際のファイル名. Defaults to 'result'.
+        mimetype (str, optional): 結果のMIMEタイプ. Defaults to 'application/octet-stream'.
+        owner (str, optional): 登録者を識別する値(状態の確認やダウンロードの際に照合する). Defaults to None.
+
+    Raises:
+        JobQueueFullError: 実行待ちと実行中のジョブ数が上限に達している場合
+
+    Returns:
+        str: ジョブID
+    """
+    self.cleanup()
+    job_id = uuid.uuid4().hex
+    status = {
+      'id': job_id,
+      'state': STATE_QUEUED,
+      'progress': 0,
+      'total': None,
+      'file_name': file_name,
+      'mimetype': mimetype,
+      'owner': owner,
+      'created_at': time.time(),
+    }
+    with self._lock:
+      if self._active >= self._max_queued:
+        raise JobQueueFullError(f"実行待ちのジョブが上限に達しています。max_queued: {self._max_queued}")
+      self._active += 1
+      try:
+        _write_json(self._get_path(job_id, 'json'), status)
+        future = self._get_executor().submit(_run_job, self._spool_dir, job_id, status, function, args, kwargs)
+      except Exception:
+        self._active -= 1
+        raise
+    future.add_done_callback(lambda future: self._on_done(job_id, future))
+    self._logger.info('ジョブを登録しました。 ID: %s, 処理: %s', job_id, getattr(function, '__name__', function))
+    return job_id
+
+  def _on_done(self, job_id, future):
+    with self._lock:
+      self._active -= 1
+    error = future.exception()
+    if error is not None:
+      self._logger.error('ジョブが失敗しました。 ID: %s, エラー: %s', job_id, error)
+      # NOTE: プロセスが異常終了した場合はジョブ内で状態を更新できないため、ここで失敗にする
+      status = self.get_status(job_id)
+      if status is not None and status['state'] not in FINISHED_STATES:
+        status.update(state=STATE_FAILED, finished_at=time.time(), error=f'{type(error).__name__}: {error}')
+        _write_json(self._get_path(job_id, 'json'), status)
+    else:
+      self._logger.info('ジョブが終了しました。 ID: %s', job_id)
+
+  def get_status(self, job_id):
+    """ ジョブの状態の取得
+
+    Args:
+        job_id (str): ジョブID
+
+    Returns:
+        dict: ジョブの状態(存在しない場合はNone)
+    """
+    if not _JOB_ID_PATTERN.match(job_id):
+      return None
+    try:
+      with open(self._get_path(job_id, 'json'), encoding='utf-8') as file:
+        return json.load(file)
+    except FileNotFoundError:
+      return None
+
+  def get_result_path(self, job_id):
+    """ 結果のファイルのパスの取得
+
+    Args:
+        job_id (str): ジョブID
+
+    Returns:
+        str: 結果のファイルのパス(終了していない場合や結果がない場合はNone)
+    """
+    status = self.get_status(job_id)
+    if status is None or status['state'] != STATE_DONE:
+      return None
+    path = self._get_path(job_id, 'result')
+    return path if os.path.exists(path) else None
+
+  def open_result(self, job_id):
+    """ 結果のファイルを開く
+        状態の取得後に保持期間を過ぎて削除された場合もNoneを返却する(開いた後に削除された場合も読み込める)
+
+    Args:
+        job_id (str): ジョブID
+
+    Returns:
+        tuple: ジョブの状態、結果のファイル(終了していない場合や結果がない場合はNone)
+    """
+    status = self.get_status(job_id)
+    if status is None or status['state'] != STATE_DONE:
+      return None
+    try:
+      return status, open(self._get_path(job_id, 'result'), 'rb')
+    except FileNotFoundError:
+      return None
+
+  def cleanup(self):
+    """ 保持期間を過ぎたジョブの状態と結果を削除する
+
+    Returns:
+        int: 削除したジョブ数
+    """
+    now = time.time()
+    count = 0
+    for name in os.listdir(self._spool_dir):
+      job_id, _, suffix = name.partition('.')
+      if suffix != 'json' or not _JOB_ID_PATTERN.match(job_id):
+        continue
+      status = self.get_status(job_id)
+      if status is None:
+        continue
+      if status['state'] in FINISHED_STATES:
+        expired = now - status.get('finished_at', now) > self._retention_seconds
+      else:
+        expired = now - status['created_at'] > self._stale_seconds
+      if not expired:
+        continue
+      for suffix in ('result', 'result.tmp', 'json'):
+        try:
+          os.remove(self._get_path(job_id, suffix))
+        except FileNotFoundError:
+          pass
+      count += 1
+    if count:
+      self._logger.debug('保持期間を過ぎたジョブを削除しました。 件数: %s', count)
+    return count
+
+  def get_stats(self):
+    """ ジョブの統計情報の取得
+
+    Returns:
+        dict: このプロセスで実行待ちと実行中のジョブ数(active)と上限(max_queued)
+    """
+    with self._lock:
+      return {'active': self._active, 'max_queued': self._max_queued, 'max_workers': self._max_workers}
+
+  def shutdown(self, wait=True):
+    """ ジョブを実行するプールの終了処理
+    """
+    if self._executor is not None:
+      self._executor.shutdown(wait=wait)
+      self._executor = None
+
+  def _get_path(self, job_id, suffix):
+    return os.path.join(self._spool_dir, f'{job_id}.{suffix}')
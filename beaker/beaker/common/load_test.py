@@ -0,0 +1,291 @@
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+import math
+import threading
+import time
+import tracemalloc
+from urllib.parse import urlencode, urlsplit
+
+# ベースラインと比較して悪化と判定する割合のデフォルト
+DEFAULT_THRESHOLD = 0.2
+
+def create_requests(routes, payloads=None):
+  """ ルートの一覧から負荷試験で送信するリクエストを作成する
+      パスにパラメータ(<int:id>など)を含むルートとPOSTのルートはpayloadsで指定した場合のみ対象とする
+
+  Args:
+      routes (list): BeakerRouter.get_routesで取得したルートの一覧
+      payloads (dict, optional): ルートのパスごとのリクエストの内容(path, query, data, json, headers). Defaults to None.
+
+  Returns:
+      list: リクエストの内容の辞書(name, method, path, data, json, headers)
+  """
+  payloads = payloads or {}
+  requests = []
+  for route in routes:
+    payload = payloads.get(route['path'])
+    for method in route['methods']:
+      if payload is None and (method != 'GET' or '<' in route['path']):
+        continue
+      payload = payload or {}
+      path = payload.get('path', route['path'])
+      if payload.get('query'):
+        path += '?' + urlencode(payload['query'])
+      requests.append({
+        'name': f'{method} {route["path"]}',
+        'method': method,
+        'path': path,
+        'data': payload.get('data'),
+        'json': payload.get('json'),
+        'headers': payload.get('headers', {}),
+      })
+  return requests
+
+class TestClientSender():
+  """ Beakerのテストクライアントでリクエストを送信する
+  """
+  # NOTE: pytestがテストのクラスとして収集しないようにする
+  __test__ = False
+
+  def __init__(self, app):
+    """ 送信処理の初期化
+
+    Args:
+        app (Beaker): 送信先のBeaker
+    """
+    self._app = app
+    # NOTE: テストクライアントはCookieを保持するためスレッドごとに作成する
+    self._local = threading.local()
+
+  def __call__(self, request):
+    """ リクエストの送信(ストリーミングのレスポンスも最後まで読み込む)
+
+    Args:
+        request (dict): リクエストの内容
+
+    Returns:
+        int: ステータスコード
+    """
+    client = getattr(self._local, 'client', None)
+    if client is None:
+      client = self._local.client = self._app.test_client()
+    response = client.open(request['path'], method=request['method'], data=request['data'], json=request['json'], headers=request['headers'])
+    try:
+      response.get_data()
+      return response.status_code
+    finally:
+      response.close()
+
+class HttpSender():
+  """ 起動中のサーバにHTTPでリクエストを送信する
+  """
+
+  def __init__(self, base_url, timeout=30.0):
+    """ 送信処理の初期化
+
+    Args:
+        base_url (str): 送信先のURL(例: http://localhost:5000)
+        timeout (float, optional): タイムアウトの秒数. Defaults to 30.0.
+    """
+    url = urlsplit(base_url)
+    self._connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+    self._netloc = url.netloc
+    self._prefix = url.path.rstrip('/')
+    self._timeout = timeout
+    # NOTE: 接続を使い回すためスレッドごとに接続を保持する
+    self._local = threading.local()
+
+  def __call__(self, request):
+    """ リクエストの送信
+
+    Args:
+        request (dict): リクエストの内容
+
+    Returns:
+        int: ステータスコード
+    """
+    headers = dict(request['headers'])
+    body = None
+    if request['json'] is not None:
+      body = json.dumps(request['json']).encode('utf-8')
+      headers['Content-Type'] = 'application/json'
+    elif request['data'] is not None:
+      body = urlencode(request['data']).encode('utf-8')
+      headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+    connection = getattr(self._local, 'connection', None)
+    if connection is None:
+      connection = self._local.connection = self._connection_class(self._netloc, timeout=self._timeout)
+    try:
+      connection.request(request['method'], self._prefix + request['path'], body=body, headers=headers)
+      response = connection.getresponse()
+      response.read()
+      return response.status
+    except Exception:
+      # NOTE: 切断された接続は次のリクエストで作り直す
+      connection.close()
+      self._local.connection = None
+      raise
+
+def percentile(sorted_values, ratio):
+  """ パーセンタイルの取得(nearest-rank法)
+
+  Args:
+      sorted_values (list): 昇順に並べた値
+      ratio (float): 割合(0.95など)
+
+  Returns:
+      float: パーセンタイルの値(値がない場合は0.0)
+  """
+  if not sorted_values:
+    return 0.0
+  index = max(math.ceil(ratio * len(sorted_values)) - 1, 0)
+  return sorted_values[index]
+
+def _send_quietly(send, request):
+  """ リクエストの送信(エラーは計測結果に含めないため無視する)
+  """
+  try:
+    send(request)
+  except Exception:
+    pass
+
+def run_load_test(send, request, count=200, concurrency=4, warmup=10):
+  """ 1つのリクエストを並行して送信し、処理時間を計測する
+
+  Args:
+      send (function): リクエストの内容を受け取りステータスコードを返却する処理(TestClientSender, HttpSender)
+      request (dict): リクエストの内容
+      count (int, optional): 計測するリクエスト数. Defaults to 200.
+      concurrency (int, optional): 並行数. Defaults to 4.
+      warmup (int, optional): 計測前に送信するリクエスト数. Defaults to 10.
+
+  Returns:
+      dict: リクエスト数(count)、エラー数(errors)、1秒あたりのリクエスト数(rps)、処理時間のパーセンタイル(p50_ms, p95_ms, p99_ms, max_ms)
+  """
+  for _ in range(warmup):
+    _send_quietly(send, request)
+
+  latencies = []
+  errors = 0
+  lock = threading.Lock()
+  remaining = iter(range(count))
+
+  def worker():
+    nonlocal errors
+    while True:
+      with lock:
+        if next(remaining, None) is None:
+          return
+      start = time.perf_counter()
+      try:
+        failed = send(request) >= 400
+      except Exception:
+        failed = True
+      latency = time.perf_counter() - start
+      with lock:
+        latencies.append(latency)
+        if failed:
+          errors += 1
+
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='beaker-load-test') as executor:
+    for future in [executor.submit(worker) for _ in range(concurrency)]:
+      future.result()
+  elapsed = time.perf_counter() - start
+
+  latencies.sort()
+  return {
+    'count': len(latencies),
+    'errors': errors,
+    'rps': len(latencies) / elapsed if elapsed > 0 else 0.0,
+    'p50_ms': percentile(latencies, 0.50) * 1000,
+    'p95_ms': percentile(latencies, 0.95) * 1000,
+    'p99_ms': percentile(latencies, 0.99) * 1000,
+    'max_ms': latencies[-1] * 1000 if latencies else 0.0,
+  }
+
+def measure_allocations(send, request, count=20):
+  """ 1リクエストあたりのメモリの確保量を計測する(計測の影響を避けるため並行させずに送信する)
+      同じプロセス内で処理するTestClientSenderの場合のみ意味がある
+
+  Args:
+      send (function): リクエストの内容を受け取りステータスコードを返却する処理
+      request (dict): リクエストの内容
+      count (int, optional): 計測するリクエスト数. Defaults to 20.
+
+  Returns:
+      dict: 1リクエストあたりの最大確保量の平均(alloc_peak_kb)と処理後に残った量の平均(alloc_retained_kb)
+  """
+  _send_quietly(send, request)
+  started = not tracemalloc.is_tracing()
+  if started:
+    tracemalloc.start()
+  peak_total = 0
+  retained_total = 0
+  try:
+    for _ in range(count):
+      before, _ = tracemalloc.get_traced_memory()
+      # NOTE: reset_peakはPython3.9以降のみのため、ない場合は計測開始からの最大値となる
+      if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+      _send_quietly(send, request)
+      after, peak = tracemalloc.get_traced_memory()
+      peak_total += max(peak - before, 0)
+      retained_total += max(after - before, 0)
+  finally:
+    if started:
+      tracemalloc.stop()
+  return {
+    'alloc_peak_kb': peak_total / count / 1024,
+    'alloc_retained_kb': retained_total / count / 1024,
+  }
+
+def save_baseline(path, results):
+  """ 計測結果をベースラインとして保存する
+
+  Args:
+      path (str): 保存先のJSONファイルのパス
+      results (dict): リクエスト名ごとの計測結果
+  """
+  with open(path, 'w', encoding='utf-8') as file:
+    json.dump(results, file, ensure_ascii=False, indent=2, sort_keys=True)
+
+def load_baseline(path):
+  """ ベースラインの読み込み
+
+  Args:
+      path (str): JSONファイルのパス
+
+  Returns:
+      dict: リクエスト名ごとの計測結果
+  """
+  with open(path, encoding='utf-8') as file:
+    return json.load(file)
+
+def compare_with_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+  """ ベースラインとの比較
+      p50とp95の処理時間、メモリの最大確保量がthresholdの割合を超えて増えた場合と、1秒あたりのリクエスト数が減った場合を悪化とする
+
+  Args:
+      results (dict): リクエスト名ごとの計測結果
+      baseline (dict): リクエスト名ごとのベースライン
+      threshold (float, optional): 悪化と判定する割合. Defaults to DEFAULT_THRESHOLD.
+
+  Returns:
+      list: 悪化した項目のメッセージ
+  """
+  regressions = []
+  for name, result in results.items():
+    base = baseline.get(name)
+    if base is None:
+      continue
+    for key in ('p50_ms', 'p95_ms', 'alloc_peak_kb'):
+      if key in result and base.get(key) and result[key] > base[key] * (1 + threshold):
+        regressions.append(f'{name}: {key} {base[key]:.2f} -> {result[key]:.2f}')
+    if base.get('rps') and result['rps'] < base['rps'] * (1 - threshold):
+      regressions.append(f'{name}: rps {base["rps"]:.1f} -> {result["rps"]:.1f}')
+    if result['errors'] > base.get('errors', 0):
+      regressions.append(f'{name}: errors {base.get("errors", 0)} -> {result["errors"]}')
+  return regressions
@@ -0,0 +1,129 @@
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import threading
+
+class BeakerQueueHandler(QueueHandler):
+  """ ログレコードをキューに積むだけのハンドラ
+      キューが満杯の場合は破棄(drop)または待機(block)する
+  """
+
+  def __init__(self, log_queue, block=False, timeout=None):
+    """ キューハンドラの初期化
+
+    Args:
+        log_queue (queue.Queue): ログレコードを積むキュー
+        block (bool, optional): キューが満杯の場合に待機するか. Defaults to False.
+        timeout (float, optional): 待機する場合の最大秒数(Noneの場合は無制限). Defaults to None.
+    """
+    super().__init__(log_queue)
+    self._block = block
+    self._timeout = timeout
+    self.queued = 0
+    self.dropped = 0
+
+  def enqueue(self, record):
+    """ ログレコードのキューへの追加
+
+    Args:
+        record (logging.LogRecord): ログレコード
+    """
+    # NOTE: emitはハンドラのロック内で呼ばれるためカウンタの更新にロックは不要
+    try:
+      self.queue.put(record, self._block, self._timeout)
+    except queue.Full:
+      self.dropped += 1
+      return
+    self.queued += 1
+
+class BeakerQueueListener(QueueListener):
+  """ キューからログレコードを取り出して実際のハンドラへ出力するリスナー
+  """
+
+  def __init__(self, log_queue, *handlers):
+    super().__init__(log_queue, *handlers, respect_handler_level=True)
+    self.flushed = 0
+
+  def handle(self, record):
+    """ ログレコードの出力処理
+
+    Args:
+        record (logging.LogRecord): ログレコード
+    """
+    super().handle(record)
+    self.flushed += 1
+
+  def enqueue_sentinel(self):
+    """ 終了を知らせるレコードの追加
+    """
+    # NOTE: キューが満杯でも終了時に取りこぼさないように空きができるまで待機する
+    self.queue.put(self._sentinel)
+
+class BeakerLogQueue():
+  """ ログ出力をリクエストのスレッドから切り離すためのキュー管理クラス
+  """
+
+  def __init__(self, handlers, queue_size=10000, policy='drop', block_timeout=None):
+    """ ログキューの初期化
+
+    Args:
+        handlers (list): 実際に出力を行うハンドラ
+        queue_size (int, optional): キューに積めるレコードの上限. Defaults to 10000.
+        policy (str, optional): キューが満杯の場合の動作(drop: 破棄, block: 待機). Defaults to 'drop'.
+        block_timeout (float, optional): blockの場合の最大待機秒数. Defaults to None.
+
+    Raises:
+        ValueError: 存在しない動作が指定された場合
+    """
+    if policy not in ('drop', 'block'):
+      raise ValueError(f"存在しないキューの動作です。policy: {policy}")
+
+    self._queue = queue.Queue(maxsize=queue_size)
+    self.handler = BeakerQueueHandler(self._queue, block=(policy == 'block'), timeout=block_timeout)
+    self._listener = BeakerQueueListener(self._queue, *handlers)
+    self._lock = threading.Lock()
+    self._running = False
+
+  def start(self):
+    """ 出力スレッドの開始
+    """
+    with self._lock:
+      if not self._running:
+        self._listener.start()
+        self._running = True
+
+  def stop(self):
+    """ キューに残ったログを出力して出力スレッドを停止する
+    """
+    with self._lock:
+      if self._running:
+        self._listener.stop()
+        self._running = False
+
+  def reset_after_fork(self):
+    """ fork後の子プロセスでの初期化処理
+        出力スレッドは子プロセスに引き継がれないため、キューと出力スレッドを作り直して開始する
+        (親プロセスのキューに残っていたログは親プロセスで出力されるため破棄する)
+    """
+    handlers = self._listener.handlers
+    self._queue = queue.Queue(maxsize=self._queue.maxsize)
+    # NOTE: loggerに登録済みのハンドラはそのまま使用し、積み先のキューと件数のみ初期化する
+    self.handler.queue = self._queue
+    self.handler.queued = 0
+    self.handler.dropped = 0
+    self._listener = BeakerQueueListener(self._queue, *handlers)
+    self._lock = threading.Lock()
+    self._running = False
+    self.start()
+
+  def get_stats(self):
+    """ キューの統計情報の取得
+
+    Returns:
+        dict: キューに積んだ件数、破棄した件数、出力した件数、現在のキューの件数
+    """
+    return {
+      'queued': self.handler.queued,
+      'dropped': self.handler.dropped,
+      'flushed': self._listener.flushed,
+      'pending': self._queue.qsize(),
+    }
@@ -0,0 +1,256 @@
+from collections import Counter
+import cProfile
+import hmac
+import itertools
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+
+# プロファイルの方法(sampling: 一定間隔でスタックを記録する, cprofile: cProfileで全関数の呼び出しを記録する)
+MODE_SAMPLING = 'sampling'
+MODE_CPROFILE = 'cprofile'
+
+# ファイル名に使用できない文字
+_FILE_NAME_PATTERN = re.compile(r'[^A-Za-z0-9_-]+')
+
+# 1つのルートで保持する関数の数の上限(超えた場合は上位のみ残す)
+_MAX_FUNCTIONS_PER_ROUTE = 1000
+
+# 記録するスタックの深さの上限
+_MAX_STACK_DEPTH = 200
+
+class SamplingProfiler():
+  """ 一定間隔で対象のスレッドのスタックを記録するプロファイラ
+      記録するスレッドがある間のみ1つのスレッドで記録する
+  """
+
+  def __init__(self, interval=0.005):
+    """ プロファイラの初期化
+
+    Args:
+        interval (float, optional): スタックを記録する間隔(秒). Defaults to 0.005.
+    """
+    self._interval = interval
+    self._lock = threading.Lock()
+    self._sessions = {}
+    self._thread = None
+    self._labels = {}
+
+  def start(self):
+    """ 現在のスレッドの記録を開始する
+
+    Returns:
+        int: 記録を終了する際に指定するスレッドID
+    """
+    thread_id = threading.get_ident()
+    with self._lock:
+      self._sessions[thread_id] = Counter()
+      if self._thread is None or not self._thread.is_alive():
+        self._thread = threading.Thread(target=self._run, name='beaker-profiler', daemon=True)
+        self._thread.start()
+    return thread_id
+
+  def stop(self, thread_id):
+    """ 記録の終了
+
+    Args:
+        thread_id (int): startで返却したスレッドID
+
+    Returns:
+        Counter: スタック(呼び出し元から順に;で区切った文字列)ごとの記録回数
+    """
+    with self._lock:
+      return self._sessions.pop(thread_id, Counter())
+
+  def _run(self):
+    while True:
+      time.sleep(self._interval)
+      frames = sys._current_frames()
+      with self._lock:
+        if not self._sessions:
+          self._thread = None
+          return
+        for thread_id, stacks in self._sessions.items():
+          frame = frames.get(thread_id)
+          if frame is not None:
+            stacks[self._collapse(frame)] += 1
+
+  def _collapse(self, frame):
+    """ スタックを呼び出し元から順に;で区切った文字列に変換する
+    """
+    labels = []
+    while frame is not None and len(labels) < _MAX_STACK_DEPTH:
+      labels.append(self._get_label(frame.f_code))
+      frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+  def _get_label(self, code):
+    label = self._labels.get(code)
+    if label is None:
+      label = self._labels[code] = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+    return label
+
+class RequestProfiler():
+  """ 一定の割合のリクエスト、または認証用のヘッダーを指定したリクエストのプロファイル
+      結果はルートごとのファイルに出力し、ルートごとに処理時間の長い関数を集計する
+  """
+
+  def __init__(self, output_dir, mode=MODE_SAMPLING, sample_rate=0.0, header_name='X-Beaker-Profile', token=None, max_files=200, interval=0.005):
+    """ プロファイルの初期化
+
+    Args:
+        output_dir (str): 結果のファイルを出力するディレクトリ
+        mode (str, optional): プロファイルの方法(sampling, cprofile). Defaults to MODE_SAMPLING.
+        sample_rate (float, optional): プロファイルするリクエストの割合(0から1). Defaults to 0.0.
+        header_name (str, optional): プロファイルを指示するヘッダー名. Defaults to 'X-Beaker-Profile'.
+        token (str, optional): ヘッダーに指定する値(指定しない場合はヘッダーによるプロファイルを行わない). Defaults to None.
+        max_files (int, optional): 保持するファイル数の上限(超えた場合は古いものから削除する). Defaults to 200.
+        interval (float, optional): samplingの場合にスタックを記録する間隔(秒). Defaults to 0.005.
+
+    Raises:
+        ValueError: 設定が不正な場合
+    """
+    if mode not in (MODE_SAMPLING, MODE_CPROFILE):
+      raise ValueError(f"存在しないプロファイルの方法です。mode: {mode}")
+    if not 0 <= sample_rate <= 1 or max_files < 1:
+      raise ValueError(f"プロファイルの設定が不正です。sample_rate: {sample_rate}, max_files: {max_files}")
+    os.makedirs(output_dir, exist_ok=True)
+    self._output_dir = output_dir
+    self._mode = mode
+    self._sample_rate = sample_rate
+    self._header_name = header_name
+    self._token = token or None
+    self._max_files = max_files
+    self._sampler = SamplingProfiler(interval) if mode == MODE_SAMPLING else None
+    # NOTE: cProfileは同時に1つしか有効にできないPythonのバージョンがあるため1リクエストずつ行う
+    self._cprofile_lock = threading.Lock()
+    self._lock = threading.Lock()
+    self._hot_functions = {}
+    self._profile_counts = Counter()
+    # NOTE: 同じ時刻とルートのファイル名が重複しないように連番を付与する
+    self._sequence = itertools.count()
+
+  def is_authorized(self, headers):
+    """ ヘッダーに正しいトークンが指定されているか判定する
+
+    Args:
+        headers (Headers): リクエストのヘッダー
+
+    Returns:
+        bool: 正しいトークンが指定されている場合はTrue
+    """
+    if self._token is None:
+      return False
+    value = headers.get(self._header_name)
+    return value is not None and hmac.compare_digest(value.encode('utf-8'), self._token.encode('utf-8'))
+
+  def start(self, headers):
+    """ プロファイルの開始(対象外のリクエストの場合は何もしない)
+
+    Args:
+        headers (Headers): リクエストのヘッダー
+
+    Returns:
+        Any: finishに渡す値(プロファイルしない場合はNone)
+    """
+    if not (self._sample_rate and random.random() < self._sample_rate) and not self.is_authorized(headers):
+      return None
+    if self._sampler is not None:
+      return (time.perf_counter(), self._sampler.start())
+    if not self._cprofile_lock.acquire(blocking=False):
+      return None
+    profile = cProfile.Profile()
+    try:
+      profile.enable()
+    except ValueError:
+      # NOTE: 他のプロファイラが有効な場合は行わない
+      self._cprofile_lock.release()
+      return None
+    return (time.perf_counter(), profile)
+
+  def finish(self, session, route):
+    """ プロファイルの終了と結果の出力
+
+    Args:
+        session (Any): startで返却した値
+        route (str): ルート(URLのルール)
+
+    Returns:
+        str: 出力したファイルのパス
+    """
+    started_at, profiler = session
+    if self._sampler is not None:
+      stacks = self._sampler.stop(profiler)
+      elapsed = time.perf_counter() - started_at
+      path = self._create_path(route, elapsed, 'collapsed')
+      with open(path, 'w', encoding='utf-8') as file:
+        for stack, count in stacks.items():
+          file.write(f'{stack} {count}\n')
+      # NOTE: 最も内側の関数(その関数自体で処理していた回数)で集計する
+      functions = Counter()
+      for stack, count in stacks.items():
+        functions[stack.rpartition(';')[2]] += count
+    else:
+      profiler.disable()
+      self._cprofile_lock.release()
+      elapsed = time.perf_counter() - started_at
+      path = self._create_path(route, elapsed, 'prof')
+      profiler.dump_stats(path)
+      functions = Counter()
+      for (file_name, line, function_name), (_, _, total_time, _, _) in pstats.Stats(profiler).stats.items():
+        functions[f'{function_name} ({os.path.basename(file_name)}:{line})'] += total_time
+
+    self._aggregate(route, functions)
+    self._cleanup()
+    return path
+
+  def get_hot_functions(self, limit=20):
+    """ ルートごとの処理時間の長い関数の取得
+
+    Args:
+        limit (int, optional): ルートごとの関数の数. Defaults to 20.
+
+    Returns:
+        dict: 単位(unit: samplingの場合はsamples, cprofileの場合はseconds)と、ルートごとのプロファイル数と関数の一覧(routes)
+    """
+    with self._lock:
+      return {
+        'unit': 'samples' if self._sampler is not None else 'seconds',
+        'routes': {
+          route: {
+            'profiles': self._profile_counts[route],
+            'functions': [{'function': function, 'value': value} for function, value in functions.most_common(limit)],
+          } for route, functions in self._hot_functions.items()
+        },
+      }
+
+  def _aggregate(self, route, functions):
+    with self._lock:
+      self._profile_counts[route] += 1
+      total = self._hot_functions.setdefault(route, Counter())
+      total.update(functions)
+      if len(total) > _MAX_FUNCTIONS_PER_ROUTE:
+        self._hot_functions[route] = Counter(dict(total.most_common(_MAX_FUNCTIONS_PER_ROUTE // 2)))
+
+  def _create_path(self, route, elapsed, extension):
+    """ 結果のファイルのパスの作成(時刻_ルート_処理時間.拡張子)
+    """
+    tag = _FILE_NAME_PATTERN.sub('_', route).strip('_') or 'root'
+    return os.path.join(self._output_dir, f'{time.strftime("%Y%m%d%H%M%S")}_{tag}_{elapsed * 1000:.0f}ms_{os.getpid()}_{next(self._sequence)}.{extension}')
+
+  def _cleanup(self):
+    """ 保持するファイル数の上限を超えた古いファイルの削除
+    """
+    paths = [entry.path for entry in os.scandir(self._output_dir) if entry.name.endswith(('.collapsed', '.prof'))]
+    if len(paths) <= self._max_files:
+      return
+    paths.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+    for path in paths[:len(paths) - self._max_files]:
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
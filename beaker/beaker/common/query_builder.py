@@ -0,0 +1,280 @@
+import copy
+
+from pgsupporter import QueryBuilder
+from .bulk_write import BulkWriter, DEFAULT_BATCH_SIZE, METHOD_VALUES, validate_identifier
+from .db_pool import RoutingConnecter
+from .instrumentation import COMPONENT_DB, measure
+from .transaction import BeakerTransaction
+
+# select_iterの抽出条件で使用できる演算子
+_OPERATORS = frozenset(['=', '<>', '!=', '<', '>', '<=', '>=', 'LIKE', 'NOT LIKE', 'ILIKE', 'NOT ILIKE', 'IN', 'NOT IN', 'IS', 'IS NOT'])
+
+class BeakerQueryBuilder(QueryBuilder):
+  """ Beaker用のクエリビルダ
+      pgsupporterのQueryBuilderを拡張してBeakerの機能を追加する
+  """
+
+  def __init__(self, tx=None, db_conecter=None, query_cache=None, on_commit=None):
+    """ クエリビルダの初期化
+
+    Args:
+        tx (Transaction, optional): 使用するトランザクション. Defaults to None.
+        db_conecter (DbConnecter, optional): トランザクションを指定しない場合に使用するコネクタ. Defaults to None.
+        query_cache (QueryCache, optional): 取得結果のキャッシュ(Noneの場合はキャッシュしない). Defaults to None.
+        on_commit (function, optional): トランザクションを指定しない書き込みのコミット後に書き込みを行ったテーブル名の集合を受け取る処理. Defaults to None.
+    """
+    if tx is None:
+      super().__init__(db_conecter=db_conecter)
+    else:
+      super().__init__(tx=tx)
+    self._beaker_tx = tx
+    self._beaker_db_conecter = db_conecter
+    self._routing_connecter = db_conecter if isinstance(db_conecter, RoutingConnecter) else None
+    self._query_cache = query_cache
+    self._on_commit = on_commit
+    self._beaker_table = None
+    self._beaker_conditions = []
+
+  def _route(self, read_only):
+    """ トランザクションを指定しない場合の接続先を切り替える
+
+    Args:
+        read_only (bool): 読み込み専用の処理か
+    """
+    if self._routing_connecter is not None:
+      self._routing_connecter.read_only = read_only
+
+  def table(self, *args, **kwargs):
+    self._beaker_table = args[0] if args else kwargs.get('table')
+    self._beaker_conditions = []
+    return super().table(*args, **kwargs)
+
+  def where(self, *args, **kwargs):
+    self._beaker_conditions.append(('AND', args, tuple(sorted(kwargs.items()))))
+    return super().where(*args, **kwargs)
+
+  def or_where(self, *args, **kwargs):
+    self._beaker_conditions.append(('OR', args, tuple(sorted(kwargs.items()))))
+    return super().or_where(*args, **kwargs)
+
+  def select(self, *args, cache_ttl=None, **kwargs):
+    """ 取得処理
+
+    Args:
+        cache_ttl (float, optional): 取得結果をキャッシュする秒数(Noneの場合はキャッシュしない). Defaults to None.
+
+    Returns:
+        list: 取得結果
+    """
+    self._route(True)
+    cache_key = self._create_cache_key(args, kwargs) if cache_ttl else None
+    if cache_key is None:
+      with measure(COMPONENT_DB):
+        return super().select(*args, **kwargs)
+
+    found, result = self._query_cache.get(cache_key)
+    if found:
+      # NOTE: 返却した行を呼び出し元が変更してもキャッシュに影響しないように複製して返却する
+      return copy.deepcopy(result)
+    # NOTE: 取得中に他の処理で書き込みが行われた場合に古い結果を保存しないように、取得前の世代を渡す
+    generation = self._query_cache.get_generation(self._beaker_table)
+    with measure(COMPONENT_DB):
+      result = super().select(*args, **kwargs)
+    self._query_cache.set(cache_key, self._beaker_table, copy.deepcopy(list(result)), cache_ttl, generation)
+    return result
+
+  def select_iter(self, *columns, chunk_size=1000, order_by=None, cursor_factory=None):
+    """ サーバ側カーソルで取得結果をchunk_size件ずつ読み込みながら返却する
+        make_csv_stream_responseやstream_templateに渡すと、行数に関わらず使用するメモリは一定となる
+        トランザクションを指定しない場合は、最初の行の読み込み時に読み込み専用のトランザクションを開始し、すべての行を読み込んだ時点で終了する
+
+    Args:
+        columns (str): 取得する項目名(指定しない場合はすべての項目)
+        chunk_size (int, optional): 1回でDBから読み込む件数. Defaults to 1000.
+        order_by (str | list, optional): 並び順の項目名('{項目名} DESC'も指定可能). Defaults to None.
+        cursor_factory (class, optional): psycopg2のカーソルの種類(RealDictCursorなど). Defaults to None.
+
+    Returns:
+        generator: 取得結果の1行ずつを返却するジェネレータ
+    """
+    sql, params = self._create_select_sql(columns, order_by)
+    if self._beaker_tx is not None:
+      if not hasattr(self._beaker_tx, 'find_iter'):
+        raise Exception("select_iterはBeakerのトランザクション(start_transaction)内で使用してください。")
+      return self._beaker_tx.find_iter(sql, params, chunk_size, cursor_factory)
+    self._route(True)
+    return self._iter_in_transaction(sql, params, chunk_size, cursor_factory)
+
+  def _iter_in_transaction(self, sql, params, chunk_size, cursor_factory):
+    """ 読み込み専用のトランザクション内で取得結果を返却する
+        ストリーミングのレスポンスの送信が終わるまで(または中断されるまで)トランザクションを継続する
+    """
+    with BeakerTransaction(self._beaker_db_conecter, True) as tx:
+      yield from tx.find_iter(sql, params, chunk_size, cursor_factory)
+
+  def _create_select_sql(self, columns, order_by):
+    """ テーブル名と抽出条件からSELECT文を作成する
+
+    Raises:
+        ValueError: テーブル名や抽出条件が不正な場合
+
+    Returns:
+        tuple: SELECT文、パラメータ
+    """
+    table = validate_identifier(self._beaker_table)
+    select_columns = ', '.join(validate_identifier(column) for column in columns) if columns else '*'
+    sql = f"SELECT {select_columns} FROM {table}"
+
+    params = []
+    for index, (connector, args, kwargs) in enumerate(self._beaker_conditions):
+      if len(args) != 3 or kwargs:
+        raise ValueError(f"select_iterでは(項目名, 演算子, 値)の抽出条件のみ使用できます。 args: {args}")
+      field, operator, value = args
+      operator = operator.upper()
+      if operator not in _OPERATORS:
+        raise ValueError(f"select_iterで使用できない演算子です。 operator: {operator}")
+      sql += ' WHERE ' if index == 0 else f' {connector} '
+      sql += f"{validate_identifier(field)} {operator} %s"
+      params.append(value)
+
+    if order_by:
+      orders = [order_by] if isinstance(order_by, str) else order_by
+      sql += ' ORDER BY ' + ', '.join(self._create_order(order) for order in orders)
+    return sql + ';', params
+
+  def _create_order(self, order):
+    parts = order.split()
+    if len(parts) == 2 and parts[1].upper() in ('ASC', 'DESC'):
+      return f"{validate_identifier(parts[0])} {parts[1].upper()}"
+    return validate_identifier(order)
+
+  def insert(self, *args, **kwargs):
+    self._route(False)
+    with measure(COMPONENT_DB):
+      result = super().insert(*args, **kwargs)
+    self._after_write()
+    return result
+
+  def update(self, *args, **kwargs):
+    self._route(False)
+    with measure(COMPONENT_DB):
+      result = super().update(*args, **kwargs)
+    self._after_write()
+    return result
+
+  def delete(self, *args, **kwargs):
+    self._route(False)
+    with measure(COMPONENT_DB):
+      result = super().delete(*args, **kwargs)
+    self._after_write()
+    return result
+
+  def insert_many(self, rows, batch_size=DEFAULT_BATCH_SIZE, method=METHOD_VALUES, columns=None, on_batch=None):
+    """ 複数行の一括登録
+        ジェネレータを渡した場合も1回分の行のみメモリに保持する
+
+    Args:
+        rows (iterable): 登録する行(項目名と値の辞書)のイテラブル
+        batch_size (int, optional): 1回で登録する件数. Defaults to DEFAULT_BATCH_SIZE.
+        method (str, optional): 登録の方法(values: 複数行のVALUES, copy: COPY FROM STDIN). Defaults to METHOD_VALUES.
+        columns (list, optional): 項目名(指定しない場合は最初の行のキー). Defaults to None.
+        on_batch (function, optional): 1回分の登録後に(回数, 件数, 秒数)を受け取る処理. Defaults to None.
+
+    Returns:
+        dict: 登録件数(rows)、回数(batches)、合計秒数(seconds)、1回の最大秒数(max_batch_seconds)
+    """
+    writer = BulkWriter(self._beaker_table, columns, batch_size, method, on_batch=on_batch)
+    return self._write_bulk(writer, rows)
+
+  def upsert_many(self, rows, conflict_columns, update_columns=None, batch_size=DEFAULT_BATCH_SIZE, columns=None, on_batch=None):
+    """ 複数行の一括登録(重複した場合は更新する)
+
+    Args:
+        rows (iterable): 登録する行(項目名と値の辞書)のイテラブル
+        conflict_columns (list): 重複を判定する項目名(一意制約のある項目)
+        update_columns (list, optional): 重複した場合に更新する項目名(指定しない場合は重複を判定する項目以外すべて、空の場合は更新しない). Defaults to None.
+        batch_size (int, optional): 1回で登録する件数. Defaults to DEFAULT_BATCH_SIZE.
+        columns (list, optional): 項目名(指定しない場合は最初の行のキー). Defaults to None.
+        on_batch (function, optional): 1回分の登録後に(回数, 件数, 秒数)を受け取る処理. Defaults to None.
+
+    Returns:
+        dict: 登録件数(rows)、回数(batches)、合計秒数(seconds)、1回の最大秒数(max_batch_seconds)
+    """
+    writer = BulkWriter(self._beaker_table, columns, batch_size, METHOD_VALUES, conflict_columns, update_columns, on_batch)
+    return self._write_bulk(writer, rows)
+
+  def _write_bulk(self, writer, rows):
+    """ 一括登録の実行
+        トランザクションを指定しない場合は一括登録全体を1つのトランザクションで実行する
+
+    Args:
+        writer (BulkWriter): 一括登録
+        rows (iterable): 登録する行のイテラブル
+
+    Returns:
+        dict: 一括登録の結果
+    """
+    if self._beaker_tx is not None:
+      if not hasattr(self._beaker_tx, 'get_current_connection'):
+        raise Exception("一括登録はBeakerのトランザクション(start_transaction)内で使用してください。")
+      cursor = self._beaker_tx.get_current_connection().cursor()
+      try:
+        result = writer.write(cursor, rows)
+      finally:
+        cursor.close()
+      self._after_write()
+      return result
+
+    self._route(False)
+    connection = self._beaker_db_conecter.get_connection()
+    try:
+      cursor = connection.cursor()
+      try:
+        result = writer.write(cursor, rows)
+      finally:
+        cursor.close()
+      connection.commit()
+    except Exception:
+      connection.rollback()
+      raise
+    finally:
+      connection.close()
+    self._after_write()
+    return result
+
+  def _create_cache_key(self, args, kwargs):
+    """ 取得結果のキャッシュのキーを作成する
+
+    Returns:
+        tuple: キャッシュのキー(キャッシュできない場合はNone)
+    """
+    if self._query_cache is None or self._beaker_table is None:
+      return None
+    # NOTE: 書き込みを行うトランザクション内ではコミット前の内容を取得する可能性があるためキャッシュしない
+    if self._beaker_tx is not None and not getattr(self._beaker_tx, 'is_read_only', lambda: False)():
+      return None
+    key = (self._beaker_table, tuple(self._beaker_conditions), args, tuple(sorted(kwargs.items())))
+    try:
+      hash(key)
+    except TypeError:
+      return None
+    return key
+
+  def _after_write(self):
+    """ 書き込み後の処理
+        トランザクションを指定しない場合はコミット後の処理もここで行う(指定した場合はトランザクションのコミット後に行う)
+    """
+    self._invalidate_cache()
+    if self._beaker_tx is None and self._on_commit is not None:
+      self._on_commit(frozenset([self._beaker_table]))
+
+  def _invalidate_cache(self):
+    """ 書き込みを行ったテーブルの取得結果のキャッシュを破棄する
+        トランザクション内の場合はコミット後に破棄する
+    """
+    if self._query_cache is None or self._beaker_table is None:
+      return
+    if self._beaker_tx is None:
+      self._query_cache.invalidate_table(self._beaker_table)
+    elif hasattr(self._beaker_tx, 'mark_written'):
+      self._beaker_tx.mark_written(self._beaker_table)
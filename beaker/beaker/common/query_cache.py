@@ -0,0 +1,164 @@
+from collections import OrderedDict
+import sys
+import threading
+import time
+
+def estimate_size(value):
+  """ 値のおおよそのメモリ使用量を取得する
+
+  Args:
+      value (Any): 対象の値
+
+  Returns:
+      int: おおよそのバイト数
+  """
+  size = sys.getsizeof(value)
+  if isinstance(value, dict):
+    for key, item in value.items():
+      size += estimate_size(key) + estimate_size(item)
+  elif isinstance(value, (list, tuple)):
+    for item in value:
+      size += estimate_size(item)
+  return size
+
+class QueryCache():
+  """ 取得結果のキャッシュ
+      件数とおおよそのメモリ使用量の上限を超えた場合は最も使用されていないものから破棄する
+  """
+
+  def __init__(self, max_entries=1000, max_bytes=10 * 1024 * 1024):
+    """ キャッシュの初期化
+
+    Args:
+        max_entries (int, optional): 保持する件数の上限. Defaults to 1000.
+        max_bytes (int, optional): 保持するおおよそのバイト数の上限. Defaults to 10MB.
+    """
+    self._max_entries = max_entries
+    self._max_bytes = max_bytes
+    self._lock = threading.Lock()
+    # key: (値, 有効期限, バイト数, テーブル名)
+    self._entries = OrderedDict()
+    # テーブル名ごとのキーの一覧(テーブル単位での破棄に使用する)
+    self._table_keys = {}
+    # テーブル名ごとの世代(破棄するたびに増やし、取得中に破棄された古い結果を保存しないために使用する)
+    self._generations = {}
+    # すべて破棄した回数(clearの前に取得した結果を保存しないために世代に含める)
+    self._epoch = 0
+    self._bytes = 0
+
+    self._hits = 0
+    self._misses = 0
+    self._evictions = 0
+    self._invalidations = 0
+
+  def get(self, key):
+    """ キャッシュの取得
+
+    Args:
+        key (tuple): キャッシュのキー
+
+    Returns:
+        tuple: キャッシュが存在するか、キャッシュの値
+    """
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        self._misses += 1
+        return (False, None)
+      value, expires_at, _, _ = entry
+      if expires_at <= time.monotonic():
+        self._remove(key)
+        self._misses += 1
+        return (False, None)
+      self._entries.move_to_end(key)
+      self._hits += 1
+      return (True, value)
+
+  def get_generation(self, table):
+    """ テーブルの現在の世代を取得する
+        DBから取得する前に取得してsetに渡すと、取得中に破棄された場合は古い結果を保存しない
+
+    Args:
+        table (str): テーブル名
+
+    Returns:
+        tuple: 世代
+    """
+    with self._lock:
+      return (self._epoch, self._generations.get(table, 0))
+
+  def set(self, key, table, value, ttl, generation=None):
+    """ キャッシュの設定
+
+    Args:
+        key (tuple): キャッシュのキー
+        table (str): 取得元のテーブル名
+        value (Any): キャッシュする値
+        ttl (float): 有効期間(秒)
+        generation (tuple, optional): 値を取得する前のget_generationの結果(世代が変わっている場合は保存しない). Defaults to None.
+    """
+    size = estimate_size(value)
+    if size > self._max_bytes:
+      return
+    with self._lock:
+      if generation is not None and generation != (self._epoch, self._generations.get(table, 0)):
+        return
+      if key in self._entries:
+        self._remove(key)
+      self._entries[key] = (value, time.monotonic() + ttl, size, table)
+      self._table_keys.setdefault(table, set()).add(key)
+      self._bytes += size
+      while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+        oldest_key = next(iter(self._entries))
+        self._remove(oldest_key)
+        self._evictions += 1
+
+  def invalidate_table(self, table):
+    """ テーブルのキャッシュをすべて破棄する
+
+    Args:
+        table (str): テーブル名
+    """
+    with self._lock:
+      self._generations[table] = self._generations.get(table, 0) + 1
+      for key in self._table_keys.pop(table, ()):
+        if key in self._entries:
+          self._remove(key)
+          self._invalidations += 1
+
+  def clear(self):
+    """ キャッシュをすべて破棄する
+    """
+    with self._lock:
+      self._entries.clear()
+      self._table_keys.clear()
+      self._generations.clear()
+      self._epoch += 1
+      self._bytes = 0
+
+  def get_stats(self):
+    """ キャッシュの統計情報の取得
+
+    Returns:
+        dict: ヒット数、ミス数、上限による破棄数、更新による破棄数、件数、おおよそのバイト数
+    """
+    with self._lock:
+      return {
+        'hits': self._hits,
+        'misses': self._misses,
+        'evictions': self._evictions,
+        'invalidations': self._invalidations,
+        'entries': len(self._entries),
+        'bytes': self._bytes,
+      }
+
+  def _remove(self, key):
+    """ キャッシュの削除(ロック内で呼び出すこと)
+    """
+    _, _, size, table = self._entries.pop(key)
+    self._bytes -= size
+    table_keys = self._table_keys.get(table)
+    if table_keys is not None:
+      table_keys.discard(key)
+      if not table_keys:
+        del self._table_keys[table]
@@ -0,0 +1,190 @@
+import os
+import re
+import sys
+import sysconfig
+import threading
+import time
+
+# 呼び出し元の特定で除外するディレクトリ(Beaker自身、ライブラリ、標準ライブラリ)
+_BEAKER_DIR = os.path.dirname(os.path.abspath(__file__))
+_LIBRARY_DIRS = tuple(path for path in {sysconfig.get_paths().get('purelib'), sysconfig.get_paths().get('platlib'), sysconfig.get_paths().get('stdlib')} if path)
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+_STRING_PATTERN = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_PATTERN = re.compile(r'\b\d+(?:\.\d+)?\b')
+_VALUES_PATTERN = re.compile(r'(\(\?(?:, \?)*\))(?:, \(\?(?:, \?)*\))+')
+_IN_PATTERN = re.compile(r'\bIN \(\?(?:, \?)+\)', re.IGNORECASE)
+
+def normalize_sql(sql):
+  """ 同じSQLの繰り返しを判定できるように値を除いたSQLに変換する
+
+  Args:
+      sql (str | bytes): SQL
+
+  Returns:
+      str: 値を?に置き換えたSQL
+  """
+  if isinstance(sql, bytes):
+    sql = sql.decode('utf-8', 'replace')
+  sql = _WHITESPACE_PATTERN.sub(' ', str(sql)).strip()
+  sql = _STRING_PATTERN.sub('?', sql)
+  sql = sql.replace('%s', '?')
+  sql = _NUMBER_PATTERN.sub('?', sql)
+  sql = _IN_PATTERN.sub('IN (?)', sql)
+  return _VALUES_PATTERN.sub(r'\1, ...', sql)
+
+def find_caller():
+  """ SQLを実行したアプリケーションの処理(コントローラなど)を特定する
+
+  Returns:
+      str: ファイル名#関数名:行番号(特定できない場合は'unknown')
+  """
+  frame = sys._getframe(1)
+  while frame is not None:
+    file_name = frame.f_code.co_filename
+    if not file_name.startswith(_BEAKER_DIR) and not file_name.startswith(_LIBRARY_DIRS) and 'pgsupporter' not in file_name:
+      return f'{file_name}#{frame.f_code.co_name}:{frame.f_lineno}'
+    frame = frame.f_back
+  return 'unknown'
+
+class RequestQueryStats():
+  """ 1リクエスト分のSQLの実行状況
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.count = 0
+    self.seconds = 0.0
+    self.slow_count = 0
+    # 値を除いたSQLごとの実行回数
+    self.statements = {}
+    # N+1として警告済みのSQL
+    self.warned = set()
+
+  def add(self, statement, seconds, is_slow):
+    """ SQLの実行の記録
+
+    Args:
+        statement (str): 値を除いたSQL
+        seconds (float): 実行時間(秒)
+        is_slow (bool): 遅いSQLか
+
+    Returns:
+        int: 同じSQLの実行回数
+    """
+    with self._lock:
+      self.count += 1
+      self.seconds += seconds
+      if is_slow:
+        self.slow_count += 1
+      count = self.statements.get(statement, 0) + 1
+      self.statements[statement] = count
+      return count
+
+  def mark_warned(self, statement):
+    """ N+1として警告済みにする
+
+    Returns:
+        bool: 初めて警告する場合はTrue
+    """
+    with self._lock:
+      if statement in self.warned:
+        return False
+      self.warned.add(statement)
+      return True
+
+  def summary(self):
+    """ 実行状況の集計
+
+    Returns:
+        dict: 実行数(count)、合計秒数(seconds)、遅いSQLの数(slow_count)、最も多く実行したSQLと回数(top_statement, top_count)
+    """
+    with self._lock:
+      top_statement, top_count = max(self.statements.items(), key=lambda item: item[1], default=(None, 0))
+      return {
+        'count': self.count,
+        'seconds': self.seconds,
+        'slow_count': self.slow_count,
+        'top_statement': top_statement,
+        'top_count': top_count,
+      }
+
+class QueryTracer():
+  """ SQLの実行時間の計測、遅いSQLとN+1の検出
+  """
+
+  def __init__(self, logger, slow_threshold=0.5, n_plus_one_threshold=10, stats_getter=None):
+    """ 計測の初期化
+
+    Args:
+        logger (BeakerLogger): Beakerのログ用クラス
+        slow_threshold (float, optional): ログに出力する実行時間(秒). Defaults to 0.5.
+        n_plus_one_threshold (int, optional): 1リクエストで同じSQLがこの回数を超えた場合に警告する(0の場合は警告しない). Defaults to 10.
+        stats_getter (function, optional): 現在のリクエストのRequestQueryStatsを返却する処理(リクエスト外の場合はNone). Defaults to None.
+    """
+    self._logger = logger
+    self._slow_threshold = slow_threshold
+    self._n_plus_one_threshold = n_plus_one_threshold
+    self._stats_getter = stats_getter
+
+  def record(self, sql, seconds):
+    """ SQLの実行の記録
+
+    Args:
+        sql (str): 実行したSQL
+        seconds (float): 実行時間(秒)
+    """
+    is_slow = self._slow_threshold is not None and seconds >= self._slow_threshold
+    if is_slow:
+      self._logger.warning('遅いSQLを検出しました。 実行時間: %.3f秒, 呼び出し元: %s, SQL: %s', seconds, find_caller(), _WHITESPACE_PATTERN.sub(' ', str(sql)).strip())
+
+    stats = self._stats_getter() if self._stats_getter is not None else None
+    if stats is None:
+      return
+    statement = normalize_sql(sql)
+    count = stats.add(statement, seconds, is_slow)
+    if self._n_plus_one_threshold and count > self._n_plus_one_threshold and stats.mark_warned(statement):
+      self._logger.warning('同じSQLが1リクエストで%s回を超えて実行されています(N+1の可能性があります)。 呼び出し元: %s, SQL: %s', self._n_plus_one_threshold, find_caller(), statement)
+
+class TracedCursor():
+  """ SQLの実行時間を計測するカーソル
+  """
+
+  def __init__(self, cursor, tracer):
+    """ カーソルの初期化
+
+    Args:
+        cursor (cursor): 実際のカーソル
+        tracer (QueryTracer): 計測結果を記録する処理
+    """
+    self._cursor = cursor
+    self._tracer = tracer
+
+  def _trace(self, function, sql, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+      return function(sql, *args, **kwargs)
+    finally:
+      self._tracer.record(sql, time.perf_counter() - start)
+
+  def execute(self, sql, *args, **kwargs):
+    return self._trace(self._cursor.execute, sql, *args, **kwargs)
+
+  def executemany(self, sql, *args, **kwargs):
+    return self._trace(self._cursor.executemany, sql, *args, **kwargs)
+
+  def copy_expert(self, sql, *args, **kwargs):
+    return self._trace(self._cursor.copy_expert, sql, *args, **kwargs)
+
+  def __getattr__(self, name):
+    return getattr(self._cursor, name)
+
+  def __iter__(self):
+    return iter(self._cursor)
+
+  def __enter__(self):
+    self._cursor.__enter__()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    return self._cursor.__exit__(exc_type, exc_value, traceback)
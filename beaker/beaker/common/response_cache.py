@@ -0,0 +1,254 @@
+import threading
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from .query_cache import QueryCache
+
+# テンプレート内のキャッシュでタグを指定しない場合のタグ
+FRAGMENT_TAG = 'fragment'
+# テンプレート内のキャッシュで有効期間を指定しない場合の秒数
+DEFAULT_FRAGMENT_TTL = 300
+
+class _Flight():
+  """ 同じキーの値を作成中の処理
+  """
+  def __init__(self):
+    self.event = threading.Event()
+    self.value = None
+    self.succeeded = False
+
+class ResponseCache():
+  """ ページとテンプレートの一部の描画結果のキャッシュ
+      キャッシュがない場合に同じキーの値を同時に作成しないように、作成中の処理がある場合は完了を待機する
+  """
+
+  def __init__(self, max_entries=1000, max_bytes=50 * 1024 * 1024, wait_timeout=10.0):
+    """ キャッシュの初期化
+
+    Args:
+        max_entries (int, optional): 保持する件数の上限. Defaults to 1000.
+        max_bytes (int, optional): 保持するおおよそのバイト数の上限. Defaults to 50MB.
+        wait_timeout (float, optional): 他の処理が作成中の値を待機する最大秒数(超えた場合は自分で作成する). Defaults to 10.0.
+    """
+    # NOTE: LRU、有効期限、バイト数の上限とタグ単位の破棄は取得結果のキャッシュと同じ仕組みを使用する
+    self._store = QueryCache(max_entries=max_entries, max_bytes=max_bytes)
+    self._wait_timeout = wait_timeout
+    self._lock = threading.Lock()
+    self._flights = {}
+
+  def get_or_create(self, key, tag, ttl, create):
+    """ キャッシュの取得(存在しない場合は作成して保存する)
+
+    Args:
+        key (tuple): キャッシュのキー
+        tag (str): 破棄する単位とするタグ
+        ttl (float): 有効期間(秒)
+        create (function): 値を作成する処理(Noneを返却した場合は保存しない)
+
+    Returns:
+        Any: キャッシュの値
+    """
+    found, value = self._store.get(key)
+    if found:
+      return value
+
+    with self._lock:
+      flight = self._flights.get(key)
+      is_leader = flight is None
+      if is_leader:
+        flight = self._flights[key] = _Flight()
+
+    if not is_leader:
+      # NOTE: 作成した処理が失敗した場合や時間内に完了しなかった場合は自分で作成する
+      if flight.event.wait(self._wait_timeout) and flight.succeeded:
+        return flight.value
+      return create()
+
+    try:
+      generation = self._store.get_generation(tag)
+      value = create()
+      if value is not None:
+        self._store.set(key, tag, value, ttl, generation)
+        flight.value = value
+        flight.succeeded = True
+      return value
+    finally:
+      with self._lock:
+        self._flights.pop(key, None)
+      flight.event.set()
+
+  def invalidate(self, tag):
+    """ タグのキャッシュをすべて破棄する
+
+    Args:
+        tag (str): タグ
+    """
+    self._store.invalidate_table(tag)
+
+  def clear(self):
+    """ キャッシュをすべて破棄する
+    """
+    self._store.clear()
+
+  def get_stats(self):
+    """ キャッシュの統計情報の取得
+
+    Returns:
+        dict: ヒット数、ミス数、上限による破棄数、破棄数、件数、おおよそのバイト数
+    """
+    return self._store.get_stats()
+
+def create_page_key(path, args, session, session_keys, use_query=True):
+  """ ページのキャッシュのキーの作成
+
+  Args:
+      path (str): リクエストのパス
+      args (MultiDict): クエリパラメータ
+      session (dict): セッション
+      session_keys (tuple): キーに含めるセッションのキー
+      use_query (bool, optional): クエリパラメータをキーに含めるか. Defaults to True.
+
+  Returns:
+      tuple: キャッシュのキー
+  """
+  query = tuple(sorted(args.items(multi=True))) if use_query else ()
+  # NOTE: セッションの値は辞書などハッシュ化できない場合があるため文字列にしてキーに含める
+  session_values = tuple(repr(session.get(key)) for key in session_keys)
+  return ('page', path, query, session_values)
+
+class SessionAccessRecorder():
+  """ ページの描画中に参照・変更したセッションのキーを記録するセッションのラッパー
+      値の参照と変更は元のセッションに委譲する
+  """
+  _OWN_ATTRIBUTES = frozenset(['_session', 'read_keys', 'read_all', 'written'])
+
+  def __init__(self, session):
+    """ 記録の初期化
+
+    Args:
+        session (SessionMixin): 元のセッション
+    """
+    object.__setattr__(self, '_session', session)
+    # 参照したキー
+    object.__setattr__(self, 'read_keys', set())
+    # すべてのキーを参照したか(一覧の取得や文字列への変換を行った場合)
+    object.__setattr__(self, 'read_all', False)
+    # 値や属性(permanentなど)を変更したか
+    object.__setattr__(self, 'written', False)
+
+  def is_cacheable(self, session_keys):
+    """ 描画結果をキャッシュできるか判定する
+
+    Args:
+        session_keys (tuple): キャッシュのキーに含めるセッションのキー
+
+    Returns:
+        bool: 変更がなく、参照したキーがすべてキャッシュのキーに含まれている場合はTrue
+    """
+    return not self.written and not self.read_all and self.read_keys.issubset(session_keys)
+
+  def __getattr__(self, name):
+    return getattr(self._session, name)
+
+  def __setattr__(self, name, value):
+    if name in self._OWN_ATTRIBUTES:
+      object.__setattr__(self, name, value)
+      return
+    # NOTE: accessedはFlaskがセッションを参照するたびに設定するため変更として扱わない
+    if name != 'accessed':
+      self.written = True
+    setattr(self._session, name, value)
+
+  def __getitem__(self, key):
+    self.read_keys.add(key)
+    return self._session[key]
+
+  def __contains__(self, key):
+    self.read_keys.add(key)
+    return key in self._session
+
+  def get(self, key, default=None):
+    self.read_keys.add(key)
+    return self._session.get(key, default)
+
+  def __setitem__(self, key, value):
+    self.written = True
+    self._session[key] = value
+
+  def __delitem__(self, key):
+    self.written = True
+    del self._session[key]
+
+  def setdefault(self, key, default=None):
+    self.read_keys.add(key)
+    if key not in self._session:
+      self.written = True
+    return self._session.setdefault(key, default)
+
+  def pop(self, key, *args):
+    self.written = True
+    return self._session.pop(key, *args)
+
+  def popitem(self):
+    self.written = True
+    return self._session.popitem()
+
+  def update(self, *args, **kwargs):
+    self.written = True
+    self._session.update(*args, **kwargs)
+
+  def clear(self):
+    self.written = True
+    self._session.clear()
+
+  def _read_all(self):
+    self.read_all = True
+    return self._session
+
+  def __iter__(self):
+    return iter(self._read_all())
+
+  def __len__(self):
+    return len(self._read_all())
+
+  def __bool__(self):
+    return bool(self._read_all())
+
+  def keys(self):
+    return self._read_all().keys()
+
+  def values(self):
+    return self._read_all().values()
+
+  def items(self):
+    return self._read_all().items()
+
+  def __repr__(self):
+    return repr(self._read_all())
+
+class FragmentCacheExtension(Extension):
+  """ テンプレートの一部の描画結果をキャッシュするJinjaの拡張
+      {% cache キー, 有効期間(秒), タグ %}...{% endcache %}で囲んだ部分をキャッシュする
+  """
+  tags = {'cache'}
+
+  def __init__(self, environment):
+    super().__init__(environment)
+    # キャッシュを返却する処理(Noneを返却する場合はキャッシュしない)
+    environment.extend(fragment_cache_getter=None)
+
+  def parse(self, parser):
+    lineno = next(parser.stream).lineno
+    args = [parser.parse_expression()]
+    args.append(parser.parse_expression() if parser.stream.skip_if('comma') else nodes.Const(DEFAULT_FRAGMENT_TTL))
+    args.append(parser.parse_expression() if parser.stream.skip_if('comma') else nodes.Const(FRAGMENT_TAG))
+    body = parser.parse_statements(['name:endcache'], drop_needle=True)
+    return nodes.CallBlock(self.call_method('_cache_support', args), [], [], body).set_lineno(lineno)
+
+  def _cache_support(self, key, ttl, tag, caller):
+    getter = self.environment.fragment_cache_getter
+    cache = getter() if getter is not None else None
+    if cache is None:
+      return caller()
+    return cache.get_or_create(('fragment', key), tag, ttl, caller)
@@ -0,0 +1,70 @@
+import os
+
+from gunicorn.app.base import BaseApplication
+
+class BeakerServer(BaseApplication):
+  """ gunicornで複数プロセス(prefork)のサーバとして起動するためのクラス
+      SIGHUPを受け取った場合は処理中のリクエストを終えてからワーカーを入れ替える
+  """
+
+  def __init__(self, wsgi_app, options, on_worker_start=None):
+    """ サーバの初期化
+
+    Args:
+        wsgi_app (Flask): 起動するWSGIのアプリケーション
+        options (dict): gunicornの設定(値がNoneの項目はgunicornのデフォルトを使用する)
+        on_worker_start (function, optional): ワーカーのfork後に各ワーカーで呼び出す処理. Defaults to None.
+    """
+    self._wsgi_app = wsgi_app
+    self._options = options
+    self._on_worker_start = on_worker_start
+    super().__init__()
+
+  def load_config(self):
+    """ gunicornの設定の読み込み
+
+    Raises:
+        ValueError: gunicornに存在しない設定が指定された場合
+    """
+    for key, value in self._options.items():
+      if key not in self.cfg.settings:
+        raise ValueError(f"存在しないサーバの設定です。key: {key}")
+      if value is not None:
+        self.cfg.set(key, value)
+    if self._on_worker_start is not None:
+      on_worker_start = self._on_worker_start
+      self.cfg.set('post_worker_init', lambda worker: on_worker_start())
+
+  def load(self):
+    return self._wsgi_app
+
+def create_server_options(port, server_vars):
+  """ config.ymlのserverの設定からgunicornの設定を作成する
+
+  Args:
+      port (int): ポート番号
+      server_vars (dict): Configのserverの設定
+
+  Returns:
+      dict: gunicornの設定
+  """
+  threads = server_vars.get('threads', 10)
+  return {
+    'bind': f"{server_vars.get('host', '127.0.0.1')}:{port}",
+    # ワーカー数(指定しない場合はCPUのコア数)
+    'workers': server_vars.get('workers') or os.cpu_count() or 1,
+    'threads': threads,
+    'worker_class': 'gthread' if threads > 1 else 'sync',
+    # NOTE: アプリケーションはfork前に生成済みのため、DBの接続とログの出力スレッドはfork後に各ワーカーで初期化する
+    'preload_app': False,
+    'max_requests': server_vars.get('max_requests', 0),
+    'max_requests_jitter': server_vars.get('max_requests_jitter', 0),
+    'worker_connections': server_vars.get('worker_connections'),
+    'backlog': server_vars.get('backlog'),
+    'timeout': server_vars.get('timeout'),
+    'graceful_timeout': server_vars.get('graceful_timeout'),
+    'keepalive': server_vars.get('keepalive'),
+    'limit_request_line': server_vars.get('limit_request_line'),
+    'limit_request_fields': server_vars.get('limit_request_fields'),
+    'pidfile': server_vars.get('pidfile'),
+  }
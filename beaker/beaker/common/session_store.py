@@ -0,0 +1,306 @@
+from collections import OrderedDict
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+
+class BeakerSession(dict, SessionMixin):
+  """ サーバ側に保存するセッション
+      保存時に変更されたキーのみを書き込めるように変更されたキーを記録する
+  """
+
+  def __init__(self, sid, data=None, is_new=False):
+    """ セッションの初期化
+
+    Args:
+        sid (str): セッションID
+        data (dict, optional): 保存済みのセッションの値. Defaults to None.
+        is_new (bool, optional): 新しく作成したセッションか. Defaults to False.
+    """
+    super().__init__(data or {})
+    self.sid = sid
+    self.new = is_new
+    self.modified = False
+    self.dirty_keys = set()
+    self.deleted_keys = set()
+
+  def _mark(self, key):
+    self.modified = True
+    self.dirty_keys.add(key)
+    self.deleted_keys.discard(key)
+
+  def _mark_deleted(self, key):
+    self.modified = True
+    self.dirty_keys.discard(key)
+    self.deleted_keys.add(key)
+
+  def __setitem__(self, key, value):
+    super().__setitem__(key, value)
+    self._mark(key)
+
+  def __delitem__(self, key):
+    super().__delitem__(key)
+    self._mark_deleted(key)
+
+  def setdefault(self, key, default=None):
+    if key not in self:
+      self[key] = default
+    return self[key]
+
+  def pop(self, key, *args):
+    exists = key in self
+    value = super().pop(key, *args)
+    if exists:
+      self._mark_deleted(key)
+    return value
+
+  def popitem(self):
+    key, value = super().popitem()
+    self._mark_deleted(key)
+    return key, value
+
+  def update(self, *args, **kwargs):
+    for key, value in dict(*args, **kwargs).items():
+      self[key] = value
+
+  def clear(self):
+    for key in list(self.keys()):
+      del self[key]
+
+class MemorySessionStore():
+  """ プロセス内のメモリにセッションを保存するストア(1プロセスで動作させる場合に使用する)
+      上限を超えた場合は最も使用されていないセッションから破棄する
+  """
+
+  def __init__(self, max_entries=10000):
+    """ ストアの初期化
+
+    Args:
+        max_entries (int, optional): 保持するセッション数の上限. Defaults to 10000.
+    """
+    self._max_entries = max_entries
+    self._lock = threading.Lock()
+    # sid: (値の辞書, 有効期限)
+    self._sessions = OrderedDict()
+
+  def load(self, sid):
+    """ セッションの読み込み
+
+    Args:
+        sid (str): セッションID
+
+    Returns:
+        dict: セッションの値(存在しない場合や有効期限切れの場合はNone)
+    """
+    with self._lock:
+      entry = self._sessions.get(sid)
+      if entry is None:
+        return None
+      data, expires_at = entry
+      if expires_at <= time.time():
+        del self._sessions[sid]
+        return None
+      self._sessions.move_to_end(sid)
+      return dict(data)
+
+  def save(self, sid, changes, deleted_keys, ttl):
+    """ 変更されたキーのみの書き込み
+
+    Args:
+        sid (str): セッションID
+        changes (dict): 変更されたキーと値
+        deleted_keys (set): 削除されたキー
+        ttl (float): 有効期間(秒)
+    """
+    with self._lock:
+      entry = self._sessions.get(sid)
+      data = entry[0] if entry is not None else {}
+      data.update(changes)
+      for key in deleted_keys:
+        data.pop(key, None)
+      self._sessions[sid] = (data, time.time() + ttl)
+      self._sessions.move_to_end(sid)
+      while len(self._sessions) > self._max_entries:
+        self._sessions.popitem(last=False)
+
+  def delete(self, sid):
+    """ セッションの削除
+
+    Args:
+        sid (str): セッションID
+    """
+    with self._lock:
+      self._sessions.pop(sid, None)
+
+  def reset_after_fork(self):
+    """ fork後の子プロセスでの初期化処理
+        fork時に他のスレッドが保持していたロックを引き継がないように作り直す
+    """
+    self._lock = threading.Lock()
+
+class SQLiteSessionStore():
+  """ SQLiteのファイルにセッションを保存するストア(同一ホストの複数プロセスで共有する場合に使用する)
+      値はキーごとに保存するため変更されたキーのみを書き込む
+  """
+
+  def __init__(self, path, serializer=None, cleanup_interval=300):
+    """ ストアの初期化
+
+    Args:
+        path (str): SQLiteのファイルのパス
+        serializer (TaggedJSONSerializer, optional): 値のシリアライザ. Defaults to None.
+        cleanup_interval (float, optional): 有効期限切れのセッションを削除する間隔(秒). Defaults to 300.
+    """
+    self._path = path
+    self._serializer = serializer or TaggedJSONSerializer()
+    self._cleanup_interval = cleanup_interval
+    self._last_cleanup = time.time()
+    self._local = threading.local()
+
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    with self._connection() as connection:
+      connection.execute('CREATE TABLE IF NOT EXISTS beaker_sessions (sid TEXT PRIMARY KEY, expires_at REAL NOT NULL)')
+      connection.execute('CREATE TABLE IF NOT EXISTS beaker_session_values (sid TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (sid, key))')
+      connection.execute('CREATE INDEX IF NOT EXISTS beaker_sessions_expires_at ON beaker_sessions (expires_at)')
+    # NOTE: gunicornのマスターなどfork前のプロセスで作成した接続をワーカーが引き継がないように閉じる
+    connection.close()
+    self._local.connection = None
+    # fork前に作成した接続(子プロセスで閉じると親プロセスのロックに影響するため参照のみ保持する)
+    self._inherited_locals = []
+
+  def _connection(self):
+    """ スレッドごとのSQLiteの接続を取得する
+
+    Returns:
+        sqlite3.Connection: SQLiteの接続
+    """
+    connection = getattr(self._local, 'connection', None)
+    if connection is None:
+      connection = sqlite3.connect(self._path, timeout=10)
+      # NOTE: 複数プロセスからの同時アクセスで読み込みが書き込みを待たないようにWALを使用する
+      connection.execute('PRAGMA journal_mode=WAL')
+      connection.execute('PRAGMA synchronous=NORMAL')
+      self._local.connection = connection
+    return connection
+
+  def reset_after_fork(self):
+    """ fork後の子プロセスでの初期化処理
+        SQLiteの接続はforkをまたいで使用できないため、親プロセスの接続は破棄して新しく接続する
+    """
+    self._inherited_locals.append(self._local)
+    self._local = threading.local()
+
+  def load(self, sid):
+    """ セッションの読み込み
+
+    Args:
+        sid (str): セッションID
+
+    Returns:
+        dict: セッションの値(存在しない場合や有効期限切れの場合はNone)
+    """
+    connection = self._connection()
+    row = connection.execute('SELECT expires_at FROM beaker_sessions WHERE sid = ?', (sid,)).fetchone()
+    if row is None or row[0] <= time.time():
+      return None
+    rows = connection.execute('SELECT key, value FROM beaker_session_values WHERE sid = ?', (sid,)).fetchall()
+    return {key: self._serializer.loads(value) for key, value in rows}
+
+  def save(self, sid, changes, deleted_keys, ttl):
+    """ 変更されたキーのみの書き込み
+
+    Args:
+        sid (str): セッションID
+        changes (dict): 変更されたキーと値
+        deleted_keys (set): 削除されたキー
+        ttl (float): 有効期間(秒)
+    """
+    now = time.time()
+    with self._connection() as connection:
+      connection.execute('INSERT OR REPLACE INTO beaker_sessions (sid, expires_at) VALUES (?, ?)', (sid, now + ttl))
+      if changes:
+        connection.executemany(
+          'INSERT OR REPLACE INTO beaker_session_values (sid, key, value) VALUES (?, ?, ?)',
+          [(sid, key, self._serializer.dumps(value)) for key, value in changes.items()])
+      if deleted_keys:
+        connection.executemany(
+          'DELETE FROM beaker_session_values WHERE sid = ? AND key = ?',
+          [(sid, key) for key in deleted_keys])
+    if now - self._last_cleanup > self._cleanup_interval:
+      self._last_cleanup = now
+      self.cleanup()
+
+  def delete(self, sid):
+    """ セッションの削除
+
+    Args:
+        sid (str): セッションID
+    """
+    with self._connection() as connection:
+      connection.execute('DELETE FROM beaker_session_values WHERE sid = ?', (sid,))
+      connection.execute('DELETE FROM beaker_sessions WHERE sid = ?', (sid,))
+
+  def cleanup(self):
+    """ 有効期限切れのセッションの削除
+    """
+    with self._connection() as connection:
+      connection.execute('DELETE FROM beaker_session_values WHERE sid IN (SELECT sid FROM beaker_sessions WHERE expires_at <= ?)', (time.time(),))
+      connection.execute('DELETE FROM beaker_sessions WHERE expires_at <= ?', (time.time(),))
+
+class BeakerSessionInterface(SessionInterface):
+  """ Cookieにはセッションの識別子のみを保存し、値はストアに保存するセッション処理
+  """
+
+  def __init__(self, store):
+    """ セッション処理の初期化
+
+    Args:
+        store (MemorySessionStore | SQLiteSessionStore): セッションの値を保存するストア
+    """
+    self._store = store
+
+  def open_session(self, app, request):
+    sid = request.cookies.get(self.get_cookie_name(app))
+    if sid:
+      data = self._store.load(sid)
+      if data is not None:
+        return BeakerSession(sid, data)
+    # NOTE: 存在しないセッションIDを引き継ぐとセッション固定攻撃に使用されるため新しく発行する
+    return BeakerSession(secrets.token_urlsafe(32), is_new=True)
+
+  def save_session(self, app, session, response):
+    name = self.get_cookie_name(app)
+    domain = self.get_cookie_domain(app)
+    path = self.get_cookie_path(app)
+
+    # 空になったセッションは削除する
+    if not session:
+      if session.modified and not session.new:
+        self._store.delete(session.sid)
+        response.delete_cookie(name, domain=domain, path=path)
+      return
+
+    if not session.modified:
+      return
+
+    # NOTE: session.modifiedのみ設定された場合(値の中身を直接変更した場合など)はすべてのキーを書き込む
+    changes = {key: session[key] for key in (session.dirty_keys or session.keys())}
+    ttl = app.permanent_session_lifetime.total_seconds()
+    self._store.save(session.sid, changes, session.deleted_keys, ttl)
+
+    response.set_cookie(
+      name,
+      session.sid,
+      expires=self.get_expiration_time(app, session),
+      httponly=self.get_cookie_httponly(app),
+      domain=domain,
+      path=path,
+      secure=self.get_cookie_secure(app),
+      samesite=self.get_cookie_samesite(app))
+    response.vary.add('Cookie')
@@ -0,0 +1,123 @@
+from pgsupporter import Transaction
+from .instrumentation import COMPONENT_DB, measure
+import itertools
+
+# サーバ側カーソルの名前の連番
+# NOTE: itertools.countのnextはGILにより複数スレッドから呼び出しても重複しない
+_cursor_counter = itertools.count()
+
+class BeakerTransaction(Transaction):
+  """ Beaker用のトランザクション
+      pgsupporterのTransactionを拡張してコミット後の処理を追加できるようにする
+  """
+
+  def __init__(self, db_connecter, read_only=True):
+    """ トランザクションの初期化
+
+    Args:
+        db_connecter (DbConnecter): 接続を取得するコネクタ
+        read_only (bool, optional): 読み込み専用か？ 読み込み専用の場合はTrueとなりコミットを行わない. Defaults to True.
+    """
+    super().__init__(db_connecter, read_only)
+    self._beaker_connecter = db_connecter
+    self._beaker_read_only = read_only
+    self._beaker_written_tables = set()
+    self._beaker_commit_hooks = []
+
+  def is_read_only(self):
+    """ 読み込み専用のトランザクションか
+
+    Returns:
+        bool: 読み込み専用の場合はTrue
+    """
+    return self._beaker_read_only
+
+  def get_current_connection(self):
+    """ トランザクションで使用中の接続を取得する(カーソルを直接使用する一括登録などで使用する)
+
+    Raises:
+        Exception: トランザクションを開始していない場合
+
+    Returns:
+        PooledConnection: 使用中の接続
+    """
+    connection = getattr(self._beaker_connecter, 'connection', None)
+    if connection is None:
+      raise Exception("開始していないトランザクションの接続を取得しようとしました。")
+    return connection
+
+  def mark_written(self, table):
+    """ 書き込みを行ったテーブルを記録する
+
+    Args:
+        table (str): テーブル名
+    """
+    self._beaker_written_tables.add(table)
+
+  def add_commit_hook(self, hook):
+    """ コミット後に実行する処理を追加する
+
+    Args:
+        hook (function): 書き込みを行ったテーブル名の集合を受け取る処理
+    """
+    self._beaker_commit_hooks.append(hook)
+
+  def __enter__(self):
+    with measure(COMPONENT_DB):
+      return super().__enter__()
+
+  def find_all(self, *args, **kwargs):
+    with measure(COMPONENT_DB):
+      return super().find_all(*args, **kwargs)
+
+  def find_one(self, *args, **kwargs):
+    with measure(COMPONENT_DB):
+      return super().find_one(*args, **kwargs)
+
+  def save(self, *args, **kwargs):
+    with measure(COMPONENT_DB):
+      return super().save(*args, **kwargs)
+
+  def delete(self, *args, **kwargs):
+    with measure(COMPONENT_DB):
+      return super().delete(*args, **kwargs)
+
+  def find_iter(self, sql, params=None, chunk_size=1000, cursor_factory=None):
+    """ サーバ側カーソルで取得結果をchunk_size件ずつ読み込みながら返却する
+        取得結果全体をメモリに読み込まないため大量の行の出力に使用する(トランザクション内でのみ使用できる)
+
+    Args:
+        sql (str): 実行するSQL
+        params (list, optional): SQLのパラメータ. Defaults to None.
+        chunk_size (int, optional): 1回でDBから読み込む件数. Defaults to 1000.
+        cursor_factory (class, optional): psycopg2のカーソルの種類(RealDictCursorなど。指定しない場合は接続の設定). Defaults to None.
+
+    Yields:
+        Any: 取得結果の1行
+    """
+    connection = self.get_current_connection()
+    name = f'beaker_cursor_{next(_cursor_counter)}'
+    if cursor_factory is None:
+      cursor = connection.cursor(name=name)
+    else:
+      cursor = connection.cursor(name=name, cursor_factory=cursor_factory)
+    try:
+      with measure(COMPONENT_DB):
+        cursor.execute(sql, params)
+      while True:
+        with measure(COMPONENT_DB):
+          rows = cursor.fetchmany(chunk_size)
+        if not rows:
+          return
+        yield from rows
+    finally:
+      cursor.close()
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    with measure(COMPONENT_DB):
+      result = super().__exit__(exc_type, exc_value, traceback)
+    # NOTE: ロールバックされた場合は何も反映されていないためコミット後の処理は行わない
+    if exc_type is None and not self._beaker_read_only:
+      for hook in self._beaker_commit_hooks:
+        hook(frozenset(self._beaker_written_tables))
+    return result
@@ -1,4 +1,4 @@
-from common.beaker import get_session, set_session, render_template, request, logger, create_csv, make_csv_response, create_query_builder, start_transaction
+from common.beaker import get_session, set_session, render_template, request, logger, create_csv, make_csv_response, make_csv_stream_response, create_query_builder, start_transaction
 
 def welcome():
   welcome_text = "WLECOME BEAKER"
@@ -39,6 +39,19 @@ def welcome_get_csv():
   # test.csvとしてダウンロードさせる
   return make_csv_response(csv_data, 'test')
 
+def welcome_get_csv_stream():
+  # ヘッダ行
+  headers = {
+    'test1': 'テスト1', 
+    'test2': 'テスト2'
+    }
+
+  # 行はジェネレータで渡すと送信しながら読み込まれる(DBのカーソルなども渡せる)
+  rows = ({'test1': f'テスト1-{i}', 'test2': f'テスト2-{i}'} for i in range(1, 1001))
+
+  # test_stream.csvとしてダウンロードさせる
+  return make_csv_stream_response(headers, rows, 'test_stream')
+
 def welcome_db():
   # 以下は使用サンプルのため、適宜書き換えてご確認ください
   with start_transaction() as tx:
@@ -50,10 +63,18 @@ def welcome_db():
   #   query_builder.table('{テーブル名}').insert({'{フィールド名}': 6, '{フィールド名2}': 'test'})
   # with start_transaction(False) as tx:
   #   query_builder = create_query_builder(tx)
+  #   query_builder.table('{テーブル名}').insert_many(({'{フィールド名}': i, '{フィールド名2}': 'test'} for i in range(10000)), batch_size=1000)
+  # with start_transaction(False) as tx:
+  #   query_builder = create_query_builder(tx)
   #   query_builder.table('{テーブル名}').where('{フィールド名}', '=', 6).update({'{フィールド名2}': 'test2'})
   # with start_transaction(False) as tx:
   #   query_builder = create_query_builder(tx)
   #   query_builder.table('{テーブル名}').where('{フィールド名}', '=', 6).delete()
+  # NOTE: 時間のかかるCSVの出力はバックグラウンドジョブで実行する(config.ymlのjobs.enabledをtrueにする)
+  # def export_clients(job):
+  #   with start_transaction() as tx:
+  #     job.write_csv({'{フィールド名}': '{表示名}'}, create_query_builder(tx).table('{テーブル名}').select_iter())
+  # job_id = submit_job(export_clients, file_name='{ファイル名}.csv', mimetype='text/csv; charset=shift_jis')
   return render_template('welcome.html', welcome_text = 'DBに関する確認')
 
 def welcome_error_test():
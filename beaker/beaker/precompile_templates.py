@@ -0,0 +1,11 @@
+"""テンプレートの事前コンパイル
+
+   デプロイ時に実行しておくとConfigのtemplate.bytecode_cache_dirにコンパイル結果が保存され、
+   起動直後のリクエストでもテンプレートの解析とコンパイルが省略される
+   実行方法) beakerディレクトリで`python precompile_templates.py`
+"""
+from common.beaker import create_app
+
+if __name__ == '__main__':
+  app = create_app()
+  print(f'{app.precompile_templates()}件のテンプレートをコンパイルしました。')
@@ -1,6 +1,9 @@
 """このパッケージにて定義されたメソッドはカスタムフィルタとして抽出されます。
+   (インポートしたメソッドは抽出されません)
+   引数が同じであれば常に同じ結果を返すフィルタには@pure_filterをつけるとfast_filtersが有効な場合に結果がメモ化されます。
+   NOTE: メモ化にも引数のハッシュ化と検索がかかるため、convert_moneyのような軽いフィルタにはつけない(benchmarks/bench_filters.pyで計測できる)
 """
-from common.beaker import logger
+from common.beaker import logger, is_filter_tracing, pure_filter
 
 def convert_money(number, is_none_text = '0'):
   """3桁カンマ区切りの金額に変換する処理
@@ -18,13 +21,18 @@ def convert_money(number, is_none_text = '0'):
   if number is None:
     return is_none_text
 
-  try:
-    logger.debug(f'3桁カンマ区切り処理のnumber: {number}')
+  if is_filter_tracing():
+    logger.debug('3桁カンマ区切り処理のnumber: %s', number)
+
+  # NOTE: 整数の場合は変換不要のためそのまま3桁カンマ区切りの文字列を返却する
+  if type(number) is int:
+    return f'{number:,}'
 
+  try:
     # 3桁カンマ区切りの文字列を返却
-    return '{:,}'.format(int(number))
+    return f'{int(number):,}'
 
-  except Exception:
+  except (TypeError, ValueError, OverflowError):
     # HACK: 全体的に表示に関わる部分でエラーにしないようにしたほうが良いと考えて元文字列の返却を行っている
     #       運用の中でエラーの発見を起こすリスクも考えた上で再度検討しても良いと考えている
     logger.warning(f'3桁カンマ区切り処理に失敗しています number: {number}')
@@ -42,7 +50,8 @@ def concat_list(target_list, delimiter=',', empty_text='', exception_text=''):
       str: 結合した文字列
   """
   try:
-    logger.debug(f'リスト形式の文字列結合処理のtarget_list: {target_list}')
+    if is_filter_tracing():
+      logger.debug('リスト形式の文字列結合処理のtarget_list: %s', target_list)
 
     # 与えられた対象がリストでない場合は後続処理は行わない(想定外の結合が行われるのを防止する)
     if type(target_list) is not list:
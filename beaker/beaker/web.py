@@ -1,10 +1,11 @@
 from common.beaker import BeakerRouter
 router = BeakerRouter()
 
-from controllers.welcome_controller import welcome, welcome_post, welcome_get_csv, welcome_db, welcome_error_test
+from controllers.welcome_controller import welcome, welcome_post, welcome_get_csv, welcome_get_csv_stream, welcome_db, welcome_error_test
 
 router.get('/', welcome)
 router.get('/get_csv', welcome_get_csv)
+router.get('/get_csv_stream', welcome_get_csv_stream)
 router.get('/error_test', welcome_error_test)
 router.get('/welcome_db', welcome_db)
 router.post('/welcome_post', welcome_post)
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""CsvCreatorの書き込み処理のスループット計測
+
+   write_rowで1行ずつ書き込む処理とwrite_rowsでまとめて書き込む処理を比較する
+   また、同じwriterowsでの書き込みで行の変換を事前に作成した処理(itemgetter)で行う場合と1項目ずつ確認する場合を比較する
+   実行方法) beakerディレクトリで`python ../benchmarks/bench_csv.py`
+"""
+import logging
+import os
+import sys
+import time
+from itertools import islice
+
+sys.path.insert(0, os.getcwd())
+
+from common.csv import CsvCreator, DEFAULT_BATCH_SIZE
+
+COLUMN_COUNT = 60
+ROW_COUNT = 100000
+REPEAT = 5
+
+def create_rows(headers):
+  row = {key: f'{key}-value' for key in headers}
+  return [dict(row) for _ in range(ROW_COUNT)]
+
+def measure(name, headers, write):
+  # NOTE: 実行ごとのばらつきを抑えるためREPEAT回のうち最速の結果を使用する
+  elapsed = None
+  for _ in range(REPEAT):
+    with CsvCreator(logging.getLogger('bench'), headers) as cc:
+      start = time.perf_counter()
+      write(cc)
+      seconds = time.perf_counter() - start
+    elapsed = seconds if elapsed is None else min(elapsed, seconds)
+  print(f'{name:28s}: {ROW_COUNT / elapsed:12,.0f} rows/sec')
+
+def write_per_row(cc, rows):
+  for row in rows:
+    cc.write_row(row)
+
+def write_batches(cc, rows, convert):
+  # NOTE: write_rowsと同じくbatch_size件ずつwriterowsに渡し、行の変換処理のみを切り替える
+  writer = cc._CsvCreator__writer
+  iterator = map(convert, rows)
+  while True:
+    batch = list(islice(iterator, DEFAULT_BATCH_SIZE))
+    if not batch:
+      return
+    writer.writerows(batch)
+
+def measure_convert(name, headers, rows, get_convert):
+  convert = get_convert(CsvCreator(logging.getLogger('bench'), headers))
+  elapsed = None
+  for _ in range(REPEAT):
+    start = time.perf_counter()
+    for row in rows:
+      convert(row)
+    seconds = time.perf_counter() - start
+    elapsed = seconds if elapsed is None else min(elapsed, seconds)
+  print(f'{name:28s}: {ROW_COUNT / elapsed:12,.0f} rows/sec')
+
+def main():
+  headers = {f'column{i}': f'項目{i}' for i in range(COLUMN_COUNT)}
+  rows = create_rows(headers)
+  tuple_rows = [tuple(row.values()) for row in rows]
+
+  measure('write_row (dict)', headers, lambda cc: write_per_row(cc, rows))
+  measure('write_rows (dict)', headers, lambda cc: cc.write_rows(rows))
+  measure('write_rows (tuple)', headers, lambda cc: cc.write_rows(tuple_rows))
+
+  # 行の変換処理の比較(同じwriterowsでの書き込みと変換のみ)
+  measure('writerows + per-key', headers, lambda cc: write_batches(cc, rows, cc._CsvCreator__to_csv_row))
+  measure('writerows + itemgetter', headers, lambda cc: write_batches(cc, rows, cc._CsvCreator__project))
+  measure_convert('convert only: per-key', headers, rows, lambda cc: cc._CsvCreator__to_csv_row)
+  measure_convert('convert only: itemgetter', headers, rows, lambda cc: cc._CsvCreator__project)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,83 @@
+"""カスタムフィルタを使用した10,000行のテーブルの描画時間の計測
+
+   従来のフィルタ(呼び出しごとにf文字列でデバッグログを作成)とfast_filtersのフィルタを比較する
+   また、convert_money単体で直接呼び出す場合とメモ化した場合を比較する
+   実行方法) beakerディレクトリ(config.ymlがある場所)で`python ../benchmarks/bench_filters.py`
+"""
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.getcwd())
+
+from jinja2 import Environment
+
+import common.beaker
+from common.beaker import logger, memoize_filter
+import template_filters
+
+ROW_COUNT = 10000
+
+TEMPLATE = '''<table>
+{% for row in rows %}
+  <tr><td>{{ row.price | convert_money }}</td><td>{{ row.tax | convert_money('-') }}</td><td>{{ row.tags | concat_list(' ') }}</td></tr>
+{% endfor %}
+</table>'''
+
+def legacy_convert_money(number, is_none_text = '0'):
+  if number is None:
+    return is_none_text
+  try:
+    logger.debug(f'3桁カンマ区切り処理のnumber: {number}')
+    return '{:,}'.format(int(number))
+  except Exception:
+    logger.warning(f'3桁カンマ区切り処理に失敗しています number: {number}')
+    return number
+
+def legacy_concat_list(target_list, delimiter=',', empty_text='', exception_text=''):
+  try:
+    logger.debug(f'リスト形式の文字列結合処理のtarget_list: {target_list}')
+    if type(target_list) is not list:
+      return exception_text
+    if len(target_list) == 0:
+      return empty_text
+    return delimiter.join(target_list)
+  except Exception:
+    return exception_text
+
+def create_rows():
+  # NOTE: 実際の一覧と同様に同じ金額が繰り返し出現するデータとする
+  return [{'price': (i % 500) * 100, 'tax': None if i % 10 == 0 else (i % 50) * 10, 'tags': ['a', 'b', str(i % 5)]} for i in range(ROW_COUNT)]
+
+def measure(name, filters, rows, number=5):
+  environment = Environment()
+  environment.filters.update(filters)
+  template = environment.from_string(TEMPLATE)
+  elapsed = timeit.timeit(lambda: template.render(rows=rows), number=number) / number
+  print(f'{name:16s}: {elapsed * 1000:8.2f} ms/render')
+
+def measure_filter(name, function, values, repeat=5, number=20):
+  elapsed = min(timeit.repeat(lambda: [function(value) for value in values], number=number, repeat=repeat)) / number
+  print(f'{name:34s}: {elapsed * 1000:8.2f} ms/{len(values)} calls')
+
+def measure_memoize():
+  # NOTE: 同じ金額が繰り返し出現する場合と、すべて異なる金額の場合(キャッシュがヒットしない)を比較する
+  for label, values in (('repeated', [(i % 500) * 100 for i in range(ROW_COUNT)]), ('unique', list(range(ROW_COUNT)))):
+    measure_filter(f'convert_money direct ({label})', template_filters.convert_money, values)
+    measure_filter(f'convert_money memoized ({label})', memoize_filter(template_filters.convert_money), values)
+
+def main():
+  # NOTE: 本番を想定してINFOレベルで計測する
+  logger.is_enabled_for(logging.INFO)
+  logging.getLogger('app_logger').setLevel(logging.INFO)
+  rows = create_rows()
+
+  measure('legacy filters', {'convert_money': legacy_convert_money, 'concat_list': legacy_concat_list}, rows)
+
+  common.beaker._filter_tracing = False
+  measure('fast filters', {'convert_money': template_filters.convert_money, 'concat_list': template_filters.concat_list}, rows)
+  measure_memoize()
+
+if __name__ == '__main__':
+  main()
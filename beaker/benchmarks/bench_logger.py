@@ -0,0 +1,59 @@
+"""BeakerLoggerの呼び出し元解決処理のマイクロベンチマーク
+
+   inspect.stack()を使用していた従来の処理と現在の処理をDEBUG/INFOレベルで比較する
+   実行方法) beakerディレクトリ(config.ymlがある場所)で`python ../benchmarks/bench_logger.py`
+"""
+import inspect
+import logging
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.getcwd())
+
+from common.beaker import BeakerLogger
+
+class LegacyBeakerLogger(BeakerLogger):
+  """inspect.stack()で呼び出し元を解決していた従来の実装
+  """
+  def _get_file_name(self):
+    file_name = inspect.stack()[2].filename
+    function_name = inspect.stack()[2].function
+    return (file_name, function_name)
+
+  def debug(self, message):
+    file_name, function_name = self._get_file_name()
+    self._logger.debug(f'{file_name}#{function_name}: {message}')
+
+def create_logger(logger_class, level, log_dir):
+  config = {'log': {'level': level, 'file_name': os.path.join(log_dir, 'bench.log')}}
+  bench_logger = logger_class(config, logger_name=f'bench_{logger_class.__name__}_{level}')
+  # NOTE: I/Oの時間を除いて呼び出し元の解決とフォーマットの時間のみを計測する
+  bench_logger._logger.handlers = [logging.NullHandler()]
+  return bench_logger
+
+def controller(bench_logger, lazy):
+  """ログを出力するコントローラを想定した処理
+  """
+  context = {'rows': list(range(20))}
+  if lazy:
+    bench_logger.debug('コンテキスト: %s', context)
+  else:
+    bench_logger.debug(f'コンテキスト: {context}')
+
+def main(number=20000):
+  with tempfile.TemporaryDirectory() as log_dir:
+    for level in ('DEBUG', 'INFO'):
+      # NOTE: dictConfigは既存のloggerを無効化するため生成直後に計測する
+      legacy = create_logger(LegacyBeakerLogger, level, log_dir)
+      legacy_time = timeit.timeit(lambda: controller(legacy, False), number=number)
+      current = create_logger(BeakerLogger, level, log_dir)
+      current_time = timeit.timeit(lambda: controller(current, True), number=number)
+      print(f'[{level}] legacy: {legacy_time / number * 1e6:8.2f} us/call  '
+            f'current: {current_time / number * 1e6:8.2f} us/call  '
+            f'x{legacy_time / current_time:.1f}')
+    logging.shutdown()
+
+if __name__ == '__main__':
+  main()
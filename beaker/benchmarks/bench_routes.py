@@ -0,0 +1,86 @@
+"""BeakerRouterに登録したルートの負荷試験
+
+   web.pyで登録したルートに並行してリクエストを送信し、p50/p95/p99の処理時間、1秒あたりのリクエスト数、
+   1リクエストあたりのメモリの確保量を出力する
+   テストクライアントで実行する場合はDBの接続をスタブに差し替えるためDBがなくても実行できる
+   実行方法) beakerディレクトリ(config.ymlがある場所)で`python ../benchmarks/bench_routes.py [オプション]`
+     --url http://localhost:5000   起動中のサーバに送信する(指定しない場合はテストクライアント)
+     --payloads payloads.yml       ルートのパスごとのリクエストの内容(POSTやパラメータを含むルートは指定した場合のみ対象)
+     --save-baseline baseline.json 計測結果をベースラインとして保存する
+     --baseline baseline.json      ベースラインと比較し、悪化した場合は終了コード1で終了する
+
+   payloads.ymlの例)
+     /welcome_post:
+       data:
+         welcome-text: test
+     /clients/<int:id>:
+       path: /clients/1
+"""
+import argparse
+import os
+import sys
+
+import yaml
+
+sys.path.insert(0, os.getcwd())
+
+from common.beaker import create_app, set_db_connect
+from common.load_test import DEFAULT_THRESHOLD, HttpSender, TestClientSender, compare_with_baseline, create_requests, load_baseline, measure_allocations, run_load_test, save_baseline
+from stub_db import StubConnection
+
+def parse_args():
+  parser = argparse.ArgumentParser(description='BeakerRouterに登録したルートの負荷試験')
+  parser.add_argument('--url', help='起動中のサーバのURL(指定しない場合はテストクライアントで実行する)')
+  parser.add_argument('--requests', type=int, default=200, help='ルートごとのリクエスト数')
+  parser.add_argument('--concurrency', type=int, default=4, help='並行数')
+  parser.add_argument('--warmup', type=int, default=10, help='計測前に送信するリクエスト数')
+  parser.add_argument('--payloads', help='ルートのパスごとのリクエストの内容(YAML)')
+  parser.add_argument('--routes', nargs='*', help='対象とするルートのパス(指定しない場合はすべて)')
+  parser.add_argument('--db-latency', type=float, default=0.0, help='スタブのDBでSQLごとに待機する秒数')
+  parser.add_argument('--baseline', help='比較するベースライン(JSON)')
+  parser.add_argument('--save-baseline', help='計測結果を保存するベースライン(JSON)')
+  parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='悪化と判定する割合')
+  return parser.parse_args()
+
+def main():
+  args = parse_args()
+  payloads = {}
+  if args.payloads:
+    with open(args.payloads, encoding='utf-8') as file:
+      payloads = yaml.safe_load(file) or {}
+
+  if args.url:
+    send = HttpSender(args.url)
+  else:
+    set_db_connect(lambda db_info: StubConnection(latency=args.db_latency))
+    send = TestClientSender(create_app())
+
+  # NOTE: web.pyはcreate_appの中でインポートされるためここで参照する
+  from web import router
+  routes = [route for route in router.get_routes() if not args.routes or route['path'] in args.routes]
+
+  results = {}
+  print(f'{"request":32s} {"req/s":>9s} {"p50 ms":>8s} {"p95 ms":>8s} {"p99 ms":>8s} {"errors":>6s} {"alloc KB":>9s}')
+  for request in create_requests(routes, payloads):
+    result = run_load_test(send, request, count=args.requests, concurrency=args.concurrency, warmup=args.warmup)
+    if not args.url:
+      result.update(measure_allocations(send, request))
+    results[request['name']] = result
+    alloc = f'{result["alloc_peak_kb"]:9.1f}' if 'alloc_peak_kb' in result else f'{"-":>9s}'
+    print(f'{request["name"]:32s} {result["rps"]:9.1f} {result["p50_ms"]:8.2f} {result["p95_ms"]:8.2f} {result["p99_ms"]:8.2f} {result["errors"]:6d} {alloc}')
+
+  if args.save_baseline:
+    save_baseline(args.save_baseline, results)
+    print(f'ベースラインを保存しました。 {args.save_baseline}')
+
+  if args.baseline:
+    regressions = compare_with_baseline(results, load_baseline(args.baseline), args.threshold)
+    if regressions:
+      print('ベースラインより悪化しました。')
+      for regression in regressions:
+        print(f'  {regression}')
+      sys.exit(1)
+    print('ベースラインから悪化していません。')
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,77 @@
+"""select_iterでCSVをストリーミング出力した場合のメモリ使用量の計測
+
+   DBの代わりに行を生成するサーバ側カーソルのスタブを使用し、selectで全件読み込む場合と比較する
+   実行方法) beakerディレクトリで`python ../benchmarks/bench_select_iter.py [行数]`
+"""
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.getcwd())
+
+from common.csv import CsvCreator
+from common.db_pool import ConnectionPool, PooledConnecter
+from common.query_builder import BeakerQueryBuilder
+from common.transaction import BeakerTransaction
+
+ROW_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+HEADERS = {'id': 'ID', 'name': '名前', 'email': 'メールアドレス', 'amount': '金額'}
+
+class StubCursor():
+  """ 行を生成しながら返却するサーバ側カーソルのスタブ
+  """
+  def __init__(self):
+    self._position = 0
+
+  def execute(self, sql, params=None):
+    pass
+
+  def fetchmany(self, size):
+    end = min(self._position + size, ROW_COUNT)
+    rows = [(i, f'name{i}', f'user{i}@example.com', i * 100) for i in range(self._position, end)]
+    self._position = end
+    return rows
+
+  def fetchall(self):
+    return self.fetchmany(ROW_COUNT)
+
+  def close(self):
+    pass
+
+class StubConnection():
+  closed = 0
+
+  def cursor(self, name=None):
+    return StubCursor()
+
+  def commit(self):
+    pass
+
+  def rollback(self):
+    pass
+
+  def close(self):
+    pass
+
+def measure(name, create_rows):
+  pool = ConnectionPool(StubConnection, logging.getLogger('bench'), health_check=False)
+  tracemalloc.start()
+  start = time.perf_counter()
+  size = 0
+  with BeakerTransaction(PooledConnecter(pool)) as tx:
+    for chunk in CsvCreator(logging.getLogger('bench'), HEADERS).iter_encoded(create_rows(tx), 'utf_8'):
+      size += len(chunk)
+  elapsed = time.perf_counter() - start
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  print(f'{name:24s}: {ROW_COUNT / elapsed:10,.0f} rows/sec, peak {peak / 1024 / 1024:8.1f} MB, {size / 1024 / 1024:.1f} MB output')
+
+def main():
+  print(f'rows: {ROW_COUNT:,}')
+  measure('select (materialized)', lambda tx: tx.get_current_connection().cursor().fetchall())
+  measure('select_iter', lambda tx: BeakerQueryBuilder(tx=tx).table('clients').select_iter(chunk_size=1000))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,39 @@
+"""起動時間の計測
+
+   common.beakerのインポート、Beakerの生成、最初のリクエストまでの時間を別プロセスで計測する
+   実行方法) beakerディレクトリ(config.ymlがある場所)で`python ../benchmarks/bench_startup.py`
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RUN_COUNT = 10
+
+# NOTE: 計測対象の処理は毎回新しいプロセスで実行してインポートのキャッシュの影響を受けないようにする
+_MEASURE_SCRIPT = '''
+import json, os, sys, time
+sys.path.insert(0, os.getcwd())
+start = time.perf_counter()
+import common.beaker
+imported = time.perf_counter()
+from app_run import app
+created = time.perf_counter()
+app.test_client().get('/')
+requested = time.perf_counter()
+print(json.dumps({'import': imported - start, 'create_app': created - imported, 'first_request': requested - created, 'total': requested - start}))
+'''
+
+def main():
+  results = []
+  for _ in range(RUN_COUNT):
+    output = subprocess.run([sys.executable, '-c', _MEASURE_SCRIPT], cwd=os.getcwd(), capture_output=True, text=True, check=True).stdout
+    results.append(json.loads(output.strip().splitlines()[-1]))
+
+  for key in ('import', 'create_app', 'first_request', 'total'):
+    values = [result[key] * 1000 for result in results]
+    print(f'{key:14s}: median {statistics.median(values):8.2f} ms  min {min(values):8.2f} ms')
+
+if __name__ == '__main__':
+  main()
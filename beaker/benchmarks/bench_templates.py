@@ -0,0 +1,67 @@
+"""テンプレートの最初の描画時間の計測
+
+   バイトコードキャッシュなし、キャッシュ作成時(初回)、キャッシュ使用時の
+   起動直後の最初のリクエストの時間を別プロセスで比較する
+   実行方法) beakerディレクトリ(config.ymlがある場所)で`python ../benchmarks/bench_templates.py`
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import yaml
+
+RUN_COUNT = 10
+
+_MEASURE_SCRIPT = '''
+import json, os, sys, time
+sys.path.insert(0, os.getcwd())
+from common.beaker import create_app
+app = create_app(sys.argv[1])
+client = app.test_client()
+start = time.perf_counter()
+client.get('/')
+client.get('/not_found')
+print(json.dumps({'first_render': time.perf_counter() - start}))
+'''
+
+def write_config(directory, name, template_vars):
+  with open('./config.yml') as file:
+    config = yaml.safe_load(file)
+  config['template'] = template_vars
+  path = os.path.join(directory, f'{name}.yml')
+  with open(path, 'w') as file:
+    yaml.safe_dump(config, file)
+  return path
+
+def measure(config_path, before_each=None):
+  values = []
+  for _ in range(RUN_COUNT):
+    if before_each is not None:
+      before_each()
+    output = subprocess.run([sys.executable, '-c', _MEASURE_SCRIPT, config_path], cwd=os.getcwd(), capture_output=True, text=True, check=True).stdout
+    values.append(json.loads(output.strip().splitlines()[-1])['first_render'] * 1000)
+  return values
+
+def main():
+  with tempfile.TemporaryDirectory() as directory:
+    cache_dir = os.path.join(directory, 'template_cache')
+
+    def clear_cache():
+      if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+          os.remove(os.path.join(cache_dir, name))
+
+    results = {
+      'no bytecode cache': measure(write_config(directory, 'none', {})),
+      'cold bytecode cache': measure(write_config(directory, 'cold', {'bytecode_cache_dir': cache_dir}), clear_cache),
+      'warm bytecode cache': measure(write_config(directory, 'warm', {'bytecode_cache_dir': cache_dir})),
+    }
+
+  for name, values in results.items():
+    print(f'{name:20s}: median {statistics.median(values):8.2f} ms  min {min(values):8.2f} ms')
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,70 @@
+"""DBに接続せずに負荷試験を行うための接続のスタブ
+
+   bench_routes.pyのテストクライアントでの実行時にset_db_connectで差し替えて使用する
+"""
+import time
+
+class StubCursor():
+  """ DBに接続せずに負荷試験を行うためのカーソルのスタブ
+  """
+
+  def __init__(self, rows, latency):
+    self._rows = rows
+    self._latency = latency
+    self._position = 0
+    self.rowcount = 0
+    self.description = None
+
+  def execute(self, sql, params=None):
+    if self._latency:
+      time.sleep(self._latency)
+    self._position = 0
+    self.rowcount = len(self._rows)
+
+  def executemany(self, sql, params_list):
+    self.execute(sql)
+
+  def fetchall(self):
+    rows = self._rows[self._position:]
+    self._position = len(self._rows)
+    return list(rows)
+
+  def fetchone(self):
+    rows = self.fetchmany(1)
+    return rows[0] if rows else None
+
+  def fetchmany(self, size):
+    rows = self._rows[self._position:self._position + size]
+    self._position += len(rows)
+    return list(rows)
+
+  def close(self):
+    pass
+
+class StubConnection():
+  """ DBに接続せずに負荷試験を行うための接続のスタブ
+      すべてのSQLに同じ行を返却する
+  """
+
+  def __init__(self, rows=(), latency=0.0):
+    """ 接続の初期化
+
+    Args:
+        rows (list, optional): SQLの実行結果として返却する行. Defaults to ().
+        latency (float, optional): SQLの実行ごとに待機する秒数(DBの処理時間の代わり). Defaults to 0.0.
+    """
+    self.closed = 0
+    self._rows = list(rows)
+    self._latency = latency
+
+  def cursor(self, *args, **kwargs):
+    return StubCursor(self._rows, self._latency)
+
+  def commit(self):
+    pass
+
+  def rollback(self):
+    pass
+
+  def close(self):
+    self.closed = 1
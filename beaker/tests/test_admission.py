@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+from flask import Flask, Response
+
+from beaker.common.admission import AdmissionController, RequestShedError, PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL
+
+class Clock():
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+def test_limit_without_queue():
+  limiter = AdmissionController().create_limiter('/export', max_concurrency=1, queue_timeout=0)
+  limiter.acquire()
+  with pytest.raises(RequestShedError):
+    limiter.acquire()
+  limiter.release()
+  limiter.acquire()
+  stats = limiter.get_stats()
+  assert (stats['admitted'], stats['shed'], stats['active']) == (2, 1, 1)
+
+def test_queue_until_released():
+  controller = AdmissionController(target_queue_latency=0)
+  limiter = controller.create_limiter('/export', max_concurrency=1, queue_timeout=5)
+  limiter.acquire()
+  admitted = threading.Event()
+  def wait():
+    limiter.acquire()
+    admitted.set()
+  thread = threading.Thread(target=wait)
+  thread.start()
+  time.sleep(0.05)
+  assert limiter.get_stats()['waiting'] == 1
+  limiter.release()
+  assert admitted.wait(5)
+  thread.join()
+  stats = limiter.get_stats()
+  assert (stats['admitted'], stats['queued'], stats['shed'], stats['active']) == (2, 1, 0, 1)
+  assert controller.get_queue_latency() > 0
+
+def test_queue_timeout():
+  limiter = AdmissionController().create_limiter('/export', max_concurrency=1, queue_timeout=0.05)
+  limiter.acquire()
+  start = time.monotonic()
+  with pytest.raises(RequestShedError):
+    limiter.acquire()
+  assert time.monotonic() - start >= 0.05
+  assert limiter.get_stats()['shed'] == 1
+
+def test_adaptive_shedding_by_priority():
+  clock = Clock()
+  controller = AdmissionController(target_queue_latency=0.1, half_life=5.0, clock=clock)
+  # NOTE: 平均の待ち時間は0.8倍の減衰と0.2倍の新しい値で計算する
+  controller.observe_wait(0.75)
+  assert controller.get_queue_latency() == pytest.approx(0.15)
+  assert controller.should_shed(PRIORITY_LOW)
+  assert not controller.should_shed(PRIORITY_NORMAL)
+  controller.observe_wait(1.0)
+  assert controller.should_shed(PRIORITY_NORMAL)
+  assert not controller.should_shed(PRIORITY_HIGH)
+
+  low = controller.create_limiter('/report', priority=PRIORITY_LOW)
+  with pytest.raises(RequestShedError):
+    low.acquire()
+  assert low.get_stats()['shed_overload'] == 1
+
+  # NOTE: 待ちが発生しなくなると待ち時間の平均は減衰して拒否しなくなる
+  clock.now += 20
+  assert not controller.should_shed(PRIORITY_LOW)
+  low.acquire()
+
+def test_router_returns_503(monkeypatch):
+  from beaker.common import beaker
+
+  monkeypatch.setattr(beaker, '_admission_controller', AdmissionController(target_queue_latency=0))
+  release = threading.Event()
+  def export():
+    def generate():
+      yield 'start,'
+      release.wait(5)
+      yield 'done'
+    return Response(generate())
+
+  router = beaker.BeakerRouter()
+  router.get('/export', export, max_concurrency=1, queue_timeout=0)
+  app = Flask(__name__)
+  router.regist_flask(app)
+
+  client = app.test_client()
+  first = client.get('/export', buffered=False)
+  # NOTE: ストリーミングのレスポンスは送信が終わるまで実行中として扱う
+  second = client.get('/export')
+  assert second.status_code == 503
+  assert second.headers['Retry-After'] == '1'
+  release.set()
+  assert first.get_data() == b'start,done'
+  first.close()
+  third = client.get('/export')
+  assert third.status_code == 200
+  third.close()
+  stats = beaker.get_admission_stats()['routes']['/export']
+  assert (stats['admitted'], stats['shed'], stats['active']) == (2, 1, 0)
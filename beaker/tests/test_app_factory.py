@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+import pytest
+import yaml
+
+BEAKER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'beaker')
+
+SCRIPT = '''
+from common import beaker
+
+# NOTE: インポートしただけではConfigの読み込みやログ・DBの初期化を行わない
+assert beaker._beaker_config is None
+assert beaker._beaker_db is None
+assert beaker.logger._logger is None
+
+app = beaker.create_app('custom.yml')
+assert beaker.get_config()['app']['port'] == 5999
+assert beaker._beaker_db is None
+assert app.test_client().get('/').status_code == 200
+
+# NOTE: Configの読み込み後に別のConfigは指定できない
+try:
+  beaker.configure('other.yml')
+except Exception:
+  print('rejected')
+'''
+
+def test_lazy_import_and_create_app(tmp_path):
+  with open(os.path.join(BEAKER_DIR, 'example.config.yml'), encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+  config['app']['port'] = 5999
+  config['log']['file_name'] = str(tmp_path / 'app.log')
+  with open(tmp_path / 'custom.yml', 'w', encoding='utf-8') as file:
+    yaml.safe_dump(config, file, allow_unicode=True)
+
+  # NOTE: カレントディレクトリにconfig.ymlがない状態でインポートとConfigの指定ができることを確認する
+  env = dict(os.environ, PYTHONPATH=os.pathsep.join([BEAKER_DIR, *sys.path]))
+  result = subprocess.run([sys.executable, '-c', SCRIPT], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60)
+  assert result.returncode == 0, result.stderr
+  assert result.stdout.splitlines()[-1] == 'rejected'
+
+def test_configure_after_load_is_rejected():
+  from beaker.common import beaker as beaker_module
+
+  beaker_module.get_config()
+  with pytest.raises(Exception):
+    beaker_module.configure('./other.yml')
+
+def test_create_app():
+  from common.beaker import Beaker, create_app
+
+  app = create_app()
+  assert isinstance(app, Beaker)
+  assert app.test_client().get('/').status_code == 200
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from beaker.common.async_support import AsyncTransaction, BlockingExecutor
+
+class ConcurrencyCounter():
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.current = 0
+    self.max = 0
+
+  def work(self, seconds=0.05):
+    with self._lock:
+      self.current += 1
+      self.max = max(self.max, self.current)
+    time.sleep(seconds)
+    with self._lock:
+      self.current -= 1
+
+class StubTransaction():
+  def __init__(self):
+    self.counter = ConcurrencyCounter()
+    self.events = []
+
+  def __enter__(self):
+    self.events.append('enter')
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.events.append('exit')
+    return False
+
+  def find_all(self, sql):
+    self.counter.work()
+    return [sql]
+
+def test_blocking_calls_run_concurrently():
+  executor = BlockingExecutor(max_workers=4)
+  counter = ConcurrencyCounter()
+
+  async def main():
+    await asyncio.gather(*[executor.run(counter.work, 0.1) for _ in range(4)])
+
+  start = time.monotonic()
+  asyncio.run(main())
+  assert time.monotonic() - start < 0.3
+  assert counter.max == 4
+  executor.shutdown()
+
+def test_max_workers_bounds_concurrency():
+  executor = BlockingExecutor(max_workers=2)
+  counter = ConcurrencyCounter()
+
+  async def main():
+    await asyncio.gather(*[executor.run(counter.work) for _ in range(6)])
+
+  asyncio.run(main())
+  assert counter.max == 2
+  executor.shutdown()
+
+def test_invalid_max_workers():
+  with pytest.raises(ValueError):
+    BlockingExecutor(max_workers=0)
+
+def test_transaction_runs_sequentially():
+  executor = BlockingExecutor(max_workers=4)
+  transaction = StubTransaction()
+
+  async def main():
+    async with AsyncTransaction(transaction, executor) as tx:
+      return await asyncio.gather(tx.find_all('a'), tx.find_all('b'), tx.run(lambda t: t.find_all('c')))
+
+  assert asyncio.run(main()) == [['a'], ['b'], ['c']]
+  assert transaction.counter.max == 1
+  assert transaction.events == ['enter', 'exit']
+  executor.shutdown()
+
+def test_async_controller():
+  pytest.importorskip('asgiref')
+  from beaker.common.beaker import BeakerRouter
+
+  executor = BlockingExecutor(max_workers=2)
+  async def controller():
+    return await executor.run(lambda: 'async')
+
+  router = BeakerRouter()
+  router.get('/async', controller)
+  app = Flask(__name__)
+  router.regist_flask(app)
+  assert app.test_client().get('/async').data == b'async'
+  executor.shutdown()
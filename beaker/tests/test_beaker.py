@@ -9,4 +9,28 @@ def test_route():
   response = client.get('/')
   assert response.status_code == 200
 
+def test_get_csv():
+  client = app.test_client()
+  response = client.get('/get_csv')
+  assert response.status_code == 200
+  assert response.headers['Content-Disposition'] == 'attachment; filename=test.csv'
+  assert response.data.decode('utf_8_sig').splitlines()[0] == '"テスト1","テスト2"'
+
+def test_get_csv_stream():
+  client = app.test_client()
+  response = client.get('/get_csv_stream')
+  assert response.status_code == 200
+  assert response.is_streamed
+  assert response.headers['Content-Disposition'] == 'attachment; filename=test_stream.csv'
+  lines = response.data.decode('shift_jis').splitlines()
+  assert lines[0] == '"テスト1","テスト2"'
+  assert lines[-1] == '"テスト1-1000","テスト2-1000"'
+  assert len(lines) == 1001
 
+def test_static_does_not_refresh_session():
+  client = app.test_client()
+  response = client.get('/')
+  assert 'Set-Cookie' in response.headers
+  response = client.get('/statics/img/beaker-1.jpg')
+  assert response.status_code == 200
+  assert 'Set-Cookie' not in response.headers
@@ -0,0 +1,113 @@
+import logging
+
+import pytest
+
+from beaker.common.bulk_write import BulkWriter, METHOD_COPY
+
+class RecordingCursor():
+  def __init__(self):
+    self.executed = []
+    self.copied = []
+
+  def execute(self, sql, params=None):
+    self.executed.append((sql, params))
+
+  def copy_expert(self, sql, file):
+    self.copied.append((sql, file.read()))
+
+  def fetchall(self):
+    return []
+
+  def close(self):
+    pass
+
+class RecordingConnection():
+  def __init__(self):
+    self.closed = 0
+    self.cursors = []
+    self.commit_count = 0
+
+  def cursor(self):
+    cursor = RecordingCursor()
+    self.cursors.append(cursor)
+    return cursor
+
+  def commit(self):
+    self.commit_count += 1
+
+  def rollback(self):
+    pass
+
+  def close(self):
+    self.closed = 1
+
+def generate_rows(count, consumed):
+  for i in range(count):
+    consumed.append(i)
+    yield {'id': i, 'name': f'name{i}'}
+
+def test_insert_values_in_batches():
+  cursor = RecordingCursor()
+  batches = []
+  result = BulkWriter('clients', batch_size=2, on_batch=lambda *args: batches.append(args)).write(cursor, generate_rows(5, []))
+  assert result['rows'] == 5
+  assert result['batches'] == 3
+  assert [batch[1] for batch in batches] == [2, 2, 1]
+  assert cursor.executed[0] == ('INSERT INTO clients (id, name) VALUES (%s, %s), (%s, %s);', [0, 'name0', 1, 'name1'])
+  assert cursor.executed[2] == ('INSERT INTO clients (id, name) VALUES (%s, %s);', [4, 'name4'])
+
+def test_generator_is_consumed_per_batch():
+  consumed = []
+  cursor = RecordingCursor()
+  def on_batch(number, count, seconds):
+    # NOTE: 1回分の登録時点では次の回の行はまだ読み込まれていない
+    assert len(consumed) == number * 2
+  BulkWriter('clients', batch_size=2, on_batch=on_batch).write(cursor, generate_rows(4, consumed))
+
+def test_upsert():
+  cursor = RecordingCursor()
+  BulkWriter('clients', conflict_columns=['id']).write(cursor, [{'id': 1, 'name': 'a'}])
+  assert cursor.executed[0][0] == 'INSERT INTO clients (id, name) VALUES (%s, %s) ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name;'
+  cursor = RecordingCursor()
+  BulkWriter('clients', conflict_columns=['id'], update_columns=[]).write(cursor, [{'id': 1, 'name': 'a'}])
+  assert cursor.executed[0][0].endswith('ON CONFLICT (id) DO NOTHING;')
+
+def test_copy():
+  cursor = RecordingCursor()
+  BulkWriter('clients', method=METHOD_COPY).write(cursor, [{'id': 1, 'name': 'a"b'}, {'id': 2, 'name': None}])
+  assert cursor.copied == [('COPY clients (id, name) FROM STDIN WITH (FORMAT csv)', '1,"a""b"\n2,\n')]
+
+def test_copy_field_types():
+  cursor = RecordingCursor()
+  BulkWriter('logs', method=METHOD_COPY).write(cursor, [{'data': b'\x00\xff', 'meta': {'name': 'a'}, 'tags': ['x']}])
+  assert cursor.copied[0][1] == '"\\x00ff","{""name"": ""a""}","[""x""]"\n'
+  with pytest.raises(ValueError, match='COPYで登録できない型'):
+    BulkWriter('logs', method=METHOD_COPY).write(RecordingCursor(), [{'data': object()}])
+
+def test_invalid_identifier():
+  with pytest.raises(ValueError):
+    BulkWriter('clients; DROP TABLE clients')
+  with pytest.raises(ValueError):
+    BulkWriter('clients').write(RecordingCursor(), [{'id; --': 1}])
+
+def test_different_columns():
+  for rows in ([{'id': 1, 'name': 'a'}, {'id': 2}], [{'id': 1, 'name': 'a'}, {'id': 2, 'nmae': 'b'}]):
+    with pytest.raises(ValueError, match='行によって項目が異なります'):
+      BulkWriter('clients').write(RecordingCursor(), rows)
+
+def test_insert_many_in_transaction():
+  from beaker.common.db_pool import ConnectionPool, PooledConnecter
+  from beaker.common.query_builder import BeakerQueryBuilder
+  from beaker.common.transaction import BeakerTransaction
+
+  connection = RecordingConnection()
+  pool = ConnectionPool(lambda: connection, logging.getLogger('test'), health_check=False)
+  with BeakerTransaction(PooledConnecter(pool), read_only=False) as tx:
+    result = BeakerQueryBuilder(tx=tx).table('clients').insert_many(generate_rows(3, []), batch_size=2)
+  assert result['batches'] == 2
+  executed = [sql for cursor in connection.cursors for sql, _ in cursor.executed]
+  assert executed == [
+    'INSERT INTO clients (id, name) VALUES (%s, %s), (%s, %s);',
+    'INSERT INTO clients (id, name) VALUES (%s, %s);',
+  ]
+  assert connection.commit_count == 1
@@ -0,0 +1,78 @@
+import gzip
+import os
+
+from flask import Flask, Response, url_for
+
+from beaker.common.compression import StaticFingerprint
+
+STATIC_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'beaker', 'statics')
+
+def create_app(compression=False, etag=False, static_fingerprint=False):
+  from beaker.common import beaker as beaker_module
+
+  app = object.__new__(beaker_module.Beaker)
+  flask = app._Beaker__flask = Flask(__name__, static_folder=STATIC_FOLDER)
+
+  @flask.route('/html')
+  def html():
+    return '<p>beaker</p>' * 200
+
+  @flask.route('/small')
+  def small():
+    return 'small'
+
+  @flask.route('/stream')
+  def stream():
+    return Response((f'{i},beaker\n' for i in range(1000)), mimetype='text/csv')
+
+  app._register_response_processing(
+    {'enabled': compression, 'brotli': False},
+    {'etag': etag, 'static_fingerprint': static_fingerprint})
+  return flask
+
+def test_gzip():
+  client = create_app(compression=True).test_client()
+  response = client.get('/html', headers={'Accept-Encoding': 'gzip'})
+  assert response.headers['Content-Encoding'] == 'gzip'
+  assert 'Accept-Encoding' in response.headers['Vary']
+  assert gzip.decompress(response.data) == ('<p>beaker</p>' * 200).encode()
+
+def test_no_compression():
+  client = create_app(compression=True).test_client()
+  assert 'Content-Encoding' not in client.get('/html').headers
+  assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+
+def test_stream():
+  client = create_app(compression=True).test_client()
+  response = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+  assert response.headers['Content-Encoding'] == 'gzip'
+  lines = gzip.decompress(response.data).decode().splitlines()
+  assert len(lines) == 1000
+  assert lines[-1] == '999,beaker'
+
+def test_etag():
+  client = create_app(compression=True, etag=True).test_client()
+  response = client.get('/html', headers={'Accept-Encoding': 'gzip'})
+  assert response.headers['Content-Encoding'] == 'gzip'
+  etag = response.headers['ETag']
+  assert etag.startswith('W/')
+  # NOTE: ETagは圧縮前の内容から作成するため、圧縮しない場合と同じ値になる
+  assert client.get('/html').headers['ETag'] == etag
+  response = client.get('/html', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+  assert response.status_code == 304
+  assert response.data == b''
+  assert 'Content-Encoding' not in response.headers
+
+def test_not_registered_when_disabled():
+  app = create_app()
+  assert app.after_request_funcs == {}
+
+def test_static_fingerprint():
+  app = create_app(static_fingerprint=True)
+  with app.test_request_context():
+    url = url_for('static', filename='img/beaker-1.jpg')
+  assert '?v=' in url
+  response = app.test_client().get(url)
+  assert response.cache_control.max_age == 31536000
+  assert response.cache_control.immutable
+  assert StaticFingerprint(STATIC_FOLDER).get_fingerprint('../../README.md') is None
@@ -0,0 +1,50 @@
+from collections import namedtuple
+import logging
+
+from beaker.common.csv import CsvCreator
+
+HEADERS = {'id': 'ID', 'name': '名前', 'note': '備考'}
+
+class DictRow(list):
+  """ psycopg2のDictCursorの行と同様にインデックスとkeyのどちらでも取得できる行
+  """
+  def __init__(self, values, index):
+    super().__init__(values)
+    self._index = index
+
+  def __getitem__(self, key):
+    if isinstance(key, str):
+      key = self._index[key]
+    return super().__getitem__(key)
+
+  def keys(self):
+    return self._index.keys()
+
+def write(headers, rows):
+  with CsvCreator(logging.getLogger('test'), headers) as cc:
+    assert cc.write_rows(rows, batch_size=2) == len(rows)
+    return cc.getvalue('utf_8').decode('utf_8').splitlines()
+
+def test_write_rows_projects_dict_in_header_order():
+  rows = [{'note': 'a', 'name': '山田', 'id': 1}, {'id': 2, 'name': '佐藤', 'note': 'b', 'extra': 'x'}]
+  assert write(HEADERS, rows) == ['"ID","名前","備考"', '"1","山田","a"', '"2","佐藤","b"']
+
+def test_write_rows_fills_missing_keys():
+  assert write(HEADERS, [{'id': 1, 'name': '山田'}, {'note': 'c'}]) == ['"ID","名前","備考"', '"1","山田",""', '"","","c"']
+
+def test_write_rows_passes_through_tuples():
+  Row = namedtuple('Row', ['id', 'name', 'note'])
+  rows = [(1, '山田', 'a'), [2, '佐藤', 'b'], Row(3, '鈴木', 'c')]
+  assert write(HEADERS, rows)[1:] == ['"1","山田","a"', '"2","佐藤","b"', '"3","鈴木","c"']
+
+def test_write_rows_uses_keys_of_dict_like_rows():
+  row = DictRow(['a', '山田', 1], {'note': 0, 'name': 1, 'id': 2})
+  assert write(HEADERS, [row])[1:] == ['"1","山田","a"']
+
+def test_write_rows_single_key():
+  assert write({'id': 'ID'}, [{'id': 1}, {}]) == ['"ID"', '"1"', '""']
+
+def test_iter_encoded():
+  creator = CsvCreator(logging.getLogger('test'), HEADERS)
+  data = b''.join(creator.iter_encoded(({'id': i} for i in range(3)), 'utf_8_sig', chunk_size=10))
+  assert data.decode('utf_8_sig').splitlines() == ['"ID","名前","備考"', '"0","",""', '"1","",""', '"2","",""']
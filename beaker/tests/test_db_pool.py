@@ -0,0 +1,212 @@
+import logging
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from beaker.common.db_pool import ConnectionPool, PooledConnecter, PoolSelector, PoolTimeoutError, RoutingConnecter
+
+class StubCursor():
+  def __init__(self, connection):
+    self._connection = connection
+
+  def execute(self, sql, params=None):
+    if not self._connection.healthy:
+      raise Exception('connection lost')
+    self._connection.executed.append(sql)
+
+  def fetchall(self):
+    return []
+
+  def fetchone(self):
+    return None
+
+  def close(self):
+    pass
+
+class StubConnection():
+  def __init__(self):
+    self.closed = 0
+    self.healthy = True
+    self.executed = []
+    self.rollback_count = 0
+
+  def cursor(self, *args, **kwargs):
+    return StubCursor(self)
+
+  def commit(self):
+    pass
+
+  def rollback(self):
+    self.rollback_count += 1
+
+  def close(self):
+    self.closed = 1
+
+def create_pool(**kwargs):
+  connections = []
+  def connect():
+    connection = StubConnection()
+    connections.append(connection)
+    return connection
+  return ConnectionPool(connect, logging.getLogger('test'), **kwargs), connections
+
+def test_reuse_connection():
+  pool, connections = create_pool(max_size=2)
+  with pool.checkout() as connection:
+    raw = connection.get_raw_connection()
+  with pool.checkout() as connection:
+    assert connection.get_raw_connection() is raw
+  assert len(connections) == 1
+  assert raw.rollback_count >= 1
+  assert pool.get_stats()['in_use'] == 0
+  assert pool.get_stats()['idle'] == 1
+
+def test_timeout_when_exhausted():
+  pool, _ = create_pool(max_size=1, timeout=0.05)
+  connection = pool.checkout()
+  with pytest.raises(PoolTimeoutError):
+    pool.checkout()
+  connection.close()
+  assert pool.get_stats()['in_use'] == 0
+
+def test_wait_for_returned_connection():
+  pool, _ = create_pool(max_size=1, timeout=5)
+  connection = pool.checkout()
+  threading.Timer(0.05, connection.close).start()
+  with pool.checkout():
+    pass
+  stats = pool.get_stats()
+  assert stats['wait_count'] == 1
+  assert stats['wait_time_max'] > 0
+
+def test_health_check_discards_broken_connection():
+  pool, connections = create_pool(max_size=2)
+  with pool.checkout():
+    pass
+  connections[0].healthy = False
+  with pool.checkout() as connection:
+    assert connection.get_raw_connection() is connections[1]
+  assert connections[0].closed
+  assert pool.get_stats()['discarded'] == 1
+
+def test_max_lifetime():
+  pool, connections = create_pool(max_lifetime=0.01, health_check=False)
+  with pool.checkout():
+    pass
+  time.sleep(0.02)
+  with pool.checkout():
+    pass
+  assert len(connections) == 2
+  assert connections[0].closed
+
+def test_pooled_connecter_keeps_borrowed_connection():
+  pool, _ = create_pool(min_size=2, max_size=2)
+  pool.warm_up()
+  assert pool.get_stats()['idle'] == 2
+  connecter = PooledConnecter(pool)
+  connection = connecter.get_connection()
+  assert connecter.connection is connection
+  assert pool.get_stats()['in_use'] == 1
+  connection.close()
+  connection.close()
+  assert pool.get_stats()['in_use'] == 0
+
+def test_round_robin_selector():
+  pools = [create_pool()[0] for _ in range(3)]
+  selector = PoolSelector(pools)
+  assert [selector.select() for _ in range(4)] == [pools[0], pools[1], pools[2], pools[0]]
+
+def test_least_busy_selector():
+  pools = [create_pool()[0] for _ in range(2)]
+  selector = PoolSelector(pools, PoolSelector.LEAST_BUSY)
+  connection = pools[0].checkout()
+  assert selector.select() is pools[1]
+  connection.close()
+
+def test_routing_connecter():
+  primary, _ = create_pool()
+  replica, _ = create_pool()
+  connecter = RoutingConnecter(lambda read_only: replica if read_only else primary)
+  with connecter.get_connection():
+    assert replica.get_stats()['in_use'] == 1
+  connecter.read_only = False
+  with connecter.get_connection():
+    assert primary.get_stats()['in_use'] == 1
+
+class HostCursor(StubCursor):
+  def execute(self, sql, params=None):
+    super().execute(sql, params)
+    self._connection.log.append(self._connection.host)
+
+class HostConnection(StubConnection):
+  def __init__(self, host, log):
+    super().__init__()
+    self.host = host
+    self.log = log
+
+  def cursor(self, *args, **kwargs):
+    return HostCursor(self)
+
+def create_db(read_your_writes_seconds=0):
+  from beaker.common.beaker import BeakerDB
+
+  log = []
+  def connect(db_info):
+    return HostConnection(db_info['host'], log)
+  config = {'database': {
+    'dbname': 'test', 'host': 'primary', 'user': 'test', 'password': '',
+    'pool': {'health_check': False},
+    'replicas': [{'host': 'replica1'}, {'host': 'replica2'}],
+    'read_your_writes_seconds': read_your_writes_seconds}}
+  return BeakerDB(config, logging.getLogger('test'), connect=connect), log
+
+def read(db):
+  db.create_query_builder().table('clients').select()
+
+def write(db):
+  db.create_query_builder().table('clients').insert({'id': 1})
+
+def test_reads_round_robin_across_replicas():
+  db, log = create_db()
+  for _ in range(2):
+    read(db)
+    with db.start_transaction() as tx:
+      db.create_query_builder(tx).table('clients').select()
+  assert log == ['replica1', 'replica2', 'replica1', 'replica2']
+
+def test_writes_go_to_primary():
+  db, log = create_db()
+  write(db)
+  with db.start_transaction(False) as tx:
+    db.create_query_builder(tx).table('clients').where('id', '=', 1).update({'name': 'a'})
+  assert log == ['primary', 'primary']
+
+def test_read_your_writes_pins_session_to_primary():
+  db, log = create_db(read_your_writes_seconds=60)
+  app = Flask(__name__)
+  app.secret_key = 'test'
+  with app.test_request_context():
+    read(db)
+    write(db)
+    read(db)
+  # NOTE: 書き込みを行っていないセッションはレプリカで読み込む
+  with app.test_request_context():
+    read(db)
+  assert log == ['replica1', 'primary', 'primary', 'replica2']
+
+def test_rolled_back_write_does_not_pin_session():
+  db, log = create_db(read_your_writes_seconds=60)
+  app = Flask(__name__)
+  app.secret_key = 'test'
+  with app.test_request_context():
+    with pytest.raises(ValueError):
+      with db.start_transaction(False) as tx:
+        db.create_query_builder(tx).table('clients').insert({'id': 1})
+        raise ValueError('rollback')
+    read(db)
+    with db.start_transaction(False) as tx:
+      db.create_query_builder(tx).table('clients').insert({'id': 1})
+    read(db)
+  assert log == ['primary', 'replica1', 'primary', 'primary']
@@ -0,0 +1,98 @@
+import time
+
+import pytest
+
+from beaker.common.error_report import ErrorReporter, fingerprint_exception, fingerprint_path
+
+class Clock():
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+class RecordingLogger():
+  def __init__(self):
+    self.errors = []
+
+  def error(self, message, *args):
+    self.errors.append(message % args)
+
+def raise_error(value):
+  return {}[value]
+
+def test_fingerprint_exception_ignores_message():
+  fingerprints = set()
+  for value in ('a', 'b'):
+    try:
+      raise_error(value)
+    except KeyError as e:
+      fingerprints.add(fingerprint_exception(e))
+  assert len(fingerprints) == 1
+  assert fingerprints.pop().startswith('KeyError test_error_report.py#raise_error:')
+
+def test_fingerprint_path():
+  assert fingerprint_path(404, '/clients/123/orders/9') == '404 /clients/<id>/orders/<id>'
+  assert fingerprint_path(404, '/files/0f8fad5b-d9cb-469f-a165-70867728950e') == '404 /files/<id>'
+  assert fingerprint_path(404, '/wp-login.php') == '404 /wp-login.php'
+
+def test_repeated_errors_are_summarized():
+  clock = Clock()
+  logger = RecordingLogger()
+  details = []
+  reporter = ErrorReporter(logger, rate_per_minute=1, burst=1, summary_interval=60, clock=clock)
+  assert reporter.report('404 /a', lambda: details.append('a'))
+  for _ in range(5):
+    clock.now += 1
+    assert not reporter.report('404 /a', lambda: details.append('a'))
+  assert reporter.report('404 /b', lambda: details.append('b'))
+  assert details == ['a', 'b']
+  assert reporter.get_stats() == {'fingerprints': 2, 'suppressed': 5}
+
+  # NOTE: トークンは1分で1つ回復し、サマリは間隔の経過後の報告時に出力する
+  clock.now = 61
+  assert reporter.report('404 /a', lambda: details.append('a'))
+  assert details == ['a', 'b', 'a']
+  assert logger.errors == ['同じエラーのため出力を抑制しました。 合計: 5件, 404 /a: 5件']
+  assert reporter.get_stats()['suppressed'] == 0
+
+def test_flush_and_eviction():
+  clock = Clock()
+  logger = RecordingLogger()
+  reporter = ErrorReporter(logger, max_fingerprints=2, clock=clock)
+  for fingerprint in ('a', 'a', 'b', 'c', 'c'):
+    reporter.report(fingerprint, lambda: None)
+  assert reporter.get_stats() == {'fingerprints': 2, 'suppressed': 2}
+  reporter.flush()
+  assert logger.errors == ['同じエラーのため出力を抑制しました。 合計: 2件, c: 1件, (other): 1件']
+  reporter.flush()
+  assert len(logger.errors) == 1
+
+def test_invalid_settings():
+  with pytest.raises(ValueError):
+    ErrorReporter(RecordingLogger(), burst=0)
+
+def test_summary_is_flushed_by_timer():
+  logger = RecordingLogger()
+  reporter = ErrorReporter(logger, summary_interval=0.05)
+  for _ in range(3):
+    reporter.report('500 KeyError', lambda: None)
+  # NOTE: 次のエラーが発生しなくても間隔の経過後にタイマーでサマリを出力する
+  deadline = time.monotonic() + 5
+  while not logger.errors and time.monotonic() < deadline:
+    time.sleep(0.01)
+  assert logger.errors == ['同じエラーのため出力を抑制しました。 合計: 2件, 500 KeyError: 2件']
+  assert reporter.get_stats()['suppressed'] == 0
+  reporter.close()
+
+def test_close_cancels_timer():
+  logger = RecordingLogger()
+  reporter = ErrorReporter(logger, summary_interval=60)
+  reporter.report('a', lambda: None)
+  reporter.report('a', lambda: None)
+  assert reporter._timer is not None
+  reporter.close()
+  assert reporter._timer is None
+  assert logger.errors == ['同じエラーのため出力を抑制しました。 合計: 1件, a: 1件']
+  reporter.report('a', lambda: None)
+  assert reporter._timer is None
@@ -0,0 +1,71 @@
+from flask import Flask
+
+from beaker.common.filters import is_pure_filter, memoize_filter, pure_filter
+
+def test_memoize_equal_arguments():
+  calls = []
+
+  @pure_filter(maxsize=2)
+  def label(value, suffix=''):
+    calls.append(value)
+    return f'{value}{suffix}'
+
+  memoized = memoize_filter(label)
+  assert memoized(1) == '1'
+  assert memoized(1) == '1'
+  assert memoized(1, suffix='円') == '1円'
+  assert memoized(1, suffix='円') == '1円'
+  # NOTE: typed=Trueのため1と1.0は別の結果として扱う
+  assert memoized(1.0) == '1.0'
+  assert calls == [1, 1, 1.0]
+  assert memoized.cache_info().hits == 2
+  assert memoized.cache_info().maxsize == 2
+
+def test_memoize_unhashable_arguments():
+  calls = []
+
+  @pure_filter
+  def join(values, delimiter=','):
+    calls.append(values)
+    return delimiter.join(values)
+
+  memoized = memoize_filter(join)
+  assert memoized(['a', 'b']) == 'a,b'
+  assert memoized(['a', 'b']) == 'a,b'
+  assert len(calls) == 2
+  assert memoized.cache_info().currsize == 0
+
+def test_is_pure_filter():
+  @pure_filter
+  def pure(value):
+    return value
+
+  def impure(value):
+    return value
+
+  assert is_pure_filter(pure)
+  assert not is_pure_filter(impure)
+
+def test_discovery_registers_module_filters(monkeypatch):
+  from common import beaker as beaker_module
+
+  import template_filters
+
+  def expensive(value):
+    return value
+  expensive.__module__ = template_filters.__name__
+  monkeypatch.setattr(template_filters, 'expensive', pure_filter(expensive), raising=False)
+  monkeypatch.setattr(beaker_module, '_filter_tracing', True)
+  app = object.__new__(beaker_module.Beaker)
+  app._Beaker__flask = Flask(__name__)
+  app._register_template_filters({'fast_filters': True})
+  filters = app._Beaker__flask.jinja_env.filters
+  # NOTE: template_filtersにインポートした関数はフィルタとして登録しない
+  assert 'convert_money' in filters and 'concat_list' in filters
+  assert not {'logger', 'is_filter_tracing', 'pure_filter'} & set(filters)
+  # NOTE: pure_filterで印をつけたフィルタのみメモ化する
+  assert hasattr(filters['expensive'], 'cache_info')
+  assert not hasattr(filters['convert_money'], 'cache_info')
+  assert not hasattr(filters['concat_list'], 'cache_info')
+  assert filters['convert_money'](10000) == '10,000'
+  assert not beaker_module.is_filter_tracing()
@@ -0,0 +1,68 @@
+import re
+import time
+
+from flask import Flask
+
+from beaker.common import instrumentation as instrumentation_module
+from beaker.common.instrumentation import COMPONENT_DB, COMPONENT_TEMPLATE, Instrumentation, RequestTimer, measure
+
+class FixedTimer():
+  def __init__(self, elapsed, **durations):
+    self._elapsed = elapsed
+    self.durations = durations
+
+  def elapsed(self):
+    return self._elapsed
+
+def test_render_prometheus():
+  instrumentation = Instrumentation(buckets=(1.0, 0.1))
+  instrumentation.record('/clients/<int:id>', FixedTimer(0.05, db=0.02, template=0.0))
+  instrumentation.record('/clients/<int:id>', FixedTimer(0.5, db=0.3), query_count=3)
+  instrumentation.record('/say "hi"', FixedTimer(2.0))
+  instrumentation.add_gauge_source(lambda: {'beaker_db_pool_in_use': 2})
+  lines = instrumentation.render_prometheus().splitlines()
+
+  assert lines[:2] == ['# HELP beaker_request_duration_seconds Request latency by route.', '# TYPE beaker_request_duration_seconds histogram']
+  # NOTE: バケットは昇順に並べ、累積件数で出力する
+  assert lines[2:7] == [
+    'beaker_request_duration_seconds_bucket{route="/clients/<int:id>",le="0.1"} 1',
+    'beaker_request_duration_seconds_bucket{route="/clients/<int:id>",le="1.0"} 2',
+    'beaker_request_duration_seconds_bucket{route="/clients/<int:id>",le="+Inf"} 2',
+    'beaker_request_duration_seconds_sum{route="/clients/<int:id>"} 0.55',
+    'beaker_request_duration_seconds_count{route="/clients/<int:id>"} 2',
+  ]
+  assert 'beaker_request_duration_seconds_bucket{route="/say \\"hi\\"",le="1.0"} 0' in lines
+  assert 'beaker_request_duration_seconds_bucket{route="/say \\"hi\\"",le="+Inf"} 1' in lines
+  assert '# TYPE beaker_component_duration_seconds histogram' in lines
+  assert 'beaker_component_duration_seconds_count{route="/clients/<int:id>",component="db"} 2' in lines
+  # NOTE: 0秒の内訳は記録しない
+  assert not any('component="template"' in line for line in lines)
+  assert '# TYPE beaker_request_queries histogram' in lines
+  assert 'beaker_request_queries_bucket{route="/clients/<int:id>",le="2"} 0' in lines
+  assert 'beaker_request_queries_bucket{route="/clients/<int:id>",le="5"} 1' in lines
+  assert lines[-2:] == ['# TYPE beaker_db_pool_in_use gauge', 'beaker_db_pool_in_use 2']
+
+def test_nested_measure_is_counted_once():
+  timer = RequestTimer()
+  with timer.measure(COMPONENT_DB):
+    with timer.measure(COMPONENT_DB):
+      time.sleep(0.05)
+  # NOTE: 入れ子の場合も外側の計測のみ計上する
+  assert 0.05 <= timer.durations[COMPONENT_DB] < 0.1
+
+def test_server_timing_header(monkeypatch):
+  from beaker.common.beaker import _add_server_timing, _get_request_timer, _start_request_timer
+
+  monkeypatch.setattr(instrumentation_module, '_timer_getter', _get_request_timer)
+  app = Flask(__name__)
+  app.before_request(_start_request_timer)
+  app.after_request(_add_server_timing)
+
+  @app.route('/')
+  def index():
+    with measure(COMPONENT_TEMPLATE):
+      time.sleep(0.002)
+    return 'ok'
+
+  response = app.test_client().get('/')
+  assert re.fullmatch(r'template;dur=\d+\.\d, total;dur=\d+\.\d', response.headers['Server-Timing'])
@@ -0,0 +1,127 @@
+import logging
+import os
+import threading
+import time
+
+import pytest
+
+from beaker.common.jobs import JobManager, JobQueueFullError, EXECUTOR_PROCESS, STATE_DONE, STATE_FAILED
+
+def wait_finished(manager, job_id, timeout=10.0):
+  deadline = time.monotonic() + timeout
+  while time.monotonic() < deadline:
+    status = manager.get_status(job_id)
+    if status['state'] in (STATE_DONE, STATE_FAILED):
+      return status
+    time.sleep(0.02)
+  raise AssertionError(f'job did not finish: {job_id}')
+
+def export_csv(job, count):
+  job.write_csv({'id': 'ID', 'name': '名前'}, ({'id': i, 'name': f'name{i}'} for i in range(count)), chara_set='utf_8', total=count)
+
+def create_report(job):
+  return 'report'
+
+def test_write_csv_job(tmp_path):
+  manager = JobManager(str(tmp_path), logging.getLogger('test'))
+  job_id = manager.submit(export_csv, 3, file_name='clients.csv', mimetype='text/csv')
+  status = wait_finished(manager, job_id)
+  assert status['state'] == STATE_DONE
+  assert status['progress'] == status['total'] == 3
+  with open(manager.get_result_path(job_id), encoding='utf-8') as file:
+    assert file.read().splitlines() == ['"ID","名前"', '"0","name0"', '"1","name1"', '"2","name2"']
+  manager.shutdown()
+
+def test_failed_job(tmp_path):
+  def fail(job):
+    job.open().write(b'partial')
+    raise ValueError('boom')
+  manager = JobManager(str(tmp_path), logging.getLogger('test'))
+  job_id = manager.submit(fail)
+  status = wait_finished(manager, job_id)
+  assert status['error'] == 'ValueError: boom'
+  assert manager.get_result_path(job_id) is None
+  assert sorted(os.listdir(tmp_path)) == [f'{job_id}.json']
+  manager.shutdown()
+
+def test_max_queued(tmp_path):
+  release = threading.Event()
+  manager = JobManager(str(tmp_path), logging.getLogger('test'), max_workers=1, max_queued=2)
+  manager.submit(lambda job: release.wait())
+  manager.submit(lambda job: release.wait())
+  with pytest.raises(JobQueueFullError):
+    manager.submit(lambda job: release.wait())
+  release.set()
+  manager.shutdown()
+  assert manager.get_stats()['active'] == 0
+
+def test_cleanup(tmp_path):
+  manager = JobManager(str(tmp_path), logging.getLogger('test'), retention_seconds=0)
+  job_id = manager.submit(create_report)
+  wait_finished(manager, job_id)
+  time.sleep(0.01)
+  assert manager.cleanup() == 1
+  assert os.listdir(tmp_path) == []
+  assert manager.get_status(job_id) is None
+  manager.shutdown()
+
+def test_invalid_job_id(tmp_path):
+  manager = JobManager(str(tmp_path), logging.getLogger('test'))
+  assert manager.get_status('../config') is None
+  assert manager.get_result_path('../config') is None
+
+def test_process_executor(tmp_path):
+  manager = JobManager(str(tmp_path), logging.getLogger('test'), executor=EXECUTOR_PROCESS, max_workers=1)
+  job_id = manager.submit(create_report, file_name='report.txt')
+  status = wait_finished(manager, job_id)
+  assert status['state'] == STATE_DONE
+  with open(manager.get_result_path(job_id), encoding='utf-8') as file:
+    assert file.read() == 'report'
+  manager.shutdown()
+
+def test_open_result_after_cleanup(tmp_path):
+  manager = JobManager(str(tmp_path), logging.getLogger('test'), retention_seconds=0)
+  job_id = manager.submit(create_report)
+  wait_finished(manager, job_id)
+  status, file = manager.open_result(job_id)
+  with file:
+    assert status['state'] == STATE_DONE
+    assert file.read() == b'report'
+  time.sleep(0.01)
+  manager.cleanup()
+  assert manager.open_result(job_id) is None
+  manager.shutdown()
+
+def test_job_routes_require_owner(tmp_path):
+  from flask import Flask
+  from beaker.common import beaker as beaker_module
+
+  manager = JobManager(str(tmp_path), logging.getLogger('test'))
+  beaker_module._job_manager = manager
+  try:
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.add_url_rule('/export', 'export', lambda: beaker_module.submit_job(create_report, file_name='report.txt', mimetype='text/plain'))
+    router = beaker_module.BeakerRouter()
+    beaker_module._register_job_routes(router, '/_beaker/jobs')
+    router.regist_flask(app)
+
+    client = app.test_client()
+    job_id = client.get('/export').get_data(as_text=True)
+    wait_finished(manager, job_id)
+    status = client.get(f'/_beaker/jobs/{job_id}').get_json()
+    assert status['state'] == STATE_DONE
+    assert 'owner' not in status
+    assert client.get(status['download_url']).get_data() == b'report'
+
+    # NOTE: 他のセッションや登録者のないジョブは存在しない場合と同じく404とする
+    other = app.test_client()
+    assert other.get(f'/_beaker/jobs/{job_id}').status_code == 404
+    assert other.get(f'/_beaker/jobs/{job_id}/download').status_code == 404
+    anonymous_id = manager.submit(create_report)
+    wait_finished(manager, anonymous_id)
+    assert client.get(f'/_beaker/jobs/{anonymous_id}').status_code == 404
+    assert client.get(f'/_beaker/jobs/{anonymous_id}/download').status_code == 404
+  finally:
+    beaker_module._job_manager = None
+    manager.shutdown()
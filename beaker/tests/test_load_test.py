@@ -0,0 +1,94 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+
+from beaker.common.load_test import HttpSender, compare_with_baseline, create_requests, measure_allocations, percentile, run_load_test
+
+def test_create_requests():
+  routes = [
+    {'path': '/', 'methods': ['GET']},
+    {'path': '/clients/<int:id>', 'methods': ['GET']},
+    {'path': '/welcome_post', 'methods': ['POST']},
+    {'path': '/search', 'methods': ['GET']},
+  ]
+  payloads = {
+    '/welcome_post': {'data': {'welcome-text': 'test'}},
+    '/search': {'query': {'q': 'a b'}},
+  }
+  requests = create_requests(routes, payloads)
+  assert [request['name'] for request in requests] == ['GET /', 'POST /welcome_post', 'GET /search']
+  assert requests[1]['data'] == {'welcome-text': 'test'}
+  assert requests[2]['path'] == '/search?q=a+b'
+
+def test_percentile():
+  values = list(range(1, 101))
+  assert percentile(values, 0.50) == 50
+  assert percentile(values, 0.95) == 95
+  assert percentile(values, 0.99) == 99
+  assert percentile([], 0.5) == 0.0
+
+def test_run_load_test():
+  sent = []
+  lock = threading.Lock()
+  def send(request):
+    with lock:
+      sent.append(request['path'])
+    if len(sent) % 10 == 0:
+      raise Exception('error')
+    return 200
+
+  result = run_load_test(send, {'path': '/'}, count=50, concurrency=4, warmup=5)
+  assert len(sent) == 55
+  assert result['count'] == 50
+  assert result['errors'] == 5
+  assert result['rps'] > 0
+  assert result['p50_ms'] <= result['p95_ms'] <= result['p99_ms'] <= result['max_ms']
+
+def test_measure_allocations():
+  def send(request):
+    return len(bytearray(100 * 1024)) and 200
+  result = measure_allocations(send, {'path': '/'}, count=5)
+  assert result['alloc_peak_kb'] >= 100
+
+def test_compare_with_baseline():
+  baseline = {'GET /': {'p50_ms': 10.0, 'p95_ms': 20.0, 'rps': 100.0, 'errors': 0, 'alloc_peak_kb': 100.0}}
+  assert compare_with_baseline({'GET /': {'p50_ms': 11.0, 'p95_ms': 23.0, 'rps': 90.0, 'errors': 0, 'alloc_peak_kb': 110.0}}, baseline) == []
+  regressions = compare_with_baseline({'GET /': {'p50_ms': 10.0, 'p95_ms': 30.0, 'rps': 70.0, 'errors': 1}}, baseline)
+  assert regressions == ['GET /: p95_ms 20.00 -> 30.00', 'GET /: rps 100.0 -> 70.0', 'GET /: errors 0 -> 1']
+  # NOTE: ベースラインにないリクエストは比較しない
+  assert compare_with_baseline({'GET /new': {'p50_ms': 100.0, 'rps': 1.0, 'errors': 0}}, baseline) == []
+
+def test_http_sender():
+  class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+      body = self.rfile.read(int(self.headers['Content-Length']))
+      status = 200 if body == b'welcome-text=test' else 400
+      self.send_response(status)
+      self.send_header('Content-Length', '2')
+      self.end_headers()
+      self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+      pass
+
+  server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+  try:
+    send = HttpSender(f'http://127.0.0.1:{server.server_address[1]}')
+    request = create_requests([{'path': '/welcome_post', 'methods': ['POST']}], {'/welcome_post': {'data': {'welcome-text': 'test'}}})[0]
+    result = run_load_test(send, request, count=20, concurrency=2, warmup=1)
+    assert result['errors'] == 0
+  finally:
+    server.shutdown()
+    server.server_close()
+
+def test_stub_connection():
+  from benchmarks.stub_db import StubConnection
+
+  cursor = StubConnection(rows=[(1,), (2,), (3,)]).cursor()
+  cursor.execute('SELECT id FROM clients')
+  assert cursor.fetchone() == (1,)
+  assert cursor.fetchmany(5) == [(2,), (3,)]
+  assert cursor.fetchall() == []
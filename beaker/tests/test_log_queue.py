@@ -0,0 +1,74 @@
+import logging
+import time
+
+from beaker.common.log_queue import BeakerLogQueue
+
+class CollectHandler(logging.Handler):
+  def __init__(self, delay=0.0):
+    super().__init__()
+    self.delay = delay
+    self.messages = []
+
+  def emit(self, record):
+    time.sleep(self.delay)
+    self.messages.append(record.getMessage())
+
+def create_record(message):
+  return logging.LogRecord('test', logging.INFO, __file__, 1, message, None, None)
+
+def test_drop_when_full():
+  handler = CollectHandler()
+  log_queue = BeakerLogQueue([handler], queue_size=1, policy='drop')
+  for i in range(3):
+    log_queue.handler.handle(create_record(f'message{i}'))
+  assert log_queue.get_stats() == {'queued': 1, 'dropped': 2, 'flushed': 0, 'pending': 1}
+  log_queue.start()
+  log_queue.stop()
+  assert handler.messages == ['message0']
+
+def test_block_when_full():
+  handler = CollectHandler(delay=0.01)
+  log_queue = BeakerLogQueue([handler], queue_size=1, policy='block')
+  log_queue.start()
+  for i in range(5):
+    log_queue.handler.handle(create_record(f'message{i}'))
+  log_queue.stop()
+  assert handler.messages == [f'message{i}' for i in range(5)]
+  assert log_queue.get_stats()['dropped'] == 0
+
+def test_flush_on_stop():
+  handler = CollectHandler()
+  log_queue = BeakerLogQueue([handler])
+  log_queue.start()
+  for i in range(100):
+    log_queue.handler.handle(create_record(f'message{i}'))
+  log_queue.stop()
+  assert len(handler.messages) == 100
+  assert log_queue.get_stats() == {'queued': 100, 'dropped': 0, 'flushed': 100, 'pending': 0}
+
+def test_reset_after_fork():
+  handler = CollectHandler()
+  log_queue = BeakerLogQueue([handler], queue_size=1)
+  log_queue.handler.handle(create_record('parent'))
+  log_queue.handler.handle(create_record('dropped'))
+  log_queue.reset_after_fork()
+  assert log_queue.get_stats() == {'queued': 0, 'dropped': 0, 'flushed': 0, 'pending': 0}
+  log_queue.handler.handle(create_record('child'))
+  log_queue.stop()
+  assert handler.messages == ['child']
+
+def test_logger_reset_after_fork(tmp_path):
+  from beaker.common.beaker import BeakerLogger
+
+  config = {'log': {'level': 'INFO', 'file_name': str(tmp_path / 'app.log'), 'async': True}}
+  logger = BeakerLogger(config, logger_name='test_async_logger')
+  gunicorn_logger = logging.getLogger('gunicorn.error')
+  file_handler = logger._log_queue._listener.handlers[0]
+  logger.reset_after_fork()
+  logger.info('after fork')
+  logger.shutdown()
+  # NOTE: 設定をやり直さないため他のloggerは無効にならず、ファイルのハンドラもそのまま使用する
+  assert not gunicorn_logger.disabled
+  assert logger._log_queue._listener.handlers[0] is file_handler
+  assert 'test_log_queue.py#test_logger_reset_after_fork: after fork' in (tmp_path / 'app.log').read_text(encoding='utf8')
+  file_handler.close()
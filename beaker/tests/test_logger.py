@@ -0,0 +1,55 @@
+import pytest
+
+from beaker.common.beaker import BeakerLogger, BeakerLogLevel
+
+class CountedValue():
+  def __init__(self):
+    self.count = 0
+
+  def __str__(self):
+    self.count += 1
+    return 'value'
+
+def create_logger(tmp_path, name, level='INFO'):
+  config = {'log': {'level': level, 'file_name': str(tmp_path / 'app.log')}}
+  return BeakerLogger(config, logger_name=name)
+
+def read_log(tmp_path):
+  return (tmp_path / 'app.log').read_text(encoding='utf8')
+
+def close_logger(logger):
+  for handler in logger._logger.handlers:
+    handler.close()
+
+def test_caller_in_message(tmp_path):
+  logger = create_logger(tmp_path, 'test_caller_logger')
+  logger.info('件数: %s', 3)
+  logger.log('warning %s', BeakerLogLevel.WARNING, 'message')
+  close_logger(logger)
+  lines = read_log(tmp_path).splitlines()
+  assert lines[0].endswith('INFO - ' + __file__ + '#test_caller_in_message: 件数: 3')
+  assert lines[1].endswith('WARNING - ' + __file__ + '#test_caller_in_message: warning message')
+
+def test_arguments_are_formatted_only_when_enabled(tmp_path):
+  logger = create_logger(tmp_path, 'test_lazy_logger')
+  value = CountedValue()
+  logger.debug('値: %s', value)
+  assert value.count == 0
+  assert not logger.is_enabled_for(BeakerLogLevel.DEBUG)
+  logger.error('値: %s', value)
+  assert value.count == 1
+  close_logger(logger)
+  assert read_log(tmp_path).endswith('#test_arguments_are_formatted_only_when_enabled: 値: value\n')
+
+def test_message_without_arguments(tmp_path):
+  logger = create_logger(tmp_path, 'test_plain_logger')
+  # NOTE: 引数がない場合はメッセージ内の%をフォーマットしない
+  logger.info('100%')
+  close_logger(logger)
+  assert read_log(tmp_path).endswith(': 100%\n')
+
+def test_unknown_log_level(tmp_path):
+  logger = create_logger(tmp_path, 'test_level_logger')
+  with pytest.raises(Exception):
+    logger.log('message', 15)
+  close_logger(logger)
@@ -0,0 +1,79 @@
+import os
+import time
+
+import pytest
+
+from beaker.common.profiling import RequestProfiler, MODE_CPROFILE, MODE_SAMPLING
+
+HEADERS = {'X-Beaker-Profile': 'secret'}
+
+def busy(seconds):
+  deadline = time.perf_counter() + seconds
+  total = 0
+  while time.perf_counter() < deadline:
+    total += 1
+  return total
+
+def test_not_profiled_without_header(tmp_path):
+  profiler = RequestProfiler(str(tmp_path), mode=MODE_CPROFILE, token='secret')
+  assert profiler.start({}) is None
+  assert profiler.start({'X-Beaker-Profile': 'wrong'}) is None
+  assert RequestProfiler(str(tmp_path), mode=MODE_CPROFILE).start(HEADERS) is None
+
+def test_cprofile(tmp_path):
+  profiler = RequestProfiler(str(tmp_path), mode=MODE_CPROFILE, token='secret')
+  session = profiler.start(HEADERS)
+  busy(0.02)
+  path = profiler.finish(session, '/clients/<int:id>')
+  assert os.path.basename(path).endswith('.prof')
+  assert '_clients_int_id_' in os.path.basename(path)
+  hot = profiler.get_hot_functions()
+  assert hot['unit'] == 'seconds'
+  route = hot['routes']['/clients/<int:id>']
+  assert route['profiles'] == 1
+  assert any(function['function'].startswith('busy ') for function in route['functions'])
+
+def test_sampling(tmp_path):
+  profiler = RequestProfiler(str(tmp_path), mode=MODE_SAMPLING, sample_rate=1.0, interval=0.001)
+  session = profiler.start({})
+  busy(0.1)
+  path = profiler.finish(session, '/')
+  assert os.path.basename(path).endswith('.collapsed')
+  with open(path, encoding='utf-8') as file:
+    lines = file.read().splitlines()
+  assert any(';busy (test_profiling.py:' in line for line in lines)
+  functions = profiler.get_hot_functions(limit=1)['routes']['/']['functions']
+  assert functions[0]['function'].startswith('busy ')
+
+def test_max_files(tmp_path):
+  profiler = RequestProfiler(str(tmp_path), mode=MODE_CPROFILE, token='secret', max_files=2)
+  for _ in range(4):
+    profiler.finish(profiler.start(HEADERS), '/')
+  assert len(os.listdir(tmp_path)) == 2
+
+def test_invalid_config(tmp_path):
+  with pytest.raises(ValueError):
+    RequestProfiler(str(tmp_path), mode='unknown')
+  with pytest.raises(ValueError):
+    RequestProfiler(str(tmp_path), sample_rate=2)
+
+def create_app(tmp_path, token):
+  from flask import Flask
+  from beaker.common import beaker as beaker_module
+
+  app = object.__new__(beaker_module.Beaker)
+  app._Beaker__flask = Flask(__name__)
+  app._register_profiling({'mode': MODE_CPROFILE, 'token': token, 'output_dir': str(tmp_path)})
+  return app._Beaker__flask
+
+def test_profiles_route_requires_token(tmp_path):
+  # NOTE: トークンを設定しない場合は一覧のルートを登録しない
+  app = create_app(tmp_path, '')
+  assert 'beaker_profiles' not in app.view_functions
+
+  client = create_app(tmp_path, 'secret').test_client()
+  assert client.get('/_beaker/profiles').status_code == 403
+  assert client.get('/_beaker/profiles', headers={'X-Beaker-Profile': 'wrong'}).status_code == 403
+  response = client.get('/_beaker/profiles', headers=HEADERS)
+  assert response.status_code == 200
+  assert response.get_json()['unit'] == 'seconds'
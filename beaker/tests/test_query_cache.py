@@ -0,0 +1,187 @@
+import logging
+import time
+
+import pytest
+
+from beaker.common.db_pool import ConnectionPool, PooledConnecter
+from beaker.common.query_builder import BeakerQueryBuilder
+from beaker.common.query_cache import QueryCache
+
+def test_hit_and_miss():
+  cache = QueryCache()
+  assert cache.get(('clients',)) == (False, None)
+  cache.set(('clients',), 'clients', [1, 2], 60)
+  assert cache.get(('clients',)) == (True, [1, 2])
+  stats = cache.get_stats()
+  assert stats['hits'] == 1
+  assert stats['misses'] == 1
+
+def test_ttl():
+  cache = QueryCache()
+  cache.set(('clients',), 'clients', [1], 0.01)
+  time.sleep(0.02)
+  assert cache.get(('clients',)) == (False, None)
+  assert cache.get_stats()['entries'] == 0
+
+def test_lru_eviction():
+  cache = QueryCache(max_entries=2)
+  cache.set(('a',), 'a', [1], 60)
+  cache.set(('b',), 'b', [2], 60)
+  cache.get(('a',))
+  cache.set(('c',), 'c', [3], 60)
+  assert cache.get(('b',)) == (False, None)
+  assert cache.get(('a',)) == (True, [1])
+  assert cache.get_stats()['evictions'] == 1
+
+def test_size_eviction():
+  cache = QueryCache(max_bytes=2000)
+  cache.set(('a',), 'a', ['x' * 1000], 60)
+  cache.set(('b',), 'b', ['y' * 1000], 60)
+  assert cache.get(('a',)) == (False, None)
+  assert cache.get_stats()['bytes'] <= 2000
+
+def test_invalidate_table():
+  cache = QueryCache()
+  cache.set(('clients', 1), 'clients', [1], 60)
+  cache.set(('clients', 2), 'clients', [2], 60)
+  cache.set(('users', 1), 'users', [3], 60)
+  cache.invalidate_table('clients')
+  assert cache.get(('clients', 1)) == (False, None)
+  assert cache.get(('users', 1)) == (True, [3])
+  assert cache.get_stats()['invalidations'] == 2
+
+def test_set_skipped_after_invalidation():
+  cache = QueryCache()
+  generation = cache.get_generation('clients')
+  # NOTE: DBからの取得中に他の処理で書き込みが行われた場合
+  cache.invalidate_table('clients')
+  cache.set(('clients',), 'clients', [1], 60, generation)
+  assert cache.get(('clients',)) == (False, None)
+  cache.set(('clients',), 'clients', [2], 60, cache.get_generation('clients'))
+  assert cache.get(('clients',)) == (True, [2])
+
+def test_set_skipped_after_clear():
+  cache = QueryCache()
+  generation = cache.get_generation('clients')
+  cache.clear()
+  cache.set(('clients',), 'clients', [1], 60, generation)
+  assert cache.get(('clients',)) == (False, None)
+
+class FakeCursor():
+  def __init__(self, connection):
+    self._connection = connection
+
+  def execute(self, sql, params=None):
+    self._connection.executed.append(sql)
+    if self._connection.on_execute is not None:
+      self._connection.on_execute(sql)
+
+  def fetchall(self):
+    return [dict(row) for row in self._connection.rows]
+
+  def fetchone(self):
+    return dict(self._connection.rows[0])
+
+  def close(self):
+    pass
+
+class FakeConnection():
+  def __init__(self, rows):
+    self.rows = rows
+    self.executed = []
+    self.on_execute = None
+
+  def cursor(self, *args, **kwargs):
+    return FakeCursor(self)
+
+  def commit(self):
+    pass
+
+  def rollback(self):
+    pass
+
+  def close(self):
+    pass
+
+def create_builder(connection, cache):
+  pool = ConnectionPool(lambda: connection, logging.getLogger('test'), health_check=False)
+  return BeakerQueryBuilder(db_conecter=PooledConnecter(pool), query_cache=cache)
+
+def count_selects(connection):
+  return sum(1 for sql in connection.executed if sql.startswith('SELECT'))
+
+def test_cached_rows_are_copied():
+  connection = FakeConnection([{'id': 1, 'name': 'a'}])
+  cache = QueryCache()
+  rows = create_builder(connection, cache).table('clients').select(cache_ttl=60)
+  rows[0]['name'] = 'changed'
+  rows.append({'id': 2})
+  cached = create_builder(connection, cache).table('clients').select(cache_ttl=60)
+  assert cached == [{'id': 1, 'name': 'a'}]
+  cached[0]['name'] = 'changed'
+  assert create_builder(connection, cache).table('clients').select(cache_ttl=60) == [{'id': 1, 'name': 'a'}]
+  assert count_selects(connection) == 1
+
+def test_select_not_cached_when_invalidated_during_query():
+  connection = FakeConnection([{'id': 1, 'name': 'old'}])
+  cache = QueryCache()
+  # NOTE: 取得(キャッシュのミス)から保存までの間に他の処理で書き込みが行われた場合
+  connection.on_execute = lambda sql: cache.invalidate_table('clients')
+  assert create_builder(connection, cache).table('clients').select(cache_ttl=60) == [{'id': 1, 'name': 'old'}]
+  connection.on_execute = None
+  connection.rows = [{'id': 1, 'name': 'new'}]
+  assert create_builder(connection, cache).table('clients').select(cache_ttl=60) == [{'id': 1, 'name': 'new'}]
+  assert count_selects(connection) == 2
+
+def create_db(connection):
+  from beaker.common.beaker import BeakerDB
+
+  config = {'database': {
+    'dbname': 'test', 'host': 'localhost', 'user': 'test', 'password': '',
+    'pool': {'health_check': False},
+    'query_cache': {'enabled': True}}}
+  return BeakerDB(config, logging.getLogger('test'), connect=lambda db_info: connection)
+
+def select_clients(db):
+  return db.create_query_builder().table('clients').select(cache_ttl=60)
+
+def test_commit_invalidates_cached_select():
+  connection = FakeConnection([{'id': 1, 'name': 'a'}])
+  db = create_db(connection)
+  select_clients(db)
+  with db.start_transaction(False) as tx:
+    db.create_query_builder(tx).table('clients').where('id', '=', 1).update({'name': 'b'})
+    # NOTE: コミット前は他の処理から変更前の内容が見えるためキャッシュを破棄しない
+    select_clients(db)
+    assert count_selects(connection) == 1
+  select_clients(db)
+  assert count_selects(connection) == 2
+
+def test_rollback_keeps_cached_select():
+  connection = FakeConnection([{'id': 1, 'name': 'a'}])
+  db = create_db(connection)
+  select_clients(db)
+  with pytest.raises(ValueError):
+    with db.start_transaction(False) as tx:
+      db.create_query_builder(tx).table('clients').insert({'id': 2, 'name': 'b'})
+      raise ValueError('rollback')
+  select_clients(db)
+  assert count_selects(connection) == 1
+
+def test_write_without_transaction_invalidates_cached_select():
+  connection = FakeConnection([{'id': 1, 'name': 'a'}])
+  db = create_db(connection)
+  select_clients(db)
+  writes = [
+    lambda builder: builder.insert({'id': 2, 'name': 'b'}),
+    lambda builder: builder.where('id', '=', 2).update({'name': 'c'}),
+    lambda builder: builder.where('id', '=', 2).delete(),
+  ]
+  for index, write in enumerate(writes):
+    write(db.create_query_builder().table('clients'))
+    select_clients(db)
+    assert count_selects(connection) == index + 2
+  # NOTE: 他のテーブルへの書き込みでは破棄しない
+  db.create_query_builder().table('users').insert({'id': 1})
+  select_clients(db)
+  assert count_selects(connection) == 4
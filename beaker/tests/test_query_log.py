@@ -0,0 +1,99 @@
+import logging
+
+from beaker.common.db_pool import ConnectionPool, PooledConnecter
+from beaker.common.instrumentation import Instrumentation, RequestTimer
+from beaker.common.query_builder import BeakerQueryBuilder
+from beaker.common.query_log import QueryTracer, RequestQueryStats, normalize_sql
+from beaker.common.transaction import BeakerTransaction
+
+class StubCursor():
+  def __init__(self, connection):
+    self._connection = connection
+
+  def execute(self, sql, params=None):
+    self._connection.executed.append(sql)
+
+  def fetchall(self):
+    return []
+
+  def close(self):
+    pass
+
+class StubConnection():
+  def __init__(self):
+    self.closed = 0
+    self.executed = []
+
+  def cursor(self, *args, **kwargs):
+    return StubCursor(self)
+
+  def commit(self):
+    pass
+
+  def rollback(self):
+    pass
+
+  def close(self):
+    self.closed = 1
+
+class RecordingLogger():
+  def __init__(self):
+    self.warnings = []
+
+  def warning(self, message, *args):
+    self.warnings.append(message % args)
+
+  def debug(self, message, *args):
+    pass
+
+def create_pool(tracer):
+  connection = StubConnection()
+  return ConnectionPool(lambda: connection, logging.getLogger('test'), health_check=False, query_tracer=tracer)
+
+def test_normalize_sql():
+  assert normalize_sql("SELECT *\n  FROM clients WHERE id = 12 AND name = 'a''b'") == 'SELECT * FROM clients WHERE id = ? AND name = ?'
+  assert normalize_sql('SELECT * FROM clients WHERE id IN (%s, %s, %s)') == 'SELECT * FROM clients WHERE id IN (?)'
+  assert normalize_sql('INSERT INTO clients (id, name) VALUES (%s, %s), (%s, %s)') == 'INSERT INTO clients (id, name) VALUES (?, ?), ...'
+  assert normalize_sql(b'SELECT 1') == 'SELECT ?'
+
+def test_n_plus_one_is_warned_once_per_statement():
+  logger = RecordingLogger()
+  stats = RequestQueryStats()
+  pool = create_pool(QueryTracer(logger, slow_threshold=None, n_plus_one_threshold=2, stats_getter=lambda: stats))
+  with BeakerTransaction(PooledConnecter(pool)) as tx:
+    tx.find_all('SELECT * FROM clients;')
+    for client_id in range(5):
+      BeakerQueryBuilder(tx=tx).table('orders').where('client_id', '=', client_id).select()
+
+  assert stats.count == 6
+  assert stats.statements['SELECT * FROM orders WHERE client_id = ?;'] == 5
+  assert len(logger.warnings) == 1
+  assert 'N+1' in logger.warnings[0]
+  assert 'test_query_log.py#test_n_plus_one_is_warned_once_per_statement' in logger.warnings[0]
+  summary = stats.summary()
+  assert summary['top_count'] == 5
+  assert summary['slow_count'] == 0
+
+def test_slow_query_is_logged_outside_request():
+  logger = RecordingLogger()
+  pool = create_pool(QueryTracer(logger, slow_threshold=0, stats_getter=lambda: None))
+  with BeakerTransaction(PooledConnecter(pool)) as tx:
+    tx.find_all('SELECT *\n  FROM clients;')
+  assert len(logger.warnings) == 1
+  assert 'SQL: SELECT * FROM clients;' in logger.warnings[0]
+  assert 'test_query_log.py#test_slow_query_is_logged_outside_request' in logger.warnings[0]
+
+def test_pool_without_tracer_returns_raw_cursor():
+  pool = create_pool(None)
+  connection = pool.checkout()
+  assert isinstance(connection.cursor(), StubCursor)
+  connection.close()
+
+def test_query_count_metrics():
+  instrumentation = Instrumentation()
+  instrumentation.record('/clients', RequestTimer(), query_count=12)
+  instrumentation.record('/clients', RequestTimer())
+  output = instrumentation.render_prometheus()
+  assert 'beaker_request_queries_bucket{route="/clients",le="10"} 0' in output
+  assert 'beaker_request_queries_bucket{route="/clients",le="20"} 1' in output
+  assert 'beaker_request_queries_count{route="/clients"} 1' in output
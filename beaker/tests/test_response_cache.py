@@ -0,0 +1,122 @@
+import threading
+import time
+
+from flask import Flask, session
+from jinja2 import Environment
+
+from beaker.common.response_cache import FragmentCacheExtension, ResponseCache
+
+def test_single_flight():
+  cache = ResponseCache()
+  calls = []
+
+  def create():
+    calls.append(1)
+    time.sleep(0.1)
+    return 'page'
+
+  results = []
+  threads = [threading.Thread(target=lambda: results.append(cache.get_or_create(('page',), '/', 60, create))) for _ in range(5)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert results == ['page'] * 5
+  assert len(calls) == 1
+
+def test_failed_creation_is_not_cached():
+  cache = ResponseCache()
+  assert cache.get_or_create(('page',), '/', 60, lambda: None) is None
+  assert cache.get_or_create(('page',), '/', 60, lambda: 'page') == 'page'
+
+def test_invalidate():
+  cache = ResponseCache()
+  cache.get_or_create(('a',), '/clients', 60, lambda: 'a')
+  cache.get_or_create(('b',), '/users', 60, lambda: 'b')
+  cache.invalidate('/clients')
+  assert cache.get_or_create(('a',), '/clients', 60, lambda: 'new') == 'new'
+  assert cache.get_or_create(('b',), '/users', 60, lambda: 'new') == 'b'
+  cache.clear()
+  assert cache.get_stats()['entries'] == 0
+
+def test_fragment_cache():
+  cache = ResponseCache()
+  environment = Environment(extensions=[FragmentCacheExtension])
+  environment.fragment_cache_getter = lambda: cache
+  template = environment.from_string("{% cache 'clients', 60 %}{{ value }}{% endcache %}/{{ value }}")
+  assert template.render(value=1) == '1/1'
+  assert template.render(value=2) == '1/2'
+  cache.invalidate('fragment')
+  assert template.render(value=3) == '3/3'
+
+def test_cache_page():
+  from beaker.common.beaker import cache_page, clear_cache
+
+  app = Flask(__name__)
+  app.secret_key = 'test'
+  calls = []
+
+  @app.route('/clients')
+  @cache_page(ttl=60, session_keys=('user_id',))
+  def clients():
+    calls.append(1)
+    return f"clients {session.get('user_id')}"
+
+  @app.route('/login/<user_id>')
+  def login(user_id):
+    session['user_id'] = user_id
+    return 'ok'
+
+  clear_cache()
+  client = app.test_client()
+  assert client.get('/clients').data == b'clients None'
+  assert client.get('/clients').data == b'clients None'
+  assert client.get('/clients?page=2').data == b'clients None'
+  assert len(calls) == 2
+  client.get('/login/1')
+  assert client.get('/clients').data == b'clients 1'
+  assert len(calls) == 3
+  clear_cache()
+
+def test_cache_page_skips_session_dependent_pages():
+  from flask import render_template_string
+  from flask_wtf.csrf import CSRFProtect
+  from beaker.common.beaker import cache_page, clear_cache
+
+  app = Flask(__name__)
+  app.secret_key = 'test'
+  CSRFProtect(app)
+  calls = []
+
+  @app.route('/form')
+  @cache_page(ttl=60)
+  def form():
+    calls.append(1)
+    return render_template_string('{{ csrf_token() }}')
+
+  @app.route('/greeting')
+  @cache_page(ttl=60)
+  def greeting():
+    calls.append(1)
+    return f"hello {session.get('name')}"
+
+  clear_cache()
+  tokens = []
+  for _ in range(2):
+    client = app.test_client()
+    # NOTE: 2回目はセッションにトークンがあるためCookieを設定しない
+    client.get('/form')
+    tokens.append(client.get('/form').data)
+  assert tokens[0] != tokens[1]
+  assert len(calls) == 4
+
+  client = app.test_client()
+  client.get('/greeting')
+  client.get('/greeting')
+  assert len(calls) == 6
+  assert get_cache_entries() == 0
+  clear_cache()
+
+def get_cache_entries():
+  from beaker.common.beaker import get_cache_stats
+  return get_cache_stats()['entries']
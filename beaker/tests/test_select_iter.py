@@ -0,0 +1,109 @@
+import logging
+
+import pytest
+from flask import Flask
+from jinja2 import DictLoader
+
+from beaker.common.db_pool import ConnectionPool, PooledConnecter
+from beaker.common.query_builder import BeakerQueryBuilder
+from beaker.common.transaction import BeakerTransaction
+
+class NamedCursor():
+  def __init__(self, connection, name, rows):
+    self._connection = connection
+    self.name = name
+    self._rows = rows
+    self.fetch_sizes = []
+    self.closed = False
+
+  def execute(self, sql, params=None):
+    self._connection.executed.append((self.name, sql, params))
+
+  def fetchmany(self, size):
+    self.fetch_sizes.append(size)
+    rows, self._rows = self._rows[:size], self._rows[size:]
+    return rows
+
+  def close(self):
+    self.closed = True
+
+class StreamingConnection():
+  def __init__(self, rows):
+    self.closed = 0
+    self.rows = rows
+    self.executed = []
+    self.cursors = []
+    self.commit_count = 0
+    self.rollback_count = 0
+
+  def cursor(self, name=None):
+    cursor = NamedCursor(self, name, list(self.rows))
+    self.cursors.append(cursor)
+    return cursor
+
+  def commit(self):
+    self.commit_count += 1
+
+  def rollback(self):
+    self.rollback_count += 1
+
+  def close(self):
+    self.closed = 1
+
+def create_pool(connection):
+  return ConnectionPool(lambda: connection, logging.getLogger('test'), health_check=False)
+
+def test_select_iter_in_transaction():
+  connection = StreamingConnection([(i, f'name{i}') for i in range(5)])
+  with BeakerTransaction(PooledConnecter(create_pool(connection))) as tx:
+    rows = BeakerQueryBuilder(tx=tx).table('clients').where('id', '>', 0).or_where('name', 'like', 'a%').select_iter('id', 'name', chunk_size=2, order_by='id DESC')
+    assert connection.executed == []
+    assert list(rows) == [(i, f'name{i}') for i in range(5)]
+  name, sql, params = connection.executed[-1]
+  assert name.startswith('beaker_cursor_')
+  assert sql == 'SELECT id, name FROM clients WHERE id > %s OR name LIKE %s ORDER BY id DESC;'
+  assert params == [0, 'a%']
+  cursor = connection.cursors[-1]
+  assert cursor.fetch_sizes == [2, 2, 2, 2]
+  assert cursor.closed
+
+def test_select_iter_without_transaction():
+  connection = StreamingConnection([(1,), (2,), (3,)])
+  pool = create_pool(connection)
+  rows = BeakerQueryBuilder(db_conecter=PooledConnecter(pool)).table('clients').select_iter(chunk_size=2)
+  assert pool.get_stats()['in_use'] == 0
+  assert next(rows) == (1,)
+  assert pool.get_stats()['in_use'] == 1
+  # NOTE: 途中で中断した場合もトランザクションを終了して接続を返却する
+  rows.close()
+  assert pool.get_stats()['in_use'] == 0
+  assert connection.cursors[-1].closed
+
+def test_select_iter_rejects_invalid_condition():
+  builder = BeakerQueryBuilder(tx=BeakerTransaction(PooledConnecter(create_pool(StreamingConnection([])))))
+  with pytest.raises(ValueError):
+    builder.table('clients').where('id', '; DROP TABLE clients; --', 1).select_iter()
+  with pytest.raises(ValueError):
+    builder.table('clients').select_iter(order_by='id; DROP TABLE clients')
+
+def test_stream_template():
+  from beaker.common.beaker import stream_template
+
+  app = Flask(__name__)
+  app.jinja_env.loader = DictLoader({'rows.html': '{% for row in rows %}{{ row }},{% endfor %}'})
+  consumed = []
+  def generate():
+    for i in range(3):
+      consumed.append(i)
+      yield i
+
+  @app.route('/rows')
+  def rows():
+    return stream_template('rows.html', buffer_size=1, rows=generate())
+
+  with app.test_client() as client:
+    response = client.get('/rows')
+    assert response.is_streamed
+    # NOTE: stream_with_contextはコンテキストを保持するため最初の描画結果まで先に実行する
+    assert consumed == [0]
+    assert response.get_data() == b'0,1,2,'
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='forkが使用できない環境')
+def test_reset_db_after_fork():
+  from beaker.common import beaker as beaker_module
+
+  inherited = object()
+  beaker_module._beaker_db = inherited
+  try:
+    pid = os.fork()
+    if pid == 0:
+      os._exit(0 if beaker_module._beaker_db is None and inherited in beaker_module._inherited_beaker_dbs else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert beaker_module._beaker_db is inherited
+  finally:
+    beaker_module._beaker_db = None
+
+def test_server_options():
+  pytest.importorskip('gunicorn')
+  from beaker.common.server import create_server_options
+
+  options = create_server_options(5000, {'host': '0.0.0.0', 'workers': 3, 'threads': 1, 'max_requests': 1000})
+  assert options['bind'] == '0.0.0.0:5000'
+  assert options['workers'] == 3
+  assert options['worker_class'] == 'sync'
+  assert options['max_requests'] == 1000
+  assert options['preload_app'] is False
+
+  assert create_server_options(5000, {})['workers'] == (os.cpu_count() or 1)
+
+def test_unknown_server_option():
+  pytest.importorskip('gunicorn')
+  from beaker.common.server import BeakerServer
+
+  # NOTE: gunicornは設定の読み込みで発生したエラーを出力して終了する
+  with pytest.raises(SystemExit):
+    BeakerServer(None, {'unknown_option': 1})
+
+def test_log_rotation_for_production():
+  from beaker.common.beaker import BeakerLogger
+
+  logger = BeakerLogger(lambda: None)
+  config = {'log': {'level': 'INFO', 'file_name': 'app.log'}}
+  assert logger._create_file_handler_config(config)['class'] == 'logging.handlers.TimedRotatingFileHandler'
+  # NOTE: 複数のワーカーで日付の切り替えを行わないように本番環境では外部で切り替える
+  config['server'] = {'type': 'production'}
+  assert logger._create_file_handler_config(config)['class'] == 'logging.handlers.WatchedFileHandler'
+  config['log']['rotation'] = 'daily'
+  assert logger._create_file_handler_config(config)['backupCount'] == 14
+  config['log']['rotation'] = 'hourly'
+  with pytest.raises(ValueError):
+    logger._create_file_handler_config(config)
+
+def test_asgi_app():
+  pytest.importorskip('a2wsgi')
+  import asyncio
+  from flask import Flask
+  from beaker.common import beaker as beaker_module
+
+  app = object.__new__(beaker_module.Beaker)
+  flask = app._Beaker__flask = Flask(__name__)
+  flask.add_url_rule('/', 'index', lambda: 'hello')
+
+  messages = []
+  async def receive():
+    return {'type': 'http.request', 'body': b'', 'more_body': False}
+  async def send(message):
+    messages.append(message)
+  scope = {
+    'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+    'path': '/', 'raw_path': b'/', 'root_path': '', 'query_string': b'', 'headers': [],
+    'server': ('127.0.0.1', 5000), 'client': ('127.0.0.1', 12345)}
+  asyncio.run(app.asgi_app(threads=1)(scope, receive, send))
+  assert messages[0]['status'] == 200
+  assert b''.join(message.get('body', b'') for message in messages[1:]) == b'hello'
@@ -0,0 +1,66 @@
+import os
+import time
+
+import pytest
+
+from beaker.common.session_store import BeakerSession, MemorySessionStore, SQLiteSessionStore
+
+def test_dirty_keys():
+  session = BeakerSession('sid', {'a': 1, 'b': 2})
+  assert not session.modified
+  session['a'] = 10
+  session.pop('b')
+  assert session.modified
+  assert session.dirty_keys == {'a'}
+  assert session.deleted_keys == {'b'}
+
+def test_memory_store_lru():
+  store = MemorySessionStore(max_entries=2)
+  store.save('s1', {'a': 1}, set(), 60)
+  store.save('s2', {'a': 2}, set(), 60)
+  store.load('s1')
+  store.save('s3', {'a': 3}, set(), 60)
+  assert store.load('s2') is None
+  assert store.load('s1') == {'a': 1}
+
+def test_memory_store_expiry():
+  store = MemorySessionStore()
+  store.save('s1', {'a': 1}, set(), 0.01)
+  time.sleep(0.02)
+  assert store.load('s1') is None
+
+def test_sqlite_store_writes_only_changes(tmp_path):
+  store = SQLiteSessionStore(str(tmp_path / 'session.sqlite3'))
+  store.save('s1', {'a': 1, 'b': [1, 2], 'c': 'x'}, set(), 60)
+  store.save('s1', {'a': 2}, {'c'}, 60)
+  assert store.load('s1') == {'a': 2, 'b': [1, 2]}
+  store.delete('s1')
+  assert store.load('s1') is None
+
+def test_sqlite_store_cleanup(tmp_path):
+  store = SQLiteSessionStore(str(tmp_path / 'session.sqlite3'))
+  store.save('s1', {'a': 1}, set(), -1)
+  assert store.load('s1') is None
+  store.cleanup()
+  assert store._connection().execute('SELECT COUNT(*) FROM beaker_session_values').fetchone()[0] == 0
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='forkが使用できない環境')
+def test_sqlite_store_reset_after_fork(tmp_path):
+  from beaker.common import beaker as beaker_module
+
+  store = SQLiteSessionStore(str(tmp_path / 'session.sqlite3'))
+  # NOTE: 初期化で作成した接続はfork前に閉じる
+  assert store._local.connection is None
+  store.save('s1', {'a': 1}, set(), 60)
+  parent_connection = store._local.connection
+  beaker_module._session_store = store
+  try:
+    pid = os.fork()
+    if pid == 0:
+      inherited = getattr(store._local, 'connection', None) is None and store._inherited_locals[-1].connection is parent_connection
+      os._exit(0 if inherited and store.load('s1') == {'a': 1} and store._local.connection is not parent_connection else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert store._local.connection is parent_connection
+  finally:
+    beaker_module._session_store = None
@@ -0,0 +1,49 @@
+import os
+
+from flask import Flask
+from jinja2 import FileSystemBytecodeCache
+
+from beaker.common import beaker as beaker_module
+
+class RecordLogger():
+  def __init__(self):
+    self.errors = []
+
+  def error(self, message, *args):
+    self.errors.append(message % args)
+
+  def info(self, message, *args):
+    pass
+
+def create_app(tmp_path, template_vars):
+  template_folder = tmp_path / 'templates'
+  template_folder.mkdir()
+  (template_folder / 'index.html').write_text('{{ value }}', encoding='utf-8')
+  (template_folder / 'broken.html').write_text('{% if %}', encoding='utf-8')
+  app = object.__new__(beaker_module.Beaker)
+  app._Beaker__flask = Flask(__name__, template_folder=str(template_folder))
+  app._configure_template(template_vars)
+  return app
+
+def test_bytecode_cache(tmp_path):
+  cache_dir = tmp_path / 'template_cache'
+  app = create_app(tmp_path, {'bytecode_cache_dir': str(cache_dir), 'cache_size': 10, 'auto_reload': False})
+  jinja_env = app._Beaker__flask.jinja_env
+  assert isinstance(jinja_env.bytecode_cache, FileSystemBytecodeCache)
+  assert jinja_env.cache.capacity == 10
+  assert app._Beaker__flask.config['TEMPLATES_AUTO_RELOAD'] is False
+
+def test_without_bytecode_cache(tmp_path):
+  app = create_app(tmp_path, {})
+  assert app._Beaker__flask.jinja_env.bytecode_cache is None
+
+def test_precompile_templates(tmp_path, monkeypatch):
+  record_logger = RecordLogger()
+  monkeypatch.setattr(beaker_module, 'logger', record_logger)
+  cache_dir = tmp_path / 'template_cache'
+  app = create_app(tmp_path, {'bytecode_cache_dir': str(cache_dir)})
+  assert app.precompile_templates() == 1
+  # NOTE: コンパイルできたテンプレートのみキャッシュのファイルが作成される
+  assert len(os.listdir(cache_dir)) == 1
+  assert len(record_logger.errors) == 1
+  assert 'broken.html' in record_logger.errors[0]